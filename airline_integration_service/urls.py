@@ -19,6 +19,8 @@ from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from rest_framework import permissions
 
+from bookings.metrics import metrics_view
+
 # Customize admin site
 admin.site.site_header = 'SmartFly by Zayn Bux'
 admin.site.site_title = 'SmartFly Admin Portal'
@@ -40,6 +42,7 @@ schema_view = get_schema_view(
 urlpatterns = [
     path('admin/', admin.site.urls),
     path('api/', include('bookings.urls')),
+    path('metrics', metrics_view, name='metrics'), # Prometheus
 
     # API Documentation (Swagger/OpenAPI)
     path('swagger<format>/\.json|\.yaml', schema_view.without_ui(cache_timeout=0), name='schema-json'),
@@ -1,15 +1,36 @@
 from django.contrib import admin
 from .models import Passenger, Flight, Booking
+from .passenger_search import search_passengers
+from .search import parse_day
 
 @admin.register(Passenger)
 class PassengerAdmin(admin.ModelAdmin):
     list_display = ('id', 'first_name', 'last_name', 'email', 'date_of_birth', 'created_at')
-    search_fields = ('first_name', 'last_name', 'email')
+    search_fields = ('first_name', 'last_name', 'email') # Enables the search box and autocomplete, see get_search_results
     list_filter = ('created_at',)
 
+    def get_search_results(self, request, queryset, search_term):
+        """
+        Indexed lookup (bookings.passenger_search) instead of icontains over
+        every row: name words or an email, optionally with a YYYY-MM-DD date
+        of birth. Also serves the passenger autocomplete of BookingAdmin.
+        """
+        words, date_of_birth = [], None
+        for word in search_term.split():
+            day = parse_day(word)
+            if day is None:
+                words.append(word)
+            else:
+                date_of_birth = day
+        if not words:
+            # A date of birth alone isn't indexed, and would match far too many passengers anyway
+            return (queryset.none() if date_of_birth else queryset), False
+        return search_passengers(' '.join(words), date_of_birth=date_of_birth, queryset=queryset), False
+
 @admin.register(Flight)
 class FlightAdmin(admin.ModelAdmin):
-    list_display = ('id', 'flight_number', 'origin', 'destination', 'departure_time', 'arrival_time', 'price', 'total_seats', 'created_at')
+    list_display = ('id', 'flight_number', 'origin', 'destination', 'departure_time', 'arrival_time', 'price', 'total_seats', 'seats_booked', 'created_at')
+    readonly_fields = ('seats_booked',) # Maintained by bookings.inventory, use reconcile_seat_counters to fix
     search_fields = ('flight_number', 'origin', 'destination')
     list_filter = ('departure_time', 'origin', 'destination')
     ordering = ('departure_time',)
@@ -0,0 +1,108 @@
+"""
+Async (ASGI) variants of the hottest booking endpoints.
+
+Under an ASGI server (uvicorn workers, see the Dockerfile) these run on the
+event loop: while a booking waits on the external service the worker keeps
+serving other requests, instead of one sync worker being pinned per
+in-flight confirmation. Database work still runs through Django's sync ORM
+in a worker thread (sync_to_async), in the same short transactions as the
+sync views.
+
+Responses match their DRF counterparts in /api/bookings/ and
+/api/flights/{id}/availability/.
+"""
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.http import HttpResponse, HttpResponseNotAllowed
+from rest_framework import serializers, status
+import asyncio
+import json
+import logging
+import weakref
+
+from .cache import aget_flight_availability
+from .confirmation import aconfirm_booking, record_confirmation
+from .idempotency import async_idempotent
+from .renderers import FastJSONRenderer
+from .serializers import BookingSerializer
+from .views import create_pending_booking
+
+logger = logging.getLogger(__name__)
+
+_db_slots = weakref.WeakKeyDictionary() # Event loop -> asyncio.Semaphore
+
+def _database(func):
+    """
+    Wraps sync ORM work for the event loop. Calls run in the request's worker
+    thread and are capped at ASYNC_DB_CONCURRENCY per worker: a thousand
+    bookings released at once by the external service must not all contend
+    for the same flight rows at the same moment.
+    """
+    run = sync_to_async(func)
+
+    async def wrapper(*args, **kwargs):
+        loop = asyncio.get_running_loop()
+        slots = _db_slots.get(loop)
+        if slots is None:
+            slots = _db_slots[loop] = asyncio.Semaphore(settings.ASYNC_DB_CONCURRENCY)
+        async with slots:
+            return await run(*args, **kwargs)
+    return wrapper
+
+def _json_response(data, status_code=status.HTTP_200_OK, headers=None):
+    # Same rendering as the DRF views (UUIDs, decimals, datetimes)
+    return HttpResponse(FastJSONRenderer().render(data), status=status_code, headers=headers, content_type='application/json')
+
+def _create_booking(data):
+    """ Validation, seat reservation and insert: everything before the external call. """
+    serializer = BookingSerializer(data=data)
+    if not serializer.is_valid():
+        return None, serializer.errors
+    try:
+        return create_pending_booking(serializer), None
+    except serializers.ValidationError as e:
+        return None, e.detail
+
+@async_idempotent
+async def create_booking(request):
+    """
+    Async counterpart of POST /api/bookings/. The booking is always confirmed
+    inline; awaiting the external service doesn't hold up the worker.
+    """
+    if request.method != 'POST':
+        return HttpResponseNotAllowed(['POST'])
+    try:
+        data = json.loads(request.body)
+    except ValueError:
+        return _json_response({"detail": "Request body must be JSON."}, status.HTTP_400_BAD_REQUEST)
+    if not isinstance(data, dict):
+        return _json_response({"detail": "Request body must be a JSON object."}, status.HTTP_400_BAD_REQUEST)
+
+    booking, errors = await _database(_create_booking)(data)
+    if errors:
+        return _json_response(errors, status.HTTP_400_BAD_REQUEST)
+
+    error_message = await aconfirm_booking(booking, record=_database(record_confirmation))
+
+    if booking.status == 'CONFIRMED':
+        # Passenger and flight are already loaded, so serializing doesn't touch the database
+        return _json_response(BookingSerializer(booking).data, status.HTTP_201_CREATED)
+    return _json_response(
+        {"error": "Booking creation successful, but external confirmation failed.", "detail": error_message},
+        status.HTTP_503_SERVICE_UNAVAILABLE,
+    )
+
+# Django 4.2's csrf_exempt wraps views in a sync function, so mark the coroutine directly.
+# Like the DRF views, this API is consumed by clients without a CSRF token.
+create_booking.csrf_exempt = True
+
+async def flight_availability(request, pk):
+    """ Async counterpart of GET /api/flights/{id}/availability/. """
+    if request.method != 'GET':
+        return HttpResponseNotAllowed(['GET'])
+    availability = await aget_flight_availability(pk)
+    if availability is None:
+        return _json_response(
+            {"error": "Flight not found or availability could not be determined."}, status.HTTP_404_NOT_FOUND,
+        )
+    return _json_response({"available_seats": availability})
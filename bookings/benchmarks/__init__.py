@@ -0,0 +1,76 @@
+"""
+Benchmarks for the bookings app, run with `python manage.py benchmark <scenario>`.
+
+Each scenario is a function taking the command's options and returning a dict
+of measurements. Scenarios that need data run against a throwaway test
+database, never the configured one, which is emptied between scenarios.
+
+Measurements are compared against a baseline by the suffix of their name:
+latencies (`_ms`) and throughputs (`_per_s`) may drift by a tolerance, query
+counts (`queries_per_request`) may not grow at all.
+"""
+from importlib import import_module
+
+SCENARIO_MODULES = (
+    'bookings.benchmarks.external_client',
+    'bookings.benchmarks.references',
+    'bookings.benchmarks.pagination',
+    'bookings.benchmarks.flight_search',
+    'bookings.benchmarks.itineraries',
+    'bookings.benchmarks.calendar',
+    'bookings.benchmarks.passenger_search',
+    'bookings.benchmarks.async_bookings',
+    'bookings.benchmarks.seat_assignment',
+    'bookings.benchmarks.holds',
+    'bookings.benchmarks.events',
+    'bookings.benchmarks.exports',
+    'bookings.benchmarks.serialization',
+    'bookings.benchmarks.loaders',
+    'bookings.benchmarks.api',
+)
+
+SCENARIOS = {}
+
+def scenario(name, needs_db=False, concurrent_writes=False, on_disk=False):
+    """
+    Registers a benchmark scenario under `name`. Scenarios writing from many
+    threads at once set concurrent_writes, and scenarios whose data doesn't
+    fit in memory set on_disk, so SQLite runs on a file instead of in memory
+    (see the benchmark command).
+    """
+    def register(func):
+        func.needs_db = needs_db or concurrent_writes or on_disk
+        func.concurrent_writes = concurrent_writes
+        func.on_disk = on_disk
+        SCENARIOS[name] = func
+        return func
+    return register
+
+def load_scenarios():
+    for module in SCENARIO_MODULES:
+        import_module(module)
+    return SCENARIOS
+
+def find_regressions(results, baseline, tolerance):
+    """
+    Lists the measurements in `results` that are worse than in `baseline`
+    (both {scenario: {measurement: value}}). Measurements missing from
+    either side are skipped.
+    """
+    regressions = []
+    for name, measurements in results.items():
+        for key, value in measurements.items():
+            expected = baseline.get(name, {}).get(key)
+            if not isinstance(value, (int, float)) or not isinstance(expected, (int, float)):
+                continue
+            if key.endswith('queries_per_request'):
+                worse = value > expected
+            elif key.endswith('_ms'):
+                worse = value > expected * (1 + tolerance)
+            elif key.endswith('_per_s'):
+                worse = value < expected / (1 + tolerance)
+            else:
+                continue
+            if worse:
+                regressions.append(f"{name}.{key}: {value} (baseline {expected})")
+    return regressions
@@ -0,0 +1,110 @@
+"""
+API load scenarios: flight search, availability lookups, booking
+create/cancel under contention and booking list pagination, each driven by
+--concurrency processes through bookings.benchmarks.loadtest. Results
+include p50/p95/p99 latency, throughput and queries per request, and can be
+compared against a stored baseline (see the benchmark command).
+"""
+from datetime import timedelta
+import random
+
+from django.test import Client, override_settings
+from django.utils import timezone
+
+from bookings.models import Booking
+from . import scenario
+from .data import AIRPORTS, seed_bookings, seed_flights, seed_passengers
+from .loadtest import run_load, split
+
+REQUESTS = 2000 # Per scenario, times --scale
+LOAD_SETTINGS = {
+    'ALLOWED_HOSTS': ['*'],
+    'BOOKING_CONFIRMATION_MODE': 'sync',
+    'EXTERNAL_BOOKING_SERVICE_MODE': 'simulate', # In-process, no network call
+}
+
+def _prefixed(prefix, results):
+    return {f'{prefix}_{key}': value for key, value in results.items()}
+
+@scenario('api_flight_search', concurrent_writes=True)
+@override_settings(**LOAD_SETTINGS)
+def api_flight_search(options):
+    """ GET /api/flights/ route and date searches, some repeated (2k x scale flights and requests). """
+    seed_flights(2000 * options['scale'])
+    rng = random.Random(1)
+    today = timezone.localdate()
+    searches = []
+    for _ in range(200 * options['scale']): # Popular searches repeat, as they do in production
+        origin, destination = rng.sample(AIRPORTS, 2)
+        path = f'/api/flights/?origin={origin}&destination={destination}'
+        if rng.random() < 0.7:
+            path += f'&date={today + timedelta(days=rng.randrange(90))}'
+        searches.append(('GET', path, None))
+    requests = [rng.choice(searches) for _ in range(REQUESTS * options['scale'])]
+    return {'flights': 2000 * options['scale'], **run_load(split(requests, options['concurrency']), options['client'])}
+
+@scenario('api_availability', concurrent_writes=True)
+@override_settings(**LOAD_SETTINGS)
+def api_availability(options):
+    """ GET /api/flights/{id}/availability/ over random flights (2k x scale flights and requests). """
+    flights = seed_flights(2000 * options['scale'])
+    rng = random.Random(2)
+    requests = [
+        ('GET', f'/api/flights/{rng.choice(flights).pk}/availability/', None)
+        for _ in range(REQUESTS * options['scale'])
+    ]
+    return {'flights': len(flights), **run_load(split(requests, options['concurrency']), options['client'])}
+
+@scenario('api_booking_contention', concurrent_writes=True)
+@override_settings(**LOAD_SETTINGS)
+def api_booking_contention(options):
+    """
+    POST /api/bookings/ from every process onto the same few flights, then
+    cancellations mixed with new bookings competing for the freed seats
+    (2k x scale bookings for 10 flights of 180 seats).
+    """
+    probe_flight, *flights = seed_flights(11)
+    total = REQUESTS * options['scale']
+    passengers = seed_passengers(total * 2 + 40)
+    rng = random.Random(3)
+
+    def book(passenger, flight):
+        body = {'passenger_id': str(passenger.pk), 'flight_id': str(flight.pk)}
+        if rng.random() < 0.5:
+            body['auto_assign_seat'] = True
+        return ('POST', '/api/bookings/', body)
+
+    # Queries are counted on a flight of its own, so the probe doesn't eat into the contended seats
+    probe = [book(passenger, probe_flight) for passenger in passengers[-40:-20]]
+    creates = [book(passengers[i], rng.choice(flights)) for i in range(total)]
+    results = _prefixed('create', run_load(split(creates, options['concurrency']), options['client'], probe=probe))
+
+    held = list(Booking.objects.filter(flight__in=flights, status__in=Booking.SEAT_HOLDING_STATUSES).values_list('pk', flat=True))
+    rng.shuffle(held)
+    probe = [('POST', f'/api/bookings/{pk}/cancel/', None) for pk in Booking.objects.filter(flight=probe_flight).values_list('pk', flat=True)[:20]]
+    mixed = [('POST', f'/api/bookings/{pk}/cancel/', None) for pk in held[:total // 2]]
+    mixed += [book(passengers[total + i], rng.choice(flights)) for i in range(total // 2)]
+    rng.shuffle(mixed)
+    results.update(_prefixed('cancel_mixed', run_load(split(mixed, options['concurrency']), options['client'], probe=probe)))
+    return results
+
+@scenario('api_pagination', concurrent_writes=True)
+@override_settings(**LOAD_SETTINGS)
+def api_pagination(options):
+    """ GET /api/bookings/ pages reached by following `next` links (20k x scale bookings). """
+    total = 20_000 * options['scale']
+    seed_bookings(total, seed_passengers(1000), seed_flights(200))
+
+    # The page URLs a client walking the list would request
+    client = Client()
+    pages = ['/api/bookings/?count=false']
+    while len(pages) < 100:
+        next_url = client.get(pages[-1]).json()['next']
+        if not next_url:
+            break
+        pages.append(next_url.replace('http://testserver', ''))
+    pages.append('/api/bookings/') # First page with its total count
+
+    rng = random.Random(4)
+    requests = [('GET', rng.choice(pages), None) for _ in range(REQUESTS * options['scale'])]
+    return {'bookings': total, **run_load(split(requests, options['concurrency']), options['client'])}
@@ -0,0 +1,89 @@
+"""
+Load test for the async booking path: many concurrent bookings against a
+slow external service, served by sync workers vs an ASGI event loop.
+
+Both servers run in-process against the benchmark database. The sync side
+is the WSGI app behind `concurrency` threads, i.e. that many sync gunicorn
+workers; the async side is the ASGI app on one event loop with every
+request in flight at once.
+"""
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import time
+
+import httpx
+from django.conf import settings
+from django.core.handlers.asgi import ASGIHandler
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import override_settings
+
+from bookings.external_client import reset_clients
+from bookings.fake_external_service import start_in_thread
+from . import scenario
+from .data import seed_flights, seed_passengers
+
+def _payloads(passengers, flights, count):
+    # Distinct passenger/flight pairs, so none is rejected as a duplicate
+    return [
+        {"passenger_id": str(passengers[i].pk), "flight_id": str(flights[i % len(flights)].pk)}
+        for i in range(count)
+    ]
+
+def _summary(statuses, elapsed):
+    return {
+        'seconds': round(elapsed, 2),
+        'bookings_per_s': round(len(statuses) / elapsed, 1),
+        'status_codes': {code: statuses.count(code) for code in sorted(set(statuses))},
+    }
+
+def _run_sync(payloads, workers):
+    with httpx.Client(transport=httpx.WSGITransport(app=WSGIHandler()), base_url='http://testserver') as client:
+        def book(payload):
+            return client.post('/api/bookings/', json=payload).status_code
+
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=workers) as pool:
+            statuses = list(pool.map(book, payloads))
+        return _summary(statuses, time.perf_counter() - started)
+
+async def _run_async(payloads):
+    transport = httpx.ASGITransport(app=ASGIHandler())
+    async with httpx.AsyncClient(transport=transport, base_url='http://testserver', timeout=None) as client:
+        started = time.perf_counter()
+        responses = await asyncio.gather(*(client.post('/api/async/bookings/', json=payload) for payload in payloads))
+        return _summary([response.status_code for response in responses], time.perf_counter() - started)
+
+@scenario('async_bookings', concurrent_writes=True)
+def async_bookings(options):
+    """ 1,000 x scale concurrent bookings against a 0.5s external service: sync workers vs async views. """
+    count = 1000 * options['scale']
+    latency = 0.5
+    flights = seed_flights(-(-count // 50)) # 180 seats each, room for both runs
+    passengers = seed_passengers(2 * count)
+
+    server, url = start_in_thread(latency=latency, error_rate=0, reject_rate=0)
+    overrides = {
+        'ALLOWED_HOSTS': ['*'],
+        'EXTERNAL_BOOKING_SERVICE_MODE': 'http',
+        'EXTERNAL_BOOKING_SERVICE_URL': url,
+        'BOOKING_CONFIRMATION_MODE': 'sync',
+        # Let the clients keep every booking in flight; the servers are what's being compared
+        'EXTERNAL_SERVICE_POOL_SIZE': count,
+        'EXTERNAL_SERVICE_MAX_CONCURRENCY': count,
+    }
+    try:
+        with override_settings(**overrides):
+            reset_clients()
+            sync = _run_sync(_payloads(passengers[:count], flights, count), options['concurrency'])
+            async_ = asyncio.run(_run_async(_payloads(passengers[count:], flights, count)))
+    finally:
+        reset_clients()
+        server.shutdown()
+
+    return {
+        'bookings': count,
+        'external_latency_seconds': latency,
+        'sync_workers': options['concurrency'],
+        **{f'sync_{key}': value for key, value in sync.items()},
+        **{f'async_{key}': value for key, value in async_.items()},
+    }
@@ -0,0 +1,51 @@
+from datetime import timedelta
+import random
+import time
+
+from django.db.models import F
+from django.utils import timezone
+
+from bookings.calendar import rebuild_route_calendar, refresh_flights, route_calendar
+from bookings.models import Flight, RouteDayAvailability
+from bookings.search import route_key
+from . import scenario
+from .data import AIRPORTS, seed_flights
+from .itineraries import _latencies
+
+@scenario('route_calendar', needs_db=True)
+def calendar(options):
+    """
+    Route calendar: a full rebuild over 100k x scale flights, 31-day calendar
+    reads, and the incremental refresh of a relay batch touching 1,000 flights.
+    """
+    total = 100_000 * options['scale']
+    flights = seed_flights(total)
+
+    started = time.perf_counter()
+    route_days = rebuild_route_calendar()
+    results = {'flights': total, 'route_days': route_days, 'rebuild_ms': round((time.perf_counter() - started) * 1000, 2)}
+
+    rng = random.Random(9)
+    today = timezone.localdate()
+    queries = []
+    for _ in range(500):
+        origin, destination = rng.sample(AIRPORTS, 2)
+        start = today + timedelta(days=rng.randrange(0, 60))
+        queries.append((route_key(origin), route_key(destination), start, start + timedelta(days=30)))
+    assert all(len(route_calendar(*query)) == 31 for query in queries[:10])
+    latencies = _latencies([lambda query=query: route_calendar(*query) for query in queries])
+    results.update({f'read_{key}': value for key, value in latencies.items()})
+
+    # As if 1,000 bookings on different flights had just been relayed
+    booked = [flight.pk for flight in rng.sample(flights, 1000)]
+    Flight.objects.filter(pk__in=booked).update(seats_booked=F('seats_booked') + 1)
+    started = time.perf_counter()
+    refresh_flights(booked)
+    results['refresh_1000_flights_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    summary = RouteDayAvailability.objects.get(
+        origin_key=flights[0].origin_key, destination_key=flights[0].destination_key, day=timezone.localdate(flights[0].departure_time),
+    )
+    expected = [flight for flight in Flight.objects.filter(origin_key=flights[0].origin_key, destination_key=flights[0].destination_key)
+                if timezone.localdate(flight.departure_time) == summary.day]
+    assert summary.available_seats == sum(flight.seats_available for flight in expected)
+    return results
@@ -0,0 +1,59 @@
+"""
+Synthetic data for benchmark scenarios. Rows are bulk-inserted into the
+throwaway benchmark database; nothing here touches the configured database.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+import random
+
+from django.utils import timezone
+
+from bookings.models import Booking, Flight, Passenger
+from bookings.references import allocate_references
+
+AIRPORTS = ('JNB', 'CPT', 'DUR', 'PLZ', 'ELS', 'BFN', 'GRJ', 'MQP', 'KIM', 'PZB')
+BATCH_SIZE = 5000
+
+def seed_passengers(count):
+    passengers = [
+        Passenger(
+            first_name=f'First{i}', last_name=f'Last{i % 5000}', email=f'passenger{i}@bench.example.com',
+            date_of_birth=date(1950, 1, 1) + timedelta(days=i % 20000),
+        )
+        for i in range(count)
+    ]
+    for passenger in passengers:
+        passenger.set_name_keys() # bulk_create skips save()
+    return Passenger.objects.bulk_create(passengers, batch_size=BATCH_SIZE)
+
+def seed_flights(count, days=90):
+    rng = random.Random(42)
+    start = timezone.now().replace(minute=0, second=0, microsecond=0)
+    flights = []
+    for i in range(count):
+        origin, destination = rng.sample(AIRPORTS, 2)
+        departure = start + timedelta(minutes=rng.randrange(days * 24 * 60))
+        flights.append(Flight(
+            flight_number=f'BX{i}', origin=origin, destination=destination,
+            departure_time=departure, arrival_time=departure + timedelta(minutes=rng.randrange(60, 180)),
+            total_seats=180, price=Decimal(rng.randrange(500, 5000)),
+        ))
+        flights[-1].set_route_keys() # bulk_create skips save()
+    return Flight.objects.bulk_create(flights, batch_size=BATCH_SIZE)
+
+def seed_bookings(count, passengers, flights):
+    """ Inserts `count` CONFIRMED bookings spread over the given passengers and flights. """
+    created = 0
+    while created < count:
+        batch = min(BATCH_SIZE, count - created)
+        references = allocate_references(batch)
+        Booking.objects.bulk_create([
+            Booking(
+                passenger=passengers[(created + i) % len(passengers)],
+                flight=flights[(created + i) % len(flights)],
+                status='CONFIRMED', booking_reference=references[i],
+            )
+            for i in range(batch)
+        ])
+        created += batch
+    return created
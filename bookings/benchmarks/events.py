@@ -0,0 +1,47 @@
+from datetime import timedelta
+import time
+import uuid
+
+from django.utils import timezone
+
+from bookings.events import changes_since, relay_events
+from bookings.models import BookingEvent
+from . import scenario
+from .data import BATCH_SIZE
+from .loadtest import percentile
+
+@scenario('booking_events', needs_db=True)
+def booking_events(options):
+    """ Outbox relay throughput to two consumers, and change feed page latency, over 100k x scale events. """
+    total = 100_000 * options['scale']
+    settled = timezone.now() - timedelta(minutes=1)
+    flight_id = uuid.uuid4()
+    for offset in range(0, total, BATCH_SIZE):
+        BookingEvent.objects.bulk_create([
+            BookingEvent(booking_id=uuid.uuid4(), booking_reference='BENCH0', flight_id=flight_id, status='CONFIRMED', previous_status='PENDING')
+            for _ in range(min(BATCH_SIZE, total - offset))
+        ])
+    BookingEvent.objects.update(created_at=settled)
+
+    received = {'analytics': 0, 'cache': 0}
+    consumers = {name: lambda events, name=name: received.__setitem__(name, received[name] + len(events)) for name in received}
+    started = time.perf_counter()
+    while relay_events(consumers):
+        pass
+    relay_seconds = time.perf_counter() - started
+    assert received == {'analytics': total, 'cache': total}, received
+
+    # A client polling the feed from the start, 1,000 changes per page
+    latencies, since, has_more = [], 0, True
+    while has_more:
+        started = time.perf_counter()
+        changes, has_more = changes_since(since, 1000)
+        latencies.append(time.perf_counter() - started)
+        since = changes[-1]['id']
+    latencies.sort()
+    return {
+        'events': total,
+        'relay_events_per_s': round(total / relay_seconds),
+        'feed_page_p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'feed_page_p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+    }
@@ -0,0 +1,79 @@
+import asyncio
+import time
+import tracemalloc
+
+from django.core.asgi import get_asgi_application
+from rest_framework.renderers import JSONRenderer
+
+from bookings.exports import BOOKING_EXPORT_FIELDS, bookings_for_export, iter_export
+from bookings.models import Booking
+from bookings.serializers import BookingSerializer
+from . import scenario
+from .data import seed_bookings, seed_flights, seed_passengers
+
+SERIALIZER_SAMPLE = 10_000
+
+def _measure(produce):
+    """
+    Consumes produce() (an iterable of text chunks, or of sizes) twice:
+    timed, then under tracemalloc, which slows it down. Returns (seconds,
+    peak MiB, size).
+    """
+    started = time.perf_counter()
+    size = sum(chunk if isinstance(chunk, int) else len(chunk) for chunk in produce())
+    elapsed = time.perf_counter() - started
+    tracemalloc.start()
+    for _ in produce():
+        pass
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    return elapsed, round(peak / 2 ** 20, 1), size
+
+async def _asgi_get(app, path, query_string):
+    """ GETs `path` from the ASGI app, dropping the body chunks as they are sent. Returns the body size. """
+    scope = {
+        'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+        'path': path, 'raw_path': path.encode(), 'query_string': query_string.encode(), 'root_path': '',
+        'headers': [(b'host', b'testserver')], 'client': ('127.0.0.1', 0), 'server': ('testserver', 80),
+    }
+    size = 0
+
+    async def receive():
+        return {'type': 'http.request', 'body': b'', 'more_body': False}
+
+    async def send(message):
+        nonlocal size
+        if message['type'] == 'http.response.body':
+            size += len(message.get('body', b''))
+
+    await app(scope, receive, send)
+    return size
+
+@scenario('export', needs_db=True)
+def export(options):
+    """ Streaming NDJSON/CSV export throughput and peak memory vs serializing model instances (100k x scale bookings). """
+    total = 100_000 * options['scale']
+    seed_bookings(total, seed_passengers(5000), seed_flights(500))
+
+    results = {'bookings': total}
+    for output in ('ndjson', 'csv'):
+        elapsed, peak, size = _measure(lambda: iter_export(bookings_for_export(), BOOKING_EXPORT_FIELDS, output))
+        results[f'{output}_rows_per_s'] = round(total / elapsed)
+        results[f'{output}_peak_mib'] = peak
+        results[f'{output}_mib'] = round(size / 2 ** 20, 1)
+
+    # The export endpoint served by the ASGI app, which buffers plain iterators whole
+    app = get_asgi_application()
+    elapsed, peak, size = _measure(lambda: [asyncio.run(_asgi_get(app, '/api/bookings/export/', 'output=ndjson'))])
+    assert size > results['ndjson_mib'] * 2 ** 20 * 0.9, size # The body was streamed in full
+    results['asgi_ndjson_rows_per_s'] = round(total / elapsed)
+    results['asgi_ndjson_peak_mib'] = peak
+
+    # The previous way to get the data: model instances through the nested API serializer
+    def serialized():
+        queryset = Booking.objects.select_related('passenger', 'flight').order_by('created_at')[:SERIALIZER_SAMPLE]
+        yield JSONRenderer().render(BookingSerializer(queryset, many=True).data)
+    elapsed, peak, _ = _measure(serialized)
+    results['serializer_rows_per_s'] = round(SERIALIZER_SAMPLE / elapsed)
+    results[f'serializer_peak_mib_for_{SERIALIZER_SAMPLE}_rows'] = peak
+    return results
@@ -0,0 +1,49 @@
+from concurrent.futures import ThreadPoolExecutor
+import time
+
+import requests
+
+from bookings.external_client import CircuitBreaker, ExternalBookingClient
+from bookings.fake_external_service import start_in_thread
+from . import scenario
+
+BOOKING_REQUEST = {"internalBookingRef": "benchmark", "passengerDetails": {}, "flightDetails": {}}
+
+def _run(call, calls, concurrency):
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as pool:
+        list(pool.map(lambda _: call(), range(calls)))
+    elapsed = time.perf_counter() - started
+    return round(calls / elapsed, 1)
+
+@scenario('external_client')
+def external_client(options):
+    """ Throughput of confirmations against the fake service, with and without connection pooling. """
+    calls = 200 * options['scale']
+    concurrency = options['concurrency']
+    server, url = start_in_thread(latency=0.005)
+    try:
+        client = ExternalBookingClient(
+            url=url, timeout=5, pool_size=concurrency, max_concurrency=concurrency,
+            max_retries=0, retry_backoff=0, breaker=CircuitBreaker(failure_threshold=10 ** 9),
+        )
+        pooled = _run(lambda: client.confirm(BOOKING_REQUEST), calls, concurrency)
+
+        def unpooled_call():
+            # What a bare requests.post per booking costs: a fresh TCP connection every time
+            requests.post(url, json={"bookingRequest": BOOKING_REQUEST}, timeout=5, headers={'Connection': 'close'}).json()
+        unpooled = _run(unpooled_call, calls, concurrency)
+
+        stats = client.stats.snapshot()
+        client.close()
+    finally:
+        server.shutdown()
+
+    return {
+        'calls': calls,
+        'concurrency': concurrency,
+        'pooled_calls_per_s': pooled,
+        'unpooled_calls_per_s': unpooled,
+        'pooled_p50_seconds': stats['p50_seconds'],
+        'pooled_p99_seconds': stats['p99_seconds'],
+    }
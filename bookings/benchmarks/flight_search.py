@@ -0,0 +1,47 @@
+import time
+
+from django.db import connection
+
+from bookings.models import Flight
+from bookings.search import day_range, route_key
+from . import scenario
+from .data import seed_flights
+
+def _best_of(func, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 2)
+
+@scenario('flight_search', needs_db=True)
+def flight_search(options):
+    """ Route + date search: iexact/__date filters vs route keys and a datetime range (100k x scale flights). """
+    flights = seed_flights(100_000 * options['scale'])
+    with connection.cursor() as cursor: # Give the planner fresh statistics
+        cursor.execute('ANALYZE')
+    sample = flights[len(flights) // 2]
+    day = sample.departure_time.date()
+
+    # The previous filters: case-insensitive matches and a cast of every departure_time to a date
+    old = Flight.objects.filter(
+        origin__iexact=sample.origin.lower(), destination__iexact=sample.destination.lower(),
+        departure_time__date=day,
+    )
+    start, end = day_range(day)
+    new = Flight.objects.filter(
+        origin_key=route_key(sample.origin), destination_key=route_key(sample.destination),
+        departure_time__gte=start, departure_time__lt=end,
+    )
+    plan = new.explain()
+    return {
+        'flights': len(flights),
+        'matches': new.count(),
+        'old_filter_ms': _best_of(lambda: list(old.all())),
+        'new_filter_ms': _best_of(lambda: list(new.all())),
+        'uses_route_index': 'flight_route_departure_idx' in plan,
+        'old_filter_plan': old.explain(),
+        'new_filter_plan': plan,
+    }
@@ -0,0 +1,44 @@
+from datetime import timedelta
+import time
+
+from django.conf import settings
+from django.db.models import Count
+from django.utils import timezone
+
+from bookings.holds import expire_holds
+from bookings.inventory import get_seat_map, held_seats_subquery
+from bookings.models import Booking, Flight
+from . import scenario
+from .data import seed_bookings, seed_flights, seed_passengers
+
+@scenario('hold_expiry', needs_db=True)
+def hold_expiry(options):
+    """ Sweep of 100k x scale expired PENDING holds among as many live bookings, in batches of BOOKING_HOLD_SWEEP_BATCH_SIZE. """
+    total = 200_000 * options['scale']
+    flights = seed_flights(1000)
+    seed_bookings(total, seed_passengers(10_000), flights)
+    # Every other booking an abandoned hold, half of those with a seat
+    stale = timezone.now() - timedelta(seconds=settings.BOOKING_HOLD_TTL + 60)
+    bookings = Booking.objects.order_by('pk').values_list('pk', flat=True)
+    for offset in range(0, total, 10_000):
+        chunk = list(bookings[offset:offset + 10_000])
+        Booking.objects.filter(pk__in=chunk[::2]).update(status='PENDING', created_at=stale)
+        Booking.objects.filter(pk__in=chunk[::4]).update(seat_number='1A')
+    Flight.objects.update(total_seats=total, seats_booked=held_seats_subquery())
+    for flight in flights:
+        get_seat_map(flight.pk) # Created by the first booking on a flight, not by the sweep
+
+    started = time.perf_counter()
+    expired = expire_holds()
+    seconds = time.perf_counter() - started
+    batches = -(-expired // settings.BOOKING_HOLD_SWEEP_BATCH_SIZE)
+
+    counts = dict(Booking.objects.values_list('status').annotate(count=Count('pk')).order_by())
+    assert counts == {'CONFIRMED': total - expired, 'EXPIRED': expired}, counts
+    assert not Flight.objects.exclude(seats_booked=held_seats_subquery()).exists(), "Seat counters drifted"
+    return {
+        'bookings': total,
+        'expired': expired,
+        'expired_per_s': round(expired / seconds),
+        'batch_avg_ms': round(seconds * 1000 / max(batches, 1), 2),
+    }
@@ -0,0 +1,71 @@
+from datetime import timedelta
+import random
+import time
+
+from django.utils import timezone
+
+from bookings.itineraries import Schedule, graph, search_itineraries
+from bookings.models import Flight
+from bookings.response_cache import bump_flight_versions, catalog_version
+from bookings.search import day_range, route_key
+from . import scenario
+from .data import AIRPORTS, seed_flights
+from .loadtest import percentile
+
+SEARCHES = 200
+
+def _latencies(searches):
+    latencies = []
+    for search in searches:
+        started = time.perf_counter()
+        search()
+        latencies.append(time.perf_counter() - started)
+    latencies.sort()
+    return {
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+@scenario('itineraries', needs_db=True)
+def itineraries(options):
+    """ Itinerary search latency (up to 3 legs) and route graph load/refresh times (100k x scale flights). """
+    total = 100_000 * options['scale']
+    seed_flights(total)
+    # As if loaded a while ago, so the edits below are the only recent changes
+    Flight.objects.update(updated_at=timezone.now() - timedelta(hours=1))
+
+    started = time.perf_counter()
+    schedule = Schedule.load(catalog_version())
+    results = {'flights': total, 'graph_load_ms': round((time.perf_counter() - started) * 1000, 2)}
+
+    rng = random.Random(5)
+    today = timezone.localdate()
+    queries = []
+    for _ in range(SEARCHES * options['scale']):
+        origin, destination = rng.sample(AIRPORTS, 2)
+        queries.append((route_key(origin), route_key(destination), *day_range(today + timedelta(days=rng.randrange(1, 80)))))
+    found = [len(schedule.search(*query)) for query in queries]
+    results['average_results'] = round(sum(found) / len(found), 1)
+    for sort in ('arrival', 'price'):
+        latencies = _latencies([lambda query=query: schedule.search(*query, sort=sort) for query in queries])
+        results.update({f'{sort}_search_{key}': value for key, value in latencies.items()})
+
+    # Through the graph the views use: version check, search and the bulk availability join
+    graph.discard()
+    graph.current()
+    latencies = _latencies([lambda query=query: search_itineraries(*query) for query in queries])
+    results.update({f'with_availability_{key}': value for key, value in latencies.items()})
+
+    # An edit to 100 flights, patched in on the next search
+    edited = list(Flight.objects.order_by('?')[:100])
+    for flight in edited:
+        flight.price += 1
+        flight.save(update_fields=['price', 'updated_at'])
+    bump_flight_versions([], catalog=True)
+    started = time.perf_counter()
+    graph.current()
+    results['incremental_refresh_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    assert all(graph.current().flights[flight.pk].price == flight.price for flight in edited)
+    graph.discard()
+    return results
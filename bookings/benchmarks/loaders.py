@@ -0,0 +1,40 @@
+import os
+import tempfile
+import time
+
+from bookings.datagen import FLIGHT_FIELDS, PASSENGER_FIELDS, generate_flights, generate_passengers, write_records
+from bookings.loaders import flight_from_record, load_file, passenger_from_record, read_records
+from bookings.models import Flight, Passenger
+from . import scenario
+
+GET_OR_CREATE_SAMPLE = 5000
+
+@scenario('bulk_load', needs_db=True)
+def bulk_load(options):
+    """ Batched upserts vs per-row get_or_create for a schedule (10k x scale flights) and passenger file (50k x scale). """
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        files = (
+            ('flights', Flight, generate_flights(10_000 * options['scale']), FLIGHT_FIELDS, flight_from_record, 'flight_number'),
+            ('passengers', Passenger, generate_passengers(50_000 * options['scale']), PASSENGER_FIELDS, passenger_from_record, 'email'),
+        )
+        for kind, model, records, fields, parse, unique_field in files:
+            path = os.path.join(directory, f'{kind}.csv')
+            write_records(records, fields, path)
+
+            stats = load_file(kind, path)
+            results[f'{kind}_rows'] = stats['rows_loaded']
+            results[f'{kind}_upsert_rows_per_s'] = stats['rows_per_s']
+            results[f'{kind}_reload_rows_per_s'] = load_file(kind, path)['rows_per_s'] # Every row now conflicts
+
+            # The per-row way, on a sample
+            model.objects.all().delete()
+            sample = [parse(record) for _, record in read_records(path)][:GET_OR_CREATE_SAMPLE]
+            started = time.perf_counter()
+            for instance in sample:
+                model.objects.get_or_create(**{unique_field: getattr(instance, unique_field)}, defaults={
+                    field.attname: getattr(instance, field.attname)
+                    for field in model._meta.concrete_fields if field.attname not in ('id', unique_field)
+                })
+            results[f'{kind}_get_or_create_rows_per_s'] = round(len(sample) / (time.perf_counter() - started))
+    return results
@@ -0,0 +1,116 @@
+"""
+Load-test driver for the API scenarios (bookings.benchmarks.api).
+
+A scenario hands over a plan: a list of requests per driver process. The
+processes are forked from the benchmark command once the data is seeded,
+each one sending its requests back to back through Django's in-process test
+client (WSGI, or ASGI with --client asgi) on its own database connection, so
+the application code and database see real concurrency without a server or
+network in between. Requests are timed individually and summarized as
+p50/p95/p99 latency and throughput.
+
+Queries per request are counted in the benchmark process itself, on a probe
+set of requests run before the load, with a cold cache.
+"""
+from collections import Counter
+from concurrent.futures import ProcessPoolExecutor
+import asyncio
+import json
+import logging
+import multiprocessing
+import random
+import time
+
+from django.core.cache import cache
+from django.db import connection, connections
+from django.test import AsyncClient, Client
+from django.test.utils import CaptureQueriesContext
+
+def percentile(sorted_values, fraction):
+    """ Nearest-rank percentile of an already sorted list. """
+    if not sorted_values:
+        return None
+    index = max(0, min(len(sorted_values) - 1, round(fraction * len(sorted_values)) - 1))
+    return sorted_values[index]
+
+def _send(client, method, path, body):
+    if method == 'GET':
+        return client.get(path)
+    return client.post(path, json.dumps(body or {}), content_type='application/json')
+
+def _run_wsgi(requests):
+    client = Client(raise_request_exception=False)
+    latencies, statuses = [], Counter()
+    for method, path, body in requests:
+        started = time.perf_counter()
+        response = _send(client, method, path, body)
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] += 1
+    return latencies, statuses
+
+async def _run_asgi(requests):
+    client = AsyncClient(raise_request_exception=False)
+    latencies, statuses = [], Counter()
+    for method, path, body in requests:
+        started = time.perf_counter()
+        response = await _send(client, method, path, body)
+        latencies.append(time.perf_counter() - started)
+        statuses[response.status_code] += 1
+    return latencies, statuses
+
+def _drive(requests, client_kind):
+    """ Runs in a driver process: sends its requests one after the other. """
+    if client_kind == 'asgi':
+        return asyncio.run(_run_asgi(requests))
+    return _run_wsgi(requests)
+
+def count_queries(requests):
+    """ Average SQL queries per request over `requests`, sent in this process. """
+    client = Client(raise_request_exception=False)
+    random.seed(0) # The simulated external service fails at random, and failures take other queries
+    with CaptureQueriesContext(connection) as queries:
+        for method, path, body in requests:
+            _send(client, method, path, body)
+    return round(len(queries) / len(requests), 2) if requests else 0
+
+def run_load(plan, client_kind='wsgi', probe=None):
+    """
+    Sends the plan's requests from one forked process per list and returns
+    the latency, throughput, status code and query measurements.
+
+    Args:
+        plan (list): One [(method, path, body), ...] list per driver process.
+        probe (list, optional): Requests to count queries on; defaults to the first 20 of the plan.
+    """
+    probe = probe if probe is not None else plan[0][:20]
+    # Access logs and per-request log lines would dominate the timings
+    logging.disable(logging.WARNING)
+    try:
+        queries_per_request = count_queries(probe)
+        cache.clear() # Don't hand the probe's cache entries to the drivers
+        # Forked drivers must not share this process's open connection
+        connections.close_all()
+        started = time.perf_counter()
+        with ProcessPoolExecutor(max_workers=len(plan), mp_context=multiprocessing.get_context('fork')) as pool:
+            outcomes = list(pool.map(_drive, plan, [client_kind] * len(plan)))
+        elapsed = time.perf_counter() - started
+    finally:
+        logging.disable(logging.NOTSET)
+
+    latencies = sorted(latency for process_latencies, _ in outcomes for latency in process_latencies)
+    statuses = sum((process_statuses for _, process_statuses in outcomes), Counter())
+    return {
+        'requests': len(latencies),
+        'processes': len(plan),
+        'client': client_kind,
+        'requests_per_s': round(len(latencies) / elapsed, 1),
+        'p50_ms': round(percentile(latencies, 0.50) * 1000, 2),
+        'p95_ms': round(percentile(latencies, 0.95) * 1000, 2),
+        'p99_ms': round(percentile(latencies, 0.99) * 1000, 2),
+        'queries_per_request': queries_per_request,
+        'status_codes': dict(sorted(statuses.items())),
+    }
+
+def split(requests, processes):
+    """ Deals requests round-robin into one list per process. """
+    return [requests[i::processes] for i in range(processes)]
@@ -0,0 +1,58 @@
+import time
+
+from django.conf import settings
+from django.test import Client
+
+from bookings.models import Booking
+from bookings.pagination import KeysetPagination
+from . import scenario
+from .data import seed_bookings, seed_flights, seed_passengers
+
+PAGE_SIZE = 10
+
+def _timed_get(client, url, repeat=5):
+    best = None
+    for _ in range(repeat):
+        started = time.perf_counter()
+        response = client.get(url)
+        elapsed = time.perf_counter() - started
+        assert response.status_code == 200, response.content
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000, 2)
+
+@scenario('pagination', needs_db=True)
+def pagination(options):
+    """ /api/bookings/ page 1 vs a deep page: keyset cursor vs OFFSET (50k x scale bookings; scale 100 = 5M). """
+    total = 50_000 * options['scale']
+    seed_bookings(total, seed_passengers(1000), seed_flights(200))
+    deep_page = total // PAGE_SIZE # The last page
+
+    settings.ALLOWED_HOSTS = ['*']
+    client = Client()
+    # Build the cursor a client would hold after paging to deep_page
+    last_before = Booking.objects.order_by('-created_at', '-pk')[(deep_page - 1) * PAGE_SIZE - 1]
+    paginator = KeysetPagination()
+    paginator.base_url = 'http://testserver/api/bookings/'
+    paginator.key = 'created_at'
+    deep_cursor_url = paginator.encode_cursor(last_before, reverse=False)
+
+    results = {
+        'bookings': total,
+        'deep_page': deep_page,
+        'keyset_page_1_ms': _timed_get(client, '/api/bookings/?count=false'),
+        'keyset_deep_page_ms': _timed_get(client, deep_cursor_url + '&count=false'),
+        'keyset_deep_page_with_count_ms': _timed_get(client, deep_cursor_url),
+    }
+
+    # The previous behaviour: OFFSET pagination with a total count
+    queryset = Booking.objects.select_related('passenger', 'flight').order_by('-created_at')
+    for label, page in (('offset_page_1_ms', 1), ('offset_deep_page_ms', deep_page)):
+        best = None
+        for _ in range(5):
+            started = time.perf_counter()
+            queryset.count()
+            list(queryset[(page - 1) * PAGE_SIZE:page * PAGE_SIZE])
+            elapsed = time.perf_counter() - started
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = round(best * 1000, 2)
+    return results
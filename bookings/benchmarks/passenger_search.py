@@ -0,0 +1,86 @@
+from datetime import date, timedelta
+from itertools import islice
+import random
+import time
+
+from django.db import connection
+from django.db.models import Q
+
+from bookings.models import Passenger
+from bookings.passenger_search import match_passengers, search_passengers
+from . import scenario
+from .data import BATCH_SIZE
+from .itineraries import _latencies
+
+SYLLABLES = ('ba', 'de', 'ki', 'lo', 'mu', 'na', 'pe', 'ri', 'so', 'tu', 'va', 'ze', 'kho', 'thi', 'ndla', 'mo', 'se', 'la', 'wa', 'ne')
+PROBES = 2500
+
+def _passengers(count, rng):
+    """ Passengers spread over ~170k surnames and ~400 first names, as a generator so any count fits in memory. """
+    for i in range(count):
+        last_name = ''.join(rng.choice(SYLLABLES) for _ in range(rng.choice((3, 4)))).capitalize()
+        first_name = ''.join(rng.choice(SYLLABLES) for _ in range(2)).capitalize()
+        passenger = Passenger(
+            first_name=first_name, last_name=last_name, email=f'p{i}@bench.example.com',
+            date_of_birth=date(1940, 1, 1) + timedelta(days=rng.randrange(30000)),
+        )
+        passenger.set_name_keys() # bulk_create skips save()
+        yield passenger
+
+@scenario('passenger_search', on_disk=True)
+def passenger_search(options):
+    """
+    Passenger lookup over 10M x scale passengers: exact name + date of birth,
+    name prefixes and email searches, the icontains scan the admin used to
+    run, and matching a 5,000-record import batch in one query.
+    """
+    total = 10_000_000 * options['scale']
+    rng = random.Random(25)
+    every = total // PROBES
+    probes = []
+    passengers = _passengers(total, rng)
+    offset = 0
+    started = time.perf_counter()
+    while batch := list(islice(passengers, BATCH_SIZE)):
+        Passenger.objects.bulk_create(batch)
+        probes.extend(passenger for i, passenger in enumerate(batch, offset) if i % every == 0)
+        offset += len(batch)
+    results = {'passengers': total, 'seed_rows_per_s': round(total / (time.perf_counter() - started))}
+
+    def lookup(query, date_of_birth=None, expected=None):
+        found = list(search_passengers(query, date_of_birth=date_of_birth).values_list('id', flat=True)[:20])
+        assert expected is None or expected in found, (query, date_of_birth)
+
+    searches = {
+        'exact': [lambda p=p: lookup(f'{p.last_name} {p.first_name}', p.date_of_birth, p.id) for p in probes[:500]],
+        'last_prefix': [lambda p=p: lookup(p.last_name[:3]) for p in probes[:500]],
+        'two_word_prefix': [lambda p=p: lookup(f'{p.first_name[:2]} {p.last_name[:4]}') for p in probes[:500]],
+        'email': [lambda p=p: lookup(p.email, expected=p.id) for p in probes[:500]],
+    }
+    for name, runs in searches.items():
+        results.update({f'{name}_{key}': value for key, value in _latencies(runs).items()})
+    if connection.vendor != 'postgresql': # PostgreSQL serves these from the trigram indexes
+        assert 'passenger_name_dob_idx' in search_passengers('Bado Ki').explain()
+
+    # What the admin's search_fields ran before: icontains on every column, newest first, a page of 100
+    def scan(p):
+        words = [p.last_name, p.first_name]
+        q = Q()
+        for word in words:
+            q &= Q(first_name__icontains=word) | Q(last_name__icontains=word) | Q(email__icontains=word)
+        list(Passenger.objects.filter(q).order_by('-pk')[:100])
+    results.update({f'icontains_scan_{key}': value for key, value in _latencies([lambda p=p: scan(p) for p in probes[:3]]).items()})
+
+    # An import batch: half already known (by email, or by name and date of birth under a new email), half new
+    records = []
+    for i, p in enumerate(probes):
+        email = p.email if i % 2 else f'new{i}@import.example.com'
+        records.append({'first_name': p.first_name.upper(), 'last_name': f' {p.last_name} ', 'date_of_birth': p.date_of_birth, 'email': email})
+    for i in range(5000 - len(records)):
+        records.append({'first_name': 'Nobody', 'last_name': f'Unknown{i}', 'date_of_birth': date(2000, 1, 1), 'email': f'unknown{i}@import.example.com'})
+    started = time.perf_counter()
+    matches = match_passengers(records)
+    results['match_5000_ms'] = round((time.perf_counter() - started) * 1000, 2)
+    assert all(any(match['id'] == p.id for match in found) for p, found in zip(probes, matches))
+    assert not any(matches[len(probes):])
+    return results
@@ -0,0 +1,29 @@
+import time
+
+from bookings.references import ReferenceAllocator, SPACE, decode, encode
+from . import scenario
+
+@scenario('booking_reference', needs_db=True)
+def booking_reference(options):
+    """ Reference allocation throughput, plus an encode/decode round trip over 1M x scale sequence numbers. """
+    allocator = ReferenceAllocator(block_size=1000)
+    allocations = 100_000
+    started = time.perf_counter()
+    for _ in range(allocations):
+        allocator.allocate(1)
+    allocate_seconds = time.perf_counter() - started
+
+    # decode(encode(n)) == n for every n proves no two sequence numbers share a reference
+    checked = 1_000_000 * options['scale']
+    stride = max(SPACE // checked, 1) # Spread the sample over the whole space
+    started = time.perf_counter()
+    for number in range(0, checked * stride, stride):
+        if decode(encode(number)) != number:
+            raise AssertionError(f"Reference mapping is not a bijection at {number}")
+    round_trip_seconds = time.perf_counter() - started
+
+    return {
+        'allocations_per_s': round(allocations / allocate_seconds),
+        'sequence_numbers_checked': checked,
+        'round_trips_per_s': round(checked / round_trip_seconds),
+    }
@@ -0,0 +1,57 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+import random
+import time
+
+import httpx
+from django.core.handlers.wsgi import WSGIHandler
+from django.test import override_settings
+
+from bookings.models import Booking, Flight, SeatMap
+from . import scenario
+from .data import seed_flights, seed_passengers
+
+@scenario('seat_assignment', concurrent_writes=True)
+def seat_assignment(options):
+    """ Concurrent bookings fighting over the same seats; checks no seat is ever assigned twice. """
+    flights = seed_flights(2)
+    seats = flights[0].total_seats
+    passengers = seed_passengers(seats * 2) # More bookings than seats on each flight
+    rng = random.Random(7)
+    payloads = []
+    for passenger in passengers:
+        flight = rng.choice(flights)
+        payload = {"passenger_id": str(passenger.pk), "flight_id": str(flight.pk)}
+        if rng.random() < 0.5:
+            payload["auto_assign_seat"] = True
+        else: # A small set of popular seats, so requests collide
+            payload["seat_number"] = SeatMap.seat_label(rng.randrange(seats // 4))
+        payloads.append(payload)
+
+    with override_settings(ALLOWED_HOSTS=['*'], BOOKING_CONFIRMATION_MODE='sync', EXTERNAL_BOOKING_SERVICE_MODE='simulate'):
+        with httpx.Client(transport=httpx.WSGITransport(app=WSGIHandler()), base_url='http://testserver') as client:
+            started = time.perf_counter()
+            with ThreadPoolExecutor(max_workers=options['concurrency']) as pool:
+                statuses = list(pool.map(lambda payload: client.post('/api/bookings/', json=payload).status_code, payloads))
+            elapsed = time.perf_counter() - started
+
+    held = Booking.objects.filter(status__in=Booking.SEAT_HOLDING_STATUSES, seat_number__isnull=False)
+    per_flight = Counter(held.values_list('flight_id', 'seat_number'))
+    seat_maps_match = True
+    for seat_map in SeatMap.objects.select_related('flight'):
+        assigned = {label for label, free in seat_map.seats() if not free}
+        seat_maps_match &= assigned == {seat for flight_id, seat in per_flight if flight_id == seat_map.flight_id}
+    counters_match = all(
+        flight.seats_booked == Booking.objects.filter(flight=flight, status__in=Booking.SEAT_HOLDING_STATUSES).count()
+        for flight in Flight.objects.all()
+    )
+    return {
+        'requests': len(payloads),
+        'concurrency': options['concurrency'],
+        'bookings_per_s': round(len(payloads) / elapsed, 1),
+        'status_codes': {code: statuses.count(code) for code in sorted(set(statuses))},
+        'seats_assigned': len(per_flight),
+        'double_assigned_seats': sum(1 for count in per_flight.values() if count > 1),
+        'seat_maps_match_bookings': seat_maps_match,
+        'counters_match_bookings': counters_match,
+    }
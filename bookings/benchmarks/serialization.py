@@ -0,0 +1,60 @@
+import time
+
+from rest_framework.renderers import JSONRenderer
+
+from bookings.models import Booking, Flight, Passenger
+from bookings.renderers import FastJSONRenderer
+from bookings.serializers import (
+    BOOKING_REPRESENTATION, FLIGHT_REPRESENTATION, PASSENGER_REPRESENTATION,
+    BookingSerializer, FlightSerializer, PassengerSerializer,
+)
+from . import scenario
+from .data import seed_bookings, seed_flights, seed_passengers
+
+ROWS = 5000
+
+def _cpu_ms_per_1000(render, rows, repeat=3):
+    """ Best of `repeat` runs of render(), in CPU milliseconds per 1,000 rows. Returns (ms, output). """
+    best = None
+    for _ in range(repeat):
+        started = time.process_time()
+        output = render()
+        elapsed = time.process_time() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return round(best * 1000 / (rows / 1000), 2), output
+
+@scenario('serialization', needs_db=True)
+def serialization(options):
+    """
+    CPU time to read and render API list rows: model instances through the DRF
+    serializers and JSONRenderer vs .values() rows through the fast
+    serializers and orjson (5k x scale rows per resource).
+    """
+    rows = ROWS * options['scale']
+    passengers = seed_passengers(rows)
+    seed_bookings(rows, passengers, seed_flights(rows))
+    resources = {
+        'passenger': (Passenger.objects.order_by('-created_at'), PassengerSerializer, PASSENGER_REPRESENTATION),
+        'flight': (Flight.objects.order_by('departure_time'), FlightSerializer, FLIGHT_REPRESENTATION),
+        'booking': (
+            Booking.objects.select_related('passenger', 'flight').order_by('-created_at'),
+            BookingSerializer, BOOKING_REPRESENTATION,
+        ),
+    }
+
+    results = {'rows': rows}
+    for name, (queryset, serializer_class, representation) in resources.items():
+        queryset = queryset[:rows]
+        lookups, serialize = representation.compile()
+
+        def drf():
+            return JSONRenderer().render(serializer_class(queryset.all(), many=True).data)
+
+        def fast():
+            return FastJSONRenderer().render(serialize(queryset.values(*lookups)))
+
+        results[f'{name}_drf_cpu_ms'], expected = _cpu_ms_per_1000(drf, rows)
+        results[f'{name}_fast_cpu_ms'], output = _cpu_ms_per_1000(fast, rows)
+        assert output == expected, f"Fast {name} output differs from the DRF serializer's"
+        results[f'{name}_speedup'] = round(results[f'{name}_drf_cpu_ms'] / results[f'{name}_fast_cpu_ms'], 1)
+    return results
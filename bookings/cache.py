@@ -1,43 +1,288 @@
-from django.core.cache import cache
-from .models import Flight, Booking
+from django.conf import settings
+from django.core.cache import DEFAULT_CACHE_ALIAS, cache, caches
+from django.core.cache.backends.redis import RedisCache
+from .models import Flight
+from .metrics import record_cache
+from .response_cache import bump_flight_versions
+from itertools import islice
+import asyncio
 import logging
+import random
+import time
 
 logger = logging.getLogger(__name__)
 
 CACHE_TIMEOUT_FLIGHT_AVAILABILITY = 60 * 5 # Cache for 5 minutes
 CACHE_KEY_FLIGHT_AVAILABILITY = "flight_availability_{flight_id}"
+CACHE_KEY_FLIGHT_AVAILABILITY_LOCK = "flight_availability_lock_{flight_id}"
+# Random token replaced whenever a flight's seat counter changes, see _drop_if_regenerated
+CACHE_KEY_FLIGHT_AVAILABILITY_GENERATION = "flight_availability_gen_{flight_id}"
+RECOMPUTE_LOCK_TIMEOUT = 5 # seconds, in case the lock holder dies
+RECOMPUTE_WAIT = 0.5 # seconds other callers wait for the lock holder before computing themselves
+
+# Redis INCRBY that leaves a missing key missing (a plain INCRBY on an expired key would
+# create it with just the delta and no TTL), after replacing the generation token KEYS[2].
+INCR_IF_EXISTS_SCRIPT = """
+redis.call('SET', KEYS[2], ARGV[2], 'EX', ARGV[3])
+if redis.call('EXISTS', KEYS[1]) == 1 then
+    return redis.call('INCRBY', KEYS[1], ARGV[1])
+end
+return nil
+"""
+
+def _load_flight_availability(flight_id):
+    # Read the denormalized counter instead of counting booking rows
+    total_seats, seats_booked = Flight.objects.values_list('total_seats', 'seats_booked').get(pk=flight_id)
+    return total_seats - seats_booked
+
+def _generation_key(flight_id):
+    return CACHE_KEY_FLIGHT_AVAILABILITY_GENERATION.format(flight_id=flight_id)
+
+def _new_generations(flight_ids):
+    """ {generation key: fresh token} for the flights; tokens are ints so Redis stores them unpickled. """
+    return {_generation_key(flight_id): random.getrandbits(62) for flight_id in flight_ids}
+
+def _regenerated(flight_ids, before, after):
+    """ Cache keys of the flights whose generation token differs between two get_many() reads. """
+    return [
+        CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=flight_id) for flight_id in flight_ids
+        if before.get(_generation_key(flight_id)) != after.get(_generation_key(flight_id))
+    ]
+
+def _drop_if_regenerated(flight_ids, generations):
+    """
+    Deletes the availabilities just cached for `flight_ids` if their
+    generation changed since `generations` (a get_many() of their generation
+    keys) was read, before loading them from the database.
+
+    A booking committing between that load and the cache write finds
+    nothing cached to adjust, so the loaded value would otherwise stay
+    stale until it expires. Writers replace the token before adjusting or
+    deleting the value, so either they adjust what was cached, or the token
+    has moved by the time it is read again here.
+    """
+    stale = _regenerated(flight_ids, generations, cache.get_many([_generation_key(flight_id) for flight_id in flight_ids]))
+    if stale:
+        logger.debug("Dropping %d availabilities loaded before a booking committed", len(stale))
+        cache.delete_many(stale)
+
+async def _adrop_if_regenerated(flight_ids, generations):
+    stale = _regenerated(flight_ids, generations, await cache.aget_many([_generation_key(flight_id) for flight_id in flight_ids]))
+    if stale:
+        logger.debug("Dropping %d availabilities loaded before a booking committed", len(stale))
+        await cache.adelete_many(stale)
 
 def get_flight_availability(flight_id):
     """
     Gets the available seats for a flight, using cache if possible.
     Demonstrates Redis usage as cache.
+
+    On a miss only one caller (per cache, i.e. across all workers with Redis)
+    recomputes the value; the others wait briefly for it instead of all
+    hitting the database at once. The recomputed value is cached with add(),
+    so it never overwrites one a booking already adjusted, and dropped again
+    if a booking committed while it was being read (_drop_if_regenerated).
     """
     cache_key = CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=flight_id)
     availability = cache.get(cache_key)
+    if availability is not None:
+        record_cache('availability', hits=1)
+        return availability
+
+    record_cache('availability', misses=1)
+    logger.debug("Cache miss for flight availability: %s", flight_id)
+    lock_key = CACHE_KEY_FLIGHT_AVAILABILITY_LOCK.format(flight_id=flight_id)
+    if not cache.add(lock_key, 1, RECOMPUTE_LOCK_TIMEOUT):
+        # Someone else is recomputing, give them a moment
+        deadline = time.monotonic() + RECOMPUTE_WAIT
+        while time.monotonic() < deadline:
+            time.sleep(0.02)
+            availability = cache.get(cache_key)
+            if availability is not None:
+                return availability
+        try:
+            return _load_flight_availability(flight_id)
+        except Flight.DoesNotExist:
+            return None
+
+    try:
+        generations = cache.get_many([_generation_key(flight_id)])
+        availability = _load_flight_availability(flight_id)
+        cache.add(cache_key, availability, CACHE_TIMEOUT_FLIGHT_AVAILABILITY)
+        _drop_if_regenerated([flight_id], generations)
+        logger.debug("Calculated and cached flight availability for %s: %s", flight_id, availability)
+    except Flight.DoesNotExist:
+        logger.warning("Attempted to get availability for non-existent flight: %s", flight_id)
+        return None # Or raise an error
+    finally:
+        cache.delete(lock_key)
+
+    return availability
+
+async def aget_flight_availability(flight_id):
+    """
+    asyncio variant of get_flight_availability for the async views, with the
+    same single-recompute behaviour. Waiting for the lock holder sleeps on the
+    event loop instead of blocking a thread.
+    """
+    cache_key = CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=flight_id)
+    availability = await cache.aget(cache_key)
+    if availability is not None:
+        record_cache('availability', hits=1)
+        return availability
 
-    if availability is None:
-        logger.info(f"Cache miss for flight availability: {flight_id}")
+    record_cache('availability', misses=1)
+    logger.debug("Cache miss for flight availability: %s", flight_id)
+    lock_key = CACHE_KEY_FLIGHT_AVAILABILITY_LOCK.format(flight_id=flight_id)
+    if not await cache.aadd(lock_key, 1, RECOMPUTE_LOCK_TIMEOUT):
+        deadline = time.monotonic() + RECOMPUTE_WAIT
+        while time.monotonic() < deadline:
+            await asyncio.sleep(0.02)
+            availability = await cache.aget(cache_key)
+            if availability is not None:
+                return availability
         try:
-            flight = Flight.objects.get(pk=flight_id)
-            # More performant count using the database
-            # select_for_update if expecting high concurrency to avoid race conditions during booking
-            booked_seats = Booking.objects.filter(flight=flight, status='CONFIRMED').count()
-            availability = flight.total_seats - booked_seats
-            cache.set(cache_key, availability, CACHE_TIMEOUT_FLIGHT_AVAILABILITY)
-            logger.info(f"Calculated and cached flight availability for {flight_id}: {availability}")
+            return await _aload_flight_availability(flight_id)
         except Flight.DoesNotExist:
-            logger.warning(f"Attempted to get availability for non-existent flight: {flight_id}")
-            return None # Or raise an error
-    else:
-        logger.info(f"Cache hit for flight availability: {flight_id}")
+            return None
+
+    try:
+        generations = await cache.aget_many([_generation_key(flight_id)])
+        availability = await _aload_flight_availability(flight_id)
+        await cache.aadd(cache_key, availability, CACHE_TIMEOUT_FLIGHT_AVAILABILITY)
+        await _adrop_if_regenerated([flight_id], generations)
+        logger.debug("Calculated and cached flight availability for %s: %s", flight_id, availability)
+    except Flight.DoesNotExist:
+        logger.warning("Attempted to get availability for non-existent flight: %s", flight_id)
+        return None
+    finally:
+        await cache.adelete(lock_key)
 
     return availability
 
+async def _aload_flight_availability(flight_id):
+    total_seats, seats_booked = await Flight.objects.values_list('total_seats', 'seats_booked').aget(pk=flight_id)
+    return total_seats - seats_booked
+
+def get_many_flight_availability(flight_ids):
+    """
+    Bulk variant of get_flight_availability for list responses.
+    Reads all keys in one cache round trip and loads the misses from the
+    flights' seat counters in a single query. Returns a dict of {flight_id: available_seats};
+    ids of non-existent flights are omitted.
+    """
+    flight_ids = {str(flight_id) for flight_id in flight_ids}
+    if not flight_ids:
+        return {}
+
+    keys = {CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=flight_id): flight_id for flight_id in flight_ids}
+    cached = cache.get_many(keys.keys())
+    availability = {keys[key]: value for key, value in cached.items()}
+
+    missing = flight_ids - availability.keys()
+    record_cache('availability', hits=len(availability), misses=len(missing))
+    if missing:
+        logger.debug("Cache miss for %d of %d flight availabilities", len(missing), len(flight_ids))
+        generations = cache.get_many([_generation_key(flight_id) for flight_id in missing])
+        rows = Flight.objects.filter(pk__in=missing).values_list('pk', 'total_seats', 'seats_booked')
+        computed = {str(pk): total_seats - seats_booked for pk, total_seats, seats_booked in rows}
+        # set_many() is one round trip where add() would be one per flight; a value a booking
+        # adjusted meanwhile is either overwritten with a fresher one or dropped below
+        cache.set_many(
+            {CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=flight_id): value for flight_id, value in computed.items()},
+            CACHE_TIMEOUT_FLIGHT_AVAILABILITY,
+        )
+        _drop_if_regenerated(computed, generations)
+        availability.update(computed)
+
+    return availability
+
+def rebuild_flight_availability_cache(flights, chunk_size=1000):
+    """
+    Recomputes and caches availability for every flight in a queryset, e.g.
+    after a bulk schedule load (bulk_create skips the signals and write
+    paths that normally keep the cache in step). Also expires cached flight
+    responses. Returns the number of flights cached.
+    """
+    rows = flights.order_by().values_list('pk', 'total_seats', 'seats_booked').iterator(chunk_size=chunk_size)
+    cached = 0
+    while chunk := list(islice(rows, chunk_size)):
+        cache.set_many(
+            {CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=pk): total_seats - seats_booked for pk, total_seats, seats_booked in chunk},
+            CACHE_TIMEOUT_FLIGHT_AVAILABILITY,
+        )
+        bump_flight_versions([pk for pk, _, _ in chunk])
+        cached += len(chunk)
+    bump_flight_versions([], catalog=True) # New flights can appear in any search
+    logger.info("Rebuilt cached availability for %s flights", cached)
+    return cached
+
+def _incr_if_exists(cache_key, delta, generation_key):
+    """
+    Atomically adds delta to a cached integer if (and only if) it is cached,
+    after giving it a new generation token (see _drop_if_regenerated).
+    """
+    backend = caches[DEFAULT_CACHE_ALIAS] # The backend behind the `cache` proxy
+    if isinstance(backend, RedisCache):
+        key = backend.make_and_validate_key(cache_key)
+        generation_key = backend.make_and_validate_key(generation_key)
+        # The backend has no public conditional INCR, so use its raw redis-py client. Both keys
+        # share the flight id, so client-side sharding would have to hash on it.
+        backend._cache.get_client(key, write=True).eval(
+            INCR_IF_EXISTS_SCRIPT, 2, key, generation_key, delta, random.getrandbits(62), CACHE_TIMEOUT_FLIGHT_AVAILABILITY,
+        )
+        return
+    # Not atomic with the INCR here, but LocMemCache is only shared by one process's threads
+    cache.set(generation_key, random.getrandbits(62), CACHE_TIMEOUT_FLIGHT_AVAILABILITY)
+    try:
+        cache.incr(cache_key, delta) # Locked in LocMemCache, raises if missing
+    except ValueError:
+        pass # Not cached, the next read loads it from the database
+
+def record_seat_changes(changes):
+    """
+    Applies committed seat counter changes to the availability cache.
+    Called by bookings.inventory after the transaction commits.
+
+    With FLIGHT_AVAILABILITY_CACHE_MODE = 'write_through' (default) cached
+    values are adjusted in place with an atomic INCR/DECR, so hot flights
+    stay cached through bookings. 'invalidate' deletes the keys instead.
+
+    Args:
+        changes (dict): {flight_id: change in seats_booked}
+    """
+    try:
+        # Cached flight responses embed availability, expire the ones showing these flights
+        bump_flight_versions(flight_id for flight_id, seats_delta in changes.items() if seats_delta)
+        if settings.FLIGHT_AVAILABILITY_CACHE_MODE != 'write_through':
+            invalidate_many_flight_availability_cache(changes)
+            return
+        for flight_id, seats_delta in changes.items():
+            if seats_delta:
+                # Availability moves opposite to the number of booked seats
+                _incr_if_exists(CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=flight_id), -seats_delta, _generation_key(flight_id))
+        logger.info("Updated cached availability for %s flight(s)", len(changes))
+    except Exception:
+        # The booking has already committed, so never fail the request over the cache.
+        # Cached values expire after CACHE_TIMEOUT_FLIGHT_AVAILABILITY at the latest.
+        logger.exception("Could not update cached availability for flights %s", list(changes))
+
 def invalidate_flight_availability_cache(flight_id):
     """
     Invalidates the cache for a specific flight's availability.
-    Call this after a booking is confirmed or cancelled.
+    Use it when the new value isn't known as a delta (e.g. after reconciling counters).
     """
     cache_key = CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=flight_id)
-    logger.info(f"Invalidating cache for flight availability: {flight_id}")
-    cache.delete(cache_key) 
\ No newline at end of file
+    logger.info("Invalidating cache for flight availability: %s", flight_id)
+    cache.set_many(_new_generations([flight_id]), CACHE_TIMEOUT_FLIGHT_AVAILABILITY) # Before the delete, see _drop_if_regenerated
+    cache.delete(cache_key)
+    bump_flight_versions([flight_id])
+
+def invalidate_many_flight_availability_cache(flight_ids):
+    """ Bulk variant of invalidate_flight_availability_cache (one cache round trip). """
+    keys = [CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=flight_id) for flight_id in flight_ids]
+    if keys:
+        logger.info("Invalidating cache for %s flight availabilities", len(keys))
+        cache.set_many(_new_generations(flight_ids), CACHE_TIMEOUT_FLIGHT_AVAILABILITY) # Before the delete, see _drop_if_regenerated
+        cache.delete_many(keys)
+        bump_flight_versions(flight_ids)
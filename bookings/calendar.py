@@ -0,0 +1,116 @@
+"""
+Route calendar: per route and departure day, the number of flights, their
+free seats and the cheapest flight with a seat left (RouteDayAvailability),
+so a month of fares is one range scan on the (origin_key, destination_key,
+day) unique index instead of a listing of every flight.
+
+A summary row is recomputed from its flights (a range scan on the route
+index) whenever something that changes it commits:
+
+* seat counter changes reach it through the booking event relay
+  (bookings.events, consumer `route_calendar`), batched per relay pass,
+  so booking requests don't pay for it and the calendar trails bookings
+  by a few seconds;
+* flights saved or deleted through the ORM refresh their day (and their
+  previous day, if they moved) through the signals in bookings.signals;
+* bulk schedule loads and `manage.py rebuild_route_calendar` rebuild the
+  whole table from one GROUP BY.
+
+Days are local dates in TIME_ZONE; days already past are dropped by the rebuild.
+"""
+from itertools import islice
+import logging
+
+from django.db.models import Count, F, Min, Q, Sum
+from django.db.models.functions import TruncDate
+from django.utils import timezone
+
+from .models import Flight, RouteDayAvailability
+from .search import day_range
+
+logger = logging.getLogger(__name__)
+
+KEY_FIELDS = ('origin_key', 'destination_key', 'day')
+SUMMARY_FIELDS = ('flights', 'available_seats', 'min_price')
+CALENDAR_FIELDS = ('day',) + SUMMARY_FIELDS
+BUCKETS_PER_QUERY = 200
+
+def _summaries(flights):
+    """ One summary dict per (origin_key, destination_key, day) of a Flight queryset. """
+    return (
+        flights.annotate(day=TruncDate('departure_time', tzinfo=timezone.get_current_timezone()))
+        .values(*KEY_FIELDS)
+        .annotate(
+            flights=Count('pk'),
+            available_seats=Sum(F('total_seats') - F('seats_booked')),
+            min_price=Min('price', filter=Q(seats_booked__lt=F('total_seats'))),
+        )
+        .order_by()
+    )
+
+def _save(summaries):
+    RouteDayAvailability.objects.bulk_create(
+        [RouteDayAvailability(**summary) for summary in summaries],
+        update_conflicts=True, unique_fields=KEY_FIELDS, update_fields=SUMMARY_FIELDS + ('updated_at',),
+    )
+
+def _bucket_filter(buckets, day_field=None):
+    """ Q matching the given (origin_key, destination_key, day) buckets, on flights or (with day_field) summaries. """
+    q = Q()
+    for origin_key, destination_key, day in buckets:
+        if day_field:
+            q |= Q(origin_key=origin_key, destination_key=destination_key, **{day_field: day})
+        else:
+            start, end = day_range(day)
+            q |= Q(origin_key=origin_key, destination_key=destination_key, departure_time__gte=start, departure_time__lt=end)
+    return q
+
+def flight_bucket(origin_key, destination_key, departure_time):
+    return origin_key, destination_key, timezone.localdate(departure_time)
+
+def refresh_route_days(buckets):
+    """ Recomputes the summaries of the given (origin_key, destination_key, day) buckets, deleting emptied ones. """
+    buckets = iter(set(buckets))
+    refreshed = 0
+    while chunk := list(islice(buckets, BUCKETS_PER_QUERY)):
+        summaries = list(_summaries(Flight.objects.filter(_bucket_filter(chunk))))
+        _save(summaries)
+        empty = set(chunk) - {tuple(summary[field] for field in KEY_FIELDS) for summary in summaries}
+        if empty:
+            RouteDayAvailability.objects.filter(_bucket_filter(empty, day_field='day')).delete()
+        refreshed += len(chunk)
+    return refreshed
+
+def refresh_flights(flight_ids):
+    """ Recomputes the days of the given flights. """
+    rows = Flight.objects.filter(pk__in=list(flight_ids)).values_list('origin_key', 'destination_key', 'departure_time')
+    return refresh_route_days(flight_bucket(*row) for row in rows)
+
+def refresh_from_events(events):
+    """ Booking event consumer (bookings.events): refreshes the days of the flights whose bookings changed. """
+    refresh_flights({event['flight_id'] for event in events})
+
+def rebuild_route_calendar(chunk_size=5000):
+    """
+    Recomputes every summary from today onwards from one GROUP BY over the
+    flights, then deletes the ones for days past or without flights left.
+    Returns the number of summaries written.
+    """
+    rebuilt_at = timezone.now()
+    today = timezone.localdate()
+    summaries = _summaries(Flight.objects.filter(departure_time__gte=day_range(today)[0])).iterator(chunk_size=chunk_size)
+    written = 0
+    while chunk := list(islice(summaries, chunk_size)):
+        _save(chunk)
+        written += len(chunk)
+    RouteDayAvailability.objects.filter(Q(day__lt=today) | Q(updated_at__lt=rebuilt_at)).delete()
+    logger.info("Rebuilt the route calendar: %d route days.", written)
+    return written
+
+def route_calendar(origin_key, destination_key, start, end):
+    """ Summary dicts of a route for the days in [start, end], in day order. """
+    return list(
+        RouteDayAvailability.objects
+        .filter(origin_key=origin_key, destination_key=destination_key, day__gte=start, day__lte=end)
+        .order_by('day').values(*CALENDAR_FIELDS)
+    )
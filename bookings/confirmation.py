@@ -0,0 +1,189 @@
+from asgiref.sync import sync_to_async
+from collections import Counter, defaultdict
+from concurrent.futures import ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Case, Value, When
+from django.utils import timezone
+import logging
+import threading
+
+from .events import record_events
+from .models import Booking
+from .inventory import release_seat, release_seat_numbers_bulk, release_seats, release_seats_bulk
+from .services import (
+    async_external_booking_confirmation, simulate_external_batch_confirmation, simulate_external_booking_confirmation,
+)
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+def get_executor():
+    """ Lazily creates the process-wide pool that runs background confirmations. """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BOOKING_CONFIRMATION_WORKERS,
+                thread_name_prefix='booking-confirmation',
+            )
+    return _executor
+
+def confirm_booking(booking):
+    """
+    Confirms a PENDING booking with the external service and records the outcome.
+
+    The external call runs outside any database transaction. The result is
+    written with a conditional UPDATE so a booking that was cancelled (or
+    otherwise moved on) while the call was in flight is left untouched.
+    A failed booking gives its seat back, which also updates the
+    flight's availability cache.
+
+    Args:
+        booking (Booking): The PENDING booking, ideally with passenger and flight loaded.
+
+    Returns:
+        str | None: The external service's error message if confirmation failed.
+    """
+    success, external_ref, error_message = simulate_external_booking_confirmation(booking)
+    record_confirmation(booking, success, external_ref, error_message)
+    return error_message
+
+async def aconfirm_booking(booking, record=None):
+    """
+    asyncio variant of confirm_booking: awaits the external service on the
+    event loop and records the outcome in a worker thread.
+
+    Args:
+        record (coroutine function, optional): Runs record_confirmation, for
+            callers that throttle database access. Defaults to sync_to_async.
+    """
+    success, external_ref, error_message = await async_external_booking_confirmation(booking)
+    await (record or sync_to_async(record_confirmation))(booking, success, external_ref, error_message)
+    return error_message
+
+def record_confirmation(booking, success, external_ref, error_message):
+    """ Writes the external service's verdict on a PENDING booking (see confirm_booking). """
+    with transaction.atomic():
+        pending = Booking.objects.filter(pk=booking.pk, status='PENDING')
+        if success:
+            updated = pending.update(status='CONFIRMED', external_system_ref=external_ref, updated_at=timezone.now())
+        else:
+            updated = pending.update(status='FAILED', updated_at=timezone.now())
+            if updated:
+                release_seats(booking.flight_id)
+                release_seat(booking.flight_id, booking.seat_number)
+        if updated:
+            record_events([booking], status='CONFIRMED' if success else 'FAILED', previous_status='PENDING')
+
+    if not updated:
+        booking.refresh_from_db(fields=['status', 'external_system_ref', 'updated_at'])
+        logger.warning("Booking %s left PENDING while being confirmed, now %s. Result discarded.", booking.id, booking.status)
+    elif success:
+        booking.status = 'CONFIRMED'
+        booking.external_system_ref = external_ref
+        logger.info("Booking %s confirmed externally. Ref: %s.", booking.id, external_ref)
+    else:
+        booking.status = 'FAILED'
+        logger.error("External confirmation failed for booking %s. Status set to FAILED. Reason: %s", booking.id, error_message)
+
+def confirm_bookings(bookings):
+    """
+    Batch counterpart of confirm_booking used by bulk bookings.
+
+    Sends one batched request to the external service, then records every
+    outcome with a fixed number of statements: one locking SELECT, one UPDATE
+    for the confirmed bookings, one for the failed ones, one to give the
+    failed bookings' seats back and an outbox INSERT for each outcome.
+
+    Returns:
+        dict: {booking_id: error_message} for the bookings that failed.
+    """
+    if not bookings:
+        return {}
+    results = simulate_external_batch_confirmation(bookings)
+    by_id = {booking.pk: booking for booking in bookings}
+    external_refs = {booking.pk: ref for booking, (success, ref, _) in zip(bookings, results) if success}
+    errors = {booking.pk: error for booking, (success, _, error) in zip(bookings, results) if not success}
+
+    with transaction.atomic():
+        pending = set(
+            Booking.objects.select_for_update()
+            .filter(pk__in=list(by_id), status='PENDING')
+            .values_list('pk', flat=True)
+        )
+        now = timezone.now()
+        confirmed = [pk for pk in external_refs if pk in pending]
+        failed = [pk for pk in errors if pk in pending]
+
+        if confirmed:
+            Booking.objects.filter(pk__in=confirmed).update(
+                status='CONFIRMED',
+                external_system_ref=Case(*[When(pk=pk, then=Value(external_refs[pk])) for pk in confirmed]),
+                updated_at=now,
+            )
+        if failed:
+            Booking.objects.filter(pk__in=failed).update(status='FAILED', updated_at=now)
+            release_seats_bulk(Counter(by_id[pk].flight_id for pk in failed))
+            seat_numbers = defaultdict(list)
+            for pk in failed:
+                seat_numbers[by_id[pk].flight_id].append(by_id[pk].seat_number)
+            release_seat_numbers_bulk(seat_numbers)
+        record_events([by_id[pk] for pk in confirmed], status='CONFIRMED', previous_status='PENDING')
+        record_events([by_id[pk] for pk in failed], status='FAILED', previous_status='PENDING')
+
+    for pk in confirmed:
+        by_id[pk].status = 'CONFIRMED'
+        by_id[pk].external_system_ref = external_refs[pk]
+    for pk in failed:
+        by_id[pk].status = 'FAILED'
+        by_id[pk].flight.seats_booked -= 1 # Mirror the released seat on the in-memory flight
+    skipped = len(bookings) - len(confirmed) - len(failed)
+    logger.info("Batch confirmation: %s confirmed, %s failed, %s no longer PENDING.", len(confirmed), len(failed), skipped)
+
+    return {pk: errors[pk] for pk in failed}
+
+def process_confirmation(booking_id):
+    """ Worker entry point: loads the booking and confirms it. """
+    close_old_connections()
+    try:
+        booking = Booking.objects.select_related('passenger', 'flight').get(pk=booking_id)
+        if booking.status != 'PENDING':
+            logger.info("Skipping confirmation of booking %s, status is already %s.", booking_id, booking.status)
+            return
+        confirm_booking(booking)
+    except Booking.DoesNotExist:
+        logger.warning("Booking %s disappeared before it could be confirmed.", booking_id)
+    except Exception:
+        # The booking stays PENDING; don't let the error vanish inside the pool
+        logger.exception("Background confirmation of booking %s crashed.", booking_id)
+    finally:
+        close_old_connections()
+
+def enqueue_confirmation(booking_id):
+    """
+    Hands a PENDING booking to the background pool once the current
+    transaction (if any) has committed, so the worker always sees the row.
+
+    Note the pool lives in this process: jobs queued when a worker process
+    exits are lost and the booking stays PENDING.
+    """
+    transaction.on_commit(lambda: get_executor().submit(process_confirmation, booking_id))
+
+def process_batch_confirmation(booking_ids):
+    """ Worker entry point for bulk bookings: loads the still-PENDING bookings and confirms them together. """
+    close_old_connections()
+    try:
+        bookings = list(Booking.objects.select_related('passenger', 'flight').filter(pk__in=booking_ids, status='PENDING'))
+        confirm_bookings(bookings)
+    except Exception:
+        logger.exception("Background confirmation of %s bulk bookings crashed.", len(booking_ids))
+    finally:
+        close_old_connections()
+
+def enqueue_batch_confirmation(booking_ids):
+    """ Bulk counterpart of enqueue_confirmation; the whole batch is confirmed in one external call. """
+    booking_ids = list(booking_ids)
+    transaction.on_commit(lambda: get_executor().submit(process_batch_confirmation, booking_ids))
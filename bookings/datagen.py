@@ -0,0 +1,65 @@
+"""
+Synthetic schedules and passenger files in the formats bookings.loaders
+reads, for building large benchmark datasets. Records are generated and
+written one at a time, so any size can be produced in constant memory.
+Output is deterministic for a given seed.
+"""
+from datetime import date, timedelta
+import csv
+import json
+import random
+
+from django.utils import timezone
+
+AIRPORTS = (
+    'JNB', 'CPT', 'DUR', 'PLZ', 'ELS', 'BFN', 'GRJ', 'MQP', 'KIM', 'PZB',
+    'WDH', 'GBE', 'HRE', 'LUN', 'MPM', 'NBO', 'ADD', 'LOS', 'ACC', 'CAI',
+)
+FIRST_NAMES = ('Thabo', 'Naledi', 'Sipho', 'Lerato', 'Pieter', 'Anika', 'Ayesha', 'Zayn', 'Kagiso', 'Emma', 'Liam', 'Amahle')
+LAST_NAMES = ('Nkosi', 'Dlamini', 'van der Merwe', 'Botha', 'Naidoo', 'Patel', 'Mokoena', 'Smith', 'Khumalo', 'Bux', 'Jacobs')
+FLIGHT_FIELDS = ('flight_number', 'origin', 'destination', 'departure_time', 'arrival_time', 'total_seats', 'price')
+PASSENGER_FIELDS = ('first_name', 'last_name', 'email', 'date_of_birth')
+
+def generate_flights(count, days=180, seed=0):
+    """ `count` flights departing over the next `days` days, with unique flight numbers. """
+    rng = random.Random(seed)
+    start = timezone.now().replace(minute=0, second=0, microsecond=0) + timedelta(days=1)
+    for i in range(count):
+        origin, destination = rng.sample(AIRPORTS, 2)
+        departure = start + timedelta(minutes=5 * rng.randrange(days * 24 * 12))
+        yield {
+            'flight_number': f'SF{i:07d}',
+            'origin': origin,
+            'destination': destination,
+            'departure_time': departure.isoformat(),
+            'arrival_time': (departure + timedelta(minutes=rng.randrange(60, 600))).isoformat(),
+            'total_seats': rng.choice((120, 150, 180, 220, 300)),
+            'price': f'{rng.randrange(500, 15000)}.00',
+        }
+
+def generate_passengers(count, seed=0):
+    """ `count` passengers with unique emails. """
+    rng = random.Random(seed)
+    for i in range(count):
+        first_name, last_name = rng.choice(FIRST_NAMES), rng.choice(LAST_NAMES)
+        yield {
+            'first_name': first_name,
+            'last_name': last_name,
+            'email': f"{first_name}.{last_name.replace(' ', '')}.{i}@example.com".lower(),
+            'date_of_birth': (date(1940, 1, 1) + timedelta(days=rng.randrange(30000))).isoformat(),
+        }
+
+def write_records(records, fields, path, output='csv'):
+    """ Writes records to a CSV (with header) or NDJSON file. Returns the number written. """
+    written = 0
+    with open(path, 'w', newline='', encoding='utf-8') as out:
+        if output == 'csv':
+            writer = csv.DictWriter(out, fieldnames=fields)
+            writer.writeheader()
+        for record in records:
+            if output == 'csv':
+                writer.writerow(record)
+            else:
+                out.write(json.dumps(record) + '\n')
+            written += 1
+    return written
@@ -0,0 +1,68 @@
+"""
+Read replica routing.
+
+Writes always go to the primary ('default'). Reads go to a replica from
+DATABASE_REPLICAS only inside a request that bookings.middleware.
+ReplicaRoutingMiddleware has allowed to use them: a GET/HEAD/OPTIONS from a
+client that hasn't written anything in the last REPLICA_STICKY_SECONDS.
+Everything else reads from the primary, including management commands,
+background workers and any query inside a transaction on the primary, so
+code that reads a row and then updates it never sees a lagging copy.
+
+A client that makes a write gets a cookie pinning its reads to the primary
+for the sticky window, so it sees its own bookings straight away, on any
+worker. The window should be longer than the usual replication lag.
+"""
+from contextvars import ContextVar
+import random
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+_replica = ContextVar('read_replica', default=None) # Alias chosen for the current request, if any
+
+def use_replica():
+    """
+    Lets reads in the current context go to a replica, one picked at random
+    and kept for the rest of the request. Returns a token for reset_replica,
+    or None when there are no replicas.
+    """
+    if not settings.DATABASE_REPLICAS:
+        return None
+    return _replica.set(random.choice(settings.DATABASE_REPLICAS))
+
+def reset_replica(token):
+    if token is not None:
+        _replica.reset(token)
+
+def reading_from_replica():
+    """ Whether reads in the current context may see replication lag. """
+    return _replica.get() is not None and not connections[DEFAULT_DB_ALIAS].in_atomic_block
+
+def sticky_until(written_at=None):
+    """ Cookie value pinning a client to the primary for REPLICA_STICKY_SECONDS from `written_at` (now). """
+    return str(round((written_at or time.time()) + settings.REPLICA_STICKY_SECONDS, 3))
+
+def is_sticky(value):
+    """ Whether a sticky cookie value is still within its window. """
+    try:
+        return float(value) > time.time()
+    except (TypeError, ValueError):
+        return False
+
+class PrimaryReplicaRouter:
+    """ Sends reads to the request's replica when allowed, everything else to the primary. """
+
+    def db_for_read(self, model, **hints):
+        alias = _replica.get()
+        if alias is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return alias
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the same data as the primary, so objects from any of them can be related
+        return True
@@ -0,0 +1,136 @@
+"""
+Booking status change events: a transactional outbox, its relay and the
+change feed.
+
+Every status change (creation as PENDING, confirmation, failure,
+cancellation, expiry, forced updates) inserts a BookingEvent in the same
+transaction as the change itself, so an event exists if and only if the
+change committed. Nothing is sent from the request.
+
+The relay (`manage.py relay_booking_events`) reads the outbox in id order,
+a batch at a time, and hands each batch to the consumers in
+BOOKING_EVENT_CONSUMERS (name -> dotted path of a callable taking a list
+of event dicts). A consumer's position is stored after its call returns,
+so delivery is at least once: a consumer that raises gets the same events
+again on the next pass, without holding up the others. Run one relay.
+
+/api/bookings/changes/?since=<cursor> serves the same events to polling
+clients, the cursor being the last event id they have seen.
+
+Ids are allocated at insert but become visible at commit, so a short
+transaction can commit after a later one. Events are therefore only
+relayed and served once BOOKING_EVENT_SETTLE_SECONDS old (plus the replica
+sticky window when read from a replica), which must exceed the longest
+transaction writing them; all of them are short.
+"""
+from datetime import timedelta
+import logging
+
+from django.conf import settings
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from .db_router import reading_from_replica
+from .models import BookingEvent, EventRelayPosition
+
+logger = logging.getLogger(__name__)
+
+EVENT_FIELDS = ('id', 'booking_id', 'booking_reference', 'flight_id', 'status', 'previous_status', 'created_at')
+
+def record_events(bookings, status=None, previous_status=None):
+    """
+    Adds an event per booking to the outbox, in one INSERT. Call inside the
+    transaction that changes the bookings' status.
+
+    Args:
+        bookings (iterable[Booking]): The changed bookings.
+        status (str, optional): Their new status, if not yet set on the instances.
+        previous_status (str, optional): Their status before the change, None for new bookings.
+    """
+    events = [
+        BookingEvent(
+            booking_id=booking.pk, booking_reference=booking.booking_reference, flight_id=booking.flight_id,
+            status=status or booking.status, previous_status=previous_status,
+        )
+        for booking in bookings
+    ]
+    if events:
+        BookingEvent.objects.bulk_create(events)
+
+def settled_events():
+    """ Events old enough that no earlier id can still be uncommitted. """
+    settle = settings.BOOKING_EVENT_SETTLE_SECONDS
+    if reading_from_replica():
+        settle += settings.REPLICA_STICKY_SECONDS
+    return BookingEvent.objects.filter(created_at__lte=timezone.now() - timedelta(seconds=settle)).order_by('id')
+
+def changes_since(since, limit):
+    """
+    Up to `limit` settled events after event id `since`.
+
+    Returns:
+        tuple: (list of event dicts, whether more are ready)
+    """
+    events = list(settled_events().filter(id__gt=since).values(*EVENT_FIELDS)[:limit + 1])
+    return events[:limit], len(events) > limit
+
+def get_consumers():
+    """ {name: callable} from BOOKING_EVENT_CONSUMERS. """
+    return {name: import_string(path) for name, path in settings.BOOKING_EVENT_CONSUMERS.items()}
+
+def relay_events(consumers, batch_size=None):
+    """
+    One relay pass: gives every consumer up to `batch_size` (default
+    BOOKING_EVENT_RELAY_BATCH_SIZE) events after its position. Consumers at
+    the same position, normally all of them, share one read.
+
+    Returns:
+        int: The most events any consumer took; less than batch_size once
+             caught up (or when the behind consumers failed).
+    """
+    batch_size = batch_size or settings.BOOKING_EVENT_RELAY_BATCH_SIZE
+    positions = dict.fromkeys(consumers, 0)
+    positions.update(EventRelayPosition.objects.filter(consumer__in=list(consumers)).values_list('consumer', 'last_event_id'))
+
+    delivered = 0
+    for position in sorted(set(positions.values())):
+        events = list(settled_events().filter(id__gt=position).values(*EVENT_FIELDS)[:batch_size])
+        if not events:
+            continue
+        for name in [name for name, at in positions.items() if at == position]:
+            try:
+                consumers[name](events)
+            except Exception:
+                logger.exception("Event consumer %s failed on events %d-%d, retrying them next pass.", name, events[0]['id'], events[-1]['id'])
+                continue
+            EventRelayPosition.objects.update_or_create(consumer=name, defaults={'last_event_id': events[-1]['id']})
+            delivered = max(delivered, len(events))
+    return delivered
+
+def prune_events(consumers, batch_size=None):
+    """
+    Deletes events older than BOOKING_EVENT_RETENTION_DAYS that every
+    consumer has processed, in batches. Returns the number deleted.
+    """
+    batch_size = batch_size or settings.BOOKING_EVENT_RELAY_BATCH_SIZE
+    positions = list(EventRelayPosition.objects.filter(consumer__in=list(consumers)).values_list('last_event_id', flat=True))
+    if len(positions) < len(consumers):
+        return 0 # A consumer hasn't run yet and starts from the first event
+    expired = BookingEvent.objects.filter(
+        created_at__lt=timezone.now() - timedelta(days=settings.BOOKING_EVENT_RETENTION_DAYS),
+    ).order_by('id')
+    if positions:
+        expired = expired.filter(id__lte=min(positions))
+    deleted = 0
+    while True:
+        ids = list(expired.values_list('id', flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += BookingEvent.objects.filter(id__in=ids).delete()[0]
+
+def log_events(events):
+    """ Consumer writing each event as a line to the bookings.events logger, e.g. for an analytics pipeline. """
+    for event in events:
+        logger.info(
+            "%s %s %s -> %s", event['id'], event['booking_reference'], event['previous_status'] or '-', event['status'],
+        )
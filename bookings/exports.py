@@ -0,0 +1,139 @@
+"""
+Streaming NDJSON/CSV exports of bookings and flight manifests.
+
+Rows are read with values_list() over a server-side cursor
+(.iterator(chunk_size=EXPORT_CHUNK_SIZE)) and encoded straight to text, so
+no model instances or serializers are involved and memory stays flat
+whatever the number of rows. Used by the export endpoints and the
+export_bookings command.
+
+Under ASGI, Django buffers a StreamingHttpResponse over a plain iterator
+into a list before sending it, so the endpoints hand it an async iterator
+there instead: each chunk is produced by the sync generator in the
+request's thread (sync_to_async(thread_sensitive=True)), where its
+database connection and cursor live.
+"""
+from datetime import date, datetime
+from decimal import Decimal
+from asgiref.sync import sync_to_async
+from django.core.handlers.asgi import ASGIRequest
+from django.http import StreamingHttpResponse
+import csv
+import json
+import uuid
+
+from .models import Booking
+from .search import day_range
+
+EXPORT_CHUNK_SIZE = 2000 # Rows fetched per round trip
+EXPORT_FORMATS = {'ndjson': 'application/x-ndjson', 'csv': 'text/csv'}
+
+# Output column -> ORM lookup
+BOOKING_EXPORT_FIELDS = {
+    'id': 'id',
+    'booking_reference': 'booking_reference',
+    'status': 'status',
+    'seat_number': 'seat_number',
+    'external_system_ref': 'external_system_ref',
+    'created_at': 'created_at',
+    'passenger_id': 'passenger_id',
+    'passenger_first_name': 'passenger__first_name',
+    'passenger_last_name': 'passenger__last_name',
+    'passenger_email': 'passenger__email',
+    'flight_id': 'flight_id',
+    'flight_number': 'flight__flight_number',
+    'origin': 'flight__origin',
+    'destination': 'flight__destination',
+    'departure_time': 'flight__departure_time',
+}
+
+MANIFEST_FIELDS = {
+    'booking_reference': 'booking_reference',
+    'seat_number': 'seat_number',
+    'status': 'status',
+    'first_name': 'passenger__first_name',
+    'last_name': 'passenger__last_name',
+    'email': 'passenger__email',
+    'date_of_birth': 'passenger__date_of_birth',
+}
+
+def bookings_for_export(day=None, status=None, flight_id=None):
+    """ Bookings in export order (created_at, id), optionally created on `day`, with `status` or on one flight. """
+    queryset = Booking.objects.order_by('created_at', 'pk')
+    if day is not None:
+        start, end = day_range(day)
+        queryset = queryset.filter(created_at__gte=start, created_at__lt=end)
+    if status:
+        queryset = queryset.filter(status=status)
+    if flight_id:
+        queryset = queryset.filter(flight_id=flight_id)
+    return queryset
+
+def manifest_for_export(flight_id):
+    """ The passengers holding a seat on a flight, by seat then name. """
+    return (
+        Booking.objects.filter(flight_id=flight_id, status__in=Booking.SEAT_HOLDING_STATUSES)
+        .order_by('seat_number', 'passenger__last_name', 'passenger__first_name', 'pk')
+    )
+
+def _text(value):
+    if isinstance(value, (datetime, date)):
+        return value.isoformat()
+    if isinstance(value, (uuid.UUID, Decimal)):
+        return str(value)
+    return value
+
+def iter_rows(queryset, fields):
+    """ Yields tuples of the fields' values, fetched EXPORT_CHUNK_SIZE rows at a time. """
+    return queryset.values_list(*fields.values()).iterator(chunk_size=EXPORT_CHUNK_SIZE)
+
+def iter_ndjson(queryset, fields):
+    """ One JSON object per line, yielded a chunk of lines at a time. """
+    columns = list(fields)
+    lines = []
+    for row in iter_rows(queryset, fields):
+        lines.append(json.dumps(dict(zip(columns, map(_text, row)))))
+        if len(lines) == EXPORT_CHUNK_SIZE:
+            yield '\n'.join(lines) + '\n'
+            lines = []
+    if lines:
+        yield '\n'.join(lines) + '\n'
+
+class _Buffer:
+    """ File-like object for csv.writer that hands back what was written. """
+    def write(self, value):
+        return value
+
+def iter_csv(queryset, fields):
+    """ A header row, then one row per booking, yielded a chunk of rows at a time. """
+    writer = csv.writer(_Buffer())
+    yield writer.writerow(list(fields))
+    rows = []
+    for row in iter_rows(queryset, fields):
+        rows.append(writer.writerow([_text(value) for value in row]))
+        if len(rows) == EXPORT_CHUNK_SIZE:
+            yield ''.join(rows)
+            rows = []
+    if rows:
+        yield ''.join(rows)
+
+def iter_export(queryset, fields, output):
+    return iter_ndjson(queryset, fields) if output == 'ndjson' else iter_csv(queryset, fields)
+
+async def _aiter_in_request_thread(chunks):
+    """ Async iterator over a sync generator, advanced (and closed) in the request's thread. """
+    next_chunk = sync_to_async(next, thread_sensitive=True)
+    try:
+        while (chunk := await next_chunk(chunks, None)) is not None:
+            yield chunk
+    finally:
+        await sync_to_async(chunks.close, thread_sensitive=True)()
+
+def streaming_export_response(request, queryset, fields, output, filename):
+    """ StreamingHttpResponse downloading the export as `filename`.<output>, async when served over ASGI. """
+    chunks = iter_export(queryset, fields, output)
+    if isinstance(getattr(request, '_request', request), ASGIRequest): # DRF wraps the HttpRequest
+        chunks = _aiter_in_request_thread(chunks)
+    response = StreamingHttpResponse(chunks, content_type=EXPORT_FORMATS[output])
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{output}"'
+    return response
@@ -0,0 +1,338 @@
+import asyncio
+import bisect
+import logging
+import random
+import threading
+import time
+import weakref
+
+import requests
+from requests.adapters import HTTPAdapter
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+try:
+    import httpx
+except ImportError: # Only needed for AsyncExternalBookingClient
+    httpx = None
+
+logger = logging.getLogger(__name__)
+
+class ExternalServiceError(Exception):
+    """ The external booking system could not be reached or returned an error. """
+
+    def __init__(self, message, retryable=True):
+        super().__init__(message)
+        self.retryable = retryable
+
+class CircuitOpenError(ExternalServiceError):
+    """ Raised without calling the external system while the circuit breaker is open. """
+
+    def __init__(self, message="External booking service circuit is open, failing fast."):
+        super().__init__(message, retryable=False)
+
+class CircuitBreaker:
+    """
+    Classic closed / open / half-open circuit breaker.
+
+    After `failure_threshold` consecutive failures the circuit opens and calls
+    fail fast for `reset_timeout` seconds. Then a single trial call is let
+    through (half-open): success closes the circuit, failure re-opens it.
+    """
+    CLOSED, OPEN, HALF_OPEN = 'closed', 'open', 'half_open'
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self._failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def allow_request(self):
+        with self._lock:
+            if self.state == self.CLOSED:
+                return True
+            if self.state == self.OPEN and time.monotonic() - self._opened_at >= self.reset_timeout:
+                self.state = self.HALF_OPEN
+                return True # The trial call
+            return False
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self.state = self.CLOSED
+
+    def abandon_trial(self):
+        """ Call when an attempt ended without an answer from the service: the next call becomes the trial instead. """
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN # Opened more than reset_timeout ago, so allow_request lets the next call through
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self.state == self.HALF_OPEN or self._failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.warning("External booking service circuit opened after %s failures.", self._failures)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+class LatencyStats:
+    """
+    Thread-safe per-call latency histogram with cumulative Prometheus-style buckets.
+    """
+    BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.bucket_counts = [0] * (len(self.BUCKETS) + 1) # Last one is +Inf
+            self.count = 0
+            self.total = 0.0
+            self.errors = 0
+            self.retries = 0
+            self.rejected = 0 # Calls refused by the open circuit
+
+    def observe(self, seconds, error=False):
+        with self._lock:
+            self.bucket_counts[bisect.bisect_left(self.BUCKETS, seconds)] += 1
+            self.count += 1
+            self.total += seconds
+            self.errors += error
+
+    def increment(self, name):
+        with self._lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def quantile(self, q):
+        """ Upper bound of the bucket holding the q-quantile (None without samples). """
+        with self._lock:
+            target = q * self.count
+            seen = 0
+            for bound, bucket_count in zip(self.BUCKETS + (float('inf'),), self.bucket_counts):
+                seen += bucket_count
+                if seen >= target and self.count:
+                    return bound
+        return None
+
+    def snapshot(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'retries': self.retries,
+            'rejected': self.rejected,
+            'avg_seconds': self.total / self.count if self.count else None,
+            'p50_seconds': self.quantile(0.50),
+            'p95_seconds': self.quantile(0.95),
+            'p99_seconds': self.quantile(0.99),
+        }
+
+_NO_ANSWER = object() # Attempt ended by an unexpected exception or cancellation, not by the service
+
+def _backoff_delay(attempt, base):
+    """ Exponential backoff with full jitter: uniform in [0, base * 2^attempt]. """
+    return random.uniform(0, base * (2 ** attempt))
+
+def _parse_result(body):
+    """ Maps one booking result from the external system to (success, external_ref, error_message). """
+    if body.get('status') == 'CONFIRMED':
+        return True, body.get('externalRef'), None
+    return False, None, body.get('error') or f"External service rejected the booking ({body.get('status')})."
+
+class _ClientBase:
+    def __init__(self, url, timeout, pool_size, max_concurrency, max_retries, retry_backoff, breaker=None):
+        self.url = url
+        self.timeout = timeout
+        self.pool_size = pool_size
+        self.max_concurrency = max_concurrency
+        self.max_retries = max_retries
+        self.retry_backoff = retry_backoff
+        self.breaker = breaker or CircuitBreaker(
+            failure_threshold=settings.EXTERNAL_SERVICE_BREAKER_THRESHOLD,
+            reset_timeout=settings.EXTERNAL_SERVICE_BREAKER_RESET,
+        )
+        self.stats = LatencyStats()
+
+    @classmethod
+    def from_settings(cls, **overrides):
+        options = {
+            'url': settings.EXTERNAL_BOOKING_SERVICE_URL,
+            'timeout': settings.EXTERNAL_SERVICE_TIMEOUT,
+            'pool_size': settings.EXTERNAL_SERVICE_POOL_SIZE,
+            'max_concurrency': settings.EXTERNAL_SERVICE_MAX_CONCURRENCY,
+            'max_retries': settings.EXTERNAL_SERVICE_MAX_RETRIES,
+            'retry_backoff': settings.EXTERNAL_SERVICE_RETRY_BACKOFF,
+        }
+        options.update(overrides)
+        return cls(**options)
+
+    def _check_response(self, status_code, text):
+        if status_code >= 500 or status_code == 429:
+            raise ExternalServiceError(f"External service returned HTTP {status_code}.")
+        if status_code >= 400:
+            raise ExternalServiceError(f"External service rejected the request with HTTP {status_code}: {text[:200]}", retryable=False)
+
+    def _before_attempt(self):
+        if not self.breaker.allow_request():
+            self.stats.increment('rejected')
+            raise CircuitOpenError()
+
+    def _after_attempt(self, started, error):
+        self.stats.observe(time.monotonic() - started, error=error is not None)
+        if error is _NO_ANSWER:
+            # Says nothing about the service, but mustn't leave a half-open trial pending forever
+            self.breaker.abandon_trial()
+        elif error is None or not error.retryable:
+            # Any answer, even a rejected request or an unreadable body, shows the service is up.
+            # Only failures of the service itself count towards opening the circuit.
+            self.breaker.record_success()
+        else:
+            self.breaker.record_failure()
+
+class ExternalBookingClient(_ClientBase):
+    """
+    Reusable, thread-safe client for the external booking system.
+
+    Keeps a persistent keep-alive connection pool (requests.Session), caps the
+    number of in-flight calls, retries transient failures (connection errors,
+    timeouts, 5xx/429) with jittered exponential backoff and fails fast through
+    a circuit breaker while the service is down. Per-call latency is recorded
+    in `stats`.
+    """
+
+    def __init__(self, *args, session=None, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.session = session or requests.Session()
+        adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+        self.session.mount('http://', adapter)
+        self.session.mount('https://', adapter)
+        self._slots = threading.BoundedSemaphore(self.max_concurrency)
+
+    def post(self, payload):
+        """ POSTs a JSON payload and returns the decoded JSON response, retrying transient failures. """
+        for attempt in range(self.max_retries + 1):
+            self._before_attempt()
+            started = time.monotonic()
+            error = _NO_ANSWER
+            try:
+                with self._slots:
+                    response = self.session.post(self.url, json=payload, timeout=self.timeout)
+                self._check_response(response.status_code, response.text)
+                body = response.json()
+                error = None
+                return body
+            except requests.exceptions.RequestException as e:
+                error = ExternalServiceError(f"Network error contacting external service: {e}")
+            except ValueError as e: # Undecodable body
+                error = ExternalServiceError(f"Invalid response from external service: {e}", retryable=False)
+            except ExternalServiceError as e:
+                error = e
+            finally:
+                self._after_attempt(started, error)
+
+            if not error.retryable or attempt == self.max_retries:
+                raise error
+            self.stats.increment('retries')
+            time.sleep(_backoff_delay(attempt, self.retry_backoff))
+
+    def confirm(self, booking_request):
+        """ Confirms one booking. Returns (success, external_ref, error_message). """
+        return _parse_result(self.post({"bookingRequest": booking_request}))
+
+    def confirm_batch(self, booking_requests):
+        """ Confirms many bookings in one call. Returns a result tuple per request, in order. """
+        body = self.post({"batchBookingRequest": booking_requests})
+        return [_parse_result(result) for result in body.get('results', [])]
+
+    def close(self):
+        self.session.close()
+
+class AsyncExternalBookingClient(_ClientBase):
+    """
+    asyncio counterpart of ExternalBookingClient built on an httpx.AsyncClient
+    connection pool. Use one instance per event loop.
+    """
+
+    def __init__(self, *args, **kwargs):
+        if httpx is None:
+            raise ImproperlyConfigured("AsyncExternalBookingClient requires the 'httpx' package.")
+        super().__init__(*args, **kwargs)
+        self.client = httpx.AsyncClient(
+            timeout=self.timeout,
+            limits=httpx.Limits(max_connections=self.pool_size, max_keepalive_connections=self.pool_size),
+        )
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+
+    async def post(self, payload):
+        for attempt in range(self.max_retries + 1):
+            self._before_attempt()
+            started = time.monotonic()
+            error = _NO_ANSWER
+            try:
+                async with self._slots:
+                    response = await self.client.post(self.url, json=payload)
+                self._check_response(response.status_code, response.text)
+                body = response.json()
+                error = None
+                return body
+            except httpx.HTTPError as e:
+                error = ExternalServiceError(f"Network error contacting external service: {e}")
+            except ValueError as e:
+                error = ExternalServiceError(f"Invalid response from external service: {e}", retryable=False)
+            except ExternalServiceError as e:
+                error = e
+            finally:
+                self._after_attempt(started, error)
+
+            if not error.retryable or attempt == self.max_retries:
+                raise error
+            self.stats.increment('retries')
+            await asyncio.sleep(_backoff_delay(attempt, self.retry_backoff))
+
+    async def confirm(self, booking_request):
+        return _parse_result(await self.post({"bookingRequest": booking_request}))
+
+    async def confirm_batch(self, booking_requests):
+        body = await self.post({"batchBookingRequest": booking_requests})
+        return [_parse_result(result) for result in body.get('results', [])]
+
+    async def aclose(self):
+        await self.client.aclose()
+
+_client = None
+_client_lock = threading.Lock()
+
+_async_clients = weakref.WeakKeyDictionary() # Event loop -> AsyncExternalBookingClient
+
+def get_client():
+    """ Returns the process-wide ExternalBookingClient, created from settings on first use. """
+    global _client
+    with _client_lock:
+        if _client is None:
+            _client = ExternalBookingClient.from_settings()
+    return _client
+
+def get_async_client():
+    """
+    Returns the AsyncExternalBookingClient for the running event loop, created
+    from settings on first use. httpx connections are bound to the loop that
+    opened them, so each loop (one per ASGI worker) gets its own pool.
+    """
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        client = _async_clients[loop] = AsyncExternalBookingClient.from_settings()
+    return client
+
+def reset_clients():
+    """ Drops the shared clients so the next call picks up changed settings. """
+    global _client
+    with _client_lock:
+        if _client is not None:
+            _client.close()
+        _client = None
+    _async_clients.clear()
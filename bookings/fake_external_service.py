@@ -0,0 +1,75 @@
+"""
+Local stand-in for the external (legacy) booking system.
+
+Speaks the JSON protocol ExternalBookingClient expects and simulates latency,
+transient errors and rejections. Used for local development, load tests and
+benchmarks: `python manage.py run_fake_booking_service`.
+"""
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+import json
+import random
+import threading
+import time
+import uuid
+
+class FakeBookingServiceHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1' # Keep-alive, so connection pooling is measurable
+    disable_nagle_algorithm = True # Headers and body are separate writes
+    latency = 0.05 # seconds per request
+    jitter = 0.2 # +/- fraction of latency
+    error_rate = 0.0 # share of requests answered with 503
+    reject_rate = 0.0 # share of bookings answered with REJECTED
+
+    def do_POST(self):
+        body = self.rfile.read(int(self.headers.get('Content-Length', 0)))
+        time.sleep(max(self.latency * random.uniform(1 - self.jitter, 1 + self.jitter), 0))
+
+        if random.random() < self.error_rate:
+            self._send(503, {"error": "Simulated outage."})
+            return
+        try:
+            payload = json.loads(body)
+        except ValueError:
+            self._send(400, {"error": "Invalid JSON."})
+            return
+
+        if 'batchBookingRequest' in payload:
+            self._send(200, {"results": [self._confirm(item) for item in payload['batchBookingRequest']]})
+        elif 'bookingRequest' in payload:
+            self._send(200, self._confirm(payload['bookingRequest']))
+        elif 'cancellationNotice' in payload:
+            self._send(200, {"acknowledged": len(payload['cancellationNotice'])})
+        else:
+            self._send(400, {"error": "Unknown request type."})
+
+    def _confirm(self, booking_request):
+        if random.random() < self.reject_rate:
+            return {"status": "REJECTED", "error": "Simulated external service error: Capacity exceeded."}
+        return {"status": "CONFIRMED", "externalRef": f"EXT-{uuid.uuid4().hex[:10].upper()}"}
+
+    def _send(self, status_code, data):
+        encoded = json.dumps(data).encode()
+        self.send_response(status_code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(encoded)))
+        self.end_headers()
+        self.wfile.write(encoded)
+
+    def log_message(self, format, *args):
+        pass # Keep benchmark output readable
+
+class FakeBookingServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 1024 # Load tests open hundreds of connections at once
+
+def make_server(host='127.0.0.1', port=0, **behaviour):
+    """ Builds a threaded server; behaviour overrides the handler's latency/jitter/error_rate/reject_rate. """
+    handler = type('ConfiguredFakeBookingServiceHandler', (FakeBookingServiceHandler,), behaviour)
+    return FakeBookingServer((host, port), handler)
+
+def start_in_thread(**kwargs):
+    """ Starts a server on a free local port in a daemon thread. Returns (server, url); call server.shutdown() when done. """
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}/"
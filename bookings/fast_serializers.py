@@ -0,0 +1,178 @@
+"""
+Read-only fast path for list and retrieve responses.
+
+A ValuesRepresentation is compiled once from a DRF serializer class: for
+every readable field it records the ORM lookup (nested serializers become
+`passenger__email` style joins) and how the value is converted, reusing the
+DRF field's own to_representation where the output isn't the raw value.
+Rows are then read with .values() and turned into dicts by a flat list of
+accessors, without model instances, per-row serializer instances or field
+introspection. The output matches the serializer's, key for key.
+
+FastReadMixin applies this to a viewset's list and retrieve, and adds
+sparse fieldsets: `?fields=id,status,seat_number` returns only those
+top-level fields, and skips the joins for nested blocks that weren't asked for.
+"""
+from functools import lru_cache
+from operator import itemgetter
+
+from django.conf import settings
+from django.utils import timezone
+from rest_framework import ISO_8601, serializers
+from rest_framework.settings import api_settings
+from rest_framework.generics import get_object_or_404
+from rest_framework.response import Response
+
+FIELDS_QUERY_PARAM = 'fields'
+# Fields whose to_representation returns the value unchanged
+_PASSTHROUGH_FIELDS = (serializers.CharField, serializers.IntegerField, serializers.BooleanField, serializers.ChoiceField)
+
+def _convert(lookup, convert):
+    def get(row):
+        value = row[lookup]
+        return None if value is None else convert(value)
+    return get
+
+def _iso_datetime(lookup, field, tz):
+    # DateTimeField.to_representation, with the current timezone looked up once per response instead of per value
+    def get(row):
+        value = row[lookup]
+        if value is None or value.tzinfo is None:
+            return field.to_representation(value)
+        value = value.astimezone(tz).isoformat()
+        return value[:-6] + 'Z' if value.endswith('+00:00') else value
+    return get
+
+def _computed(lookups, compute):
+    def get(row):
+        return compute(*(row[lookup] for lookup in lookups))
+    return get
+
+def _nested(accessors):
+    def get(row):
+        return {name: access(row) for name, access in accessors}
+    return get
+
+class ValuesRepresentation:
+    """
+    Serializes .values() rows in the shape of `serializer_class`.
+
+    Args:
+        serializer_class: The ModelSerializer whose output is reproduced.
+        computed (dict): {field name: (lookups, function)} for SerializerMethodFields
+            of this serializer or a nested one, e.g. {'available_seats': (('total_seats', 'seats_booked'), sub)}.
+    """
+
+    def __init__(self, serializer_class, computed=None):
+        self.serializer_class = serializer_class
+        self.computed = computed or {}
+
+    @property
+    def field_names(self):
+        return [name for name, field in self.serializer_class().fields.items() if not field.write_only]
+
+    def _accessor(self, field, prefix, lookups, tz):
+        """ Returns a function row -> value for one serializer field, adding the lookups it reads. """
+        if isinstance(field, serializers.BaseSerializer):
+            prefix = f'{prefix}{field.source}__'
+            return _nested([
+                (name, self._accessor(child, prefix, lookups, tz))
+                for name, child in field.fields.items() if not child.write_only
+            ])
+        if isinstance(field, serializers.SerializerMethodField):
+            sources, compute = self.computed[field.field_name]
+            sources = [f'{prefix}{source}' for source in sources]
+            lookups.extend(sources)
+            return _computed(sources, compute)
+
+        lookup = f'{prefix}{field.source}'
+        lookups.append(lookup)
+        if isinstance(field, _PASSTHROUGH_FIELDS):
+            return itemgetter(lookup)
+        if isinstance(field, serializers.UUIDField):
+            return _convert(lookup, str)
+        if isinstance(field, serializers.DateTimeField):
+            field_tz = getattr(field, 'timezone', tz)
+            if field_tz is not None and getattr(field, 'format', api_settings.DATETIME_FORMAT) == ISO_8601:
+                return _iso_datetime(lookup, field, field_tz)
+        return _convert(lookup, field.to_representation)
+
+    @lru_cache(maxsize=64)
+    def _build(self, names, tz):
+        """ (lookups, row -> dict function) for the given field names and current timezone. """
+        lookups = []
+        accessors = [
+            (name, self._accessor(field, '', lookups, tz))
+            for name, field in self.serializer_class().fields.items()
+            if not field.write_only and (names is None or name in names)
+        ]
+        return list(dict.fromkeys(lookups)), _nested(accessors)
+
+    def compile(self, names=None):
+        """
+        Returns (lookups, serialize) for the given top-level field names (all by
+        default): the .values() lookups to fetch, and a function turning a list of
+        those rows into a list of output dicts.
+        """
+        lookups, _ = self._build(names, None)
+
+        def serialize(rows):
+            tz = timezone.get_current_timezone() if settings.USE_TZ else None
+            build = self._build(names, tz)[1]
+            return [build(row) for row in rows]
+        return lookups, serialize
+
+    def parse_fields(self, value):
+        """ Field names from a ?fields= value, or None for all of them. Raises ValidationError for unknown names. """
+        if not value:
+            return None
+        names = tuple(dict.fromkeys(name.strip() for name in value.split(',') if name.strip()))
+        unknown = [name for name in names if name not in self.field_names]
+        if unknown:
+            raise serializers.ValidationError({FIELDS_QUERY_PARAM: f"Unknown field(s): {', '.join(unknown)}."})
+        return names
+
+class FastReadMixin:
+    """
+    list and retrieve through `representation` (a ValuesRepresentation) when
+    FAST_READ_SERIALIZERS is on, or whenever ?fields= is given. The rows
+    served are kept on self.served_rows, with `served_lookups` always fetched.
+    """
+    representation = None
+    served_lookups = ('id',)
+
+    def _use_fast_path(self, request):
+        return settings.FAST_READ_SERIALIZERS or FIELDS_QUERY_PARAM in request.query_params
+
+    def _compile(self, request, extra=()):
+        names = self.representation.parse_fields(request.query_params.get(FIELDS_QUERY_PARAM))
+        lookups, serialize = self.representation.compile(names)
+        return list(dict.fromkeys([*lookups, *self.served_lookups, *extra])), serialize
+
+    def list(self, request, *args, **kwargs):
+        if not self._use_fast_path(request):
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset())
+        ordering = queryset.query.order_by or queryset.model._meta.ordering
+        # The paginator reads its cursor key from the rows
+        keys = [field.lstrip('-') for field in ordering if isinstance(field, str)]
+        lookups, serialize = self._compile(request, extra=keys)
+        values = queryset.values(*lookups)
+
+        page = self.paginate_queryset(values)
+        self.served_rows = page if page is not None else list(values)
+        data = serialize(self.served_rows)
+        if page is not None:
+            return self.get_paginated_response(data)
+        return Response(data)
+
+    def retrieve(self, request, *args, **kwargs):
+        if not self._use_fast_path(request):
+            return super().retrieve(request, *args, **kwargs)
+        lookups, serialize = self._compile(request)
+        lookup_url_kwarg = self.lookup_url_kwarg or self.lookup_field
+        row = get_object_or_404(
+            self.get_queryset().values(*lookups), **{self.lookup_field: self.kwargs[lookup_url_kwarg]},
+        )
+        self.served_rows = [row]
+        return Response(serialize(self.served_rows)[0])
@@ -0,0 +1,97 @@
+"""
+Expiry of seat holds.
+
+A PENDING booking holds its seat (the flight's seats_booked counter and,
+if it has one, its seat in the seat map) until the external service
+confirms or rejects it. If that never happens, e.g. because the worker
+confirming it died, the hold expires BOOKING_HOLD_TTL after the booking was
+created: it no longer blocks the passenger from booking the flight again,
+and the next sweep moves it to EXPIRED and gives the seat back.
+
+Sweeps (the expire_holds command, or expire_holds() for one flight when
+a booking finds it full) walk the expired holds in (created_at, id) order
+on the (status, created_at) index, a batch at a time. Each batch is its own
+short transaction: it locks its bookings (skipping any locked by a cancel or
+confirmation in progress, the next sweep gets those), moves them to EXPIRED
+with one UPDATE, releases their seats in bulk and adds their events to the
+outbox (bookings.events) with one INSERT, so a sweep over millions of rows
+never holds a lock for longer than one batch.
+"""
+from collections import Counter, defaultdict
+from datetime import timedelta
+import logging
+import time
+
+from django.conf import settings
+from django.db import transaction
+from django.db.models import Q
+from django.utils import timezone
+
+from .events import record_events
+from .inventory import release_seat_numbers_bulk, release_seats_bulk
+from .models import Booking
+
+logger = logging.getLogger(__name__)
+
+def hold_cutoff(now=None):
+    """ PENDING bookings created before this have expired. """
+    return (now or timezone.now()) - timedelta(seconds=settings.BOOKING_HOLD_TTL)
+
+def live_hold_filter(now=None):
+    """ Q matching the bookings that hold a seat and haven't expired: CONFIRMED, or PENDING within the TTL. """
+    return Q(status='CONFIRMED') | Q(status='PENDING', created_at__gte=hold_cutoff(now))
+
+def expire_holds(flight_id=None, cutoff=None, batch_size=None, pause=0):
+    """
+    Moves PENDING bookings created before `cutoff` (default: hold_cutoff())
+    to EXPIRED and gives their seats back, in batches of `batch_size`
+    (default BOOKING_HOLD_SWEEP_BATCH_SIZE) with `pause` seconds between
+    batches. Only the given flight's bookings if flight_id is set.
+
+    Returns:
+        int: The number of bookings expired.
+    """
+    cutoff = cutoff or hold_cutoff()
+    batch_size = batch_size or settings.BOOKING_HOLD_SWEEP_BATCH_SIZE
+    expired_holds = Booking.objects.filter(status='PENDING', created_at__lt=cutoff).order_by('created_at', 'pk')
+    if flight_id is not None:
+        expired_holds = expired_holds.filter(flight_id=flight_id)
+
+    expired = 0
+    position = None
+    while True:
+        batch = expired_holds
+        if position is not None:
+            # Keyset over the index, so skipped (locked) bookings aren't read again
+            created_at, pk = position
+            batch = batch.filter(Q(created_at__gt=created_at) | Q(created_at=created_at, pk__gt=pk))
+        batch = list(batch.values_list('created_at', 'pk')[:batch_size])
+        if not batch:
+            break
+        position = batch[-1]
+        expired += _expire_batch([pk for _, pk in batch])
+        if pause and len(batch) == batch_size:
+            time.sleep(pause)
+
+    if expired:
+        logger.info("Expired %d stale seat hold(s).", expired)
+    return expired
+
+def _expire_batch(booking_ids):
+    with transaction.atomic():
+        # Bookings before flights before seat maps, the order cancellations lock them in
+        holds = list(
+            Booking.objects.select_for_update(skip_locked=True)
+            .filter(pk__in=booking_ids, status='PENDING') # Confirmed or cancelled since the batch was read
+            .only('pk', 'booking_reference', 'flight_id', 'seat_number')
+        )
+        if not holds:
+            return 0
+        Booking.objects.filter(pk__in=[booking.pk for booking in holds]).update(status='EXPIRED', updated_at=timezone.now())
+        release_seats_bulk(Counter(booking.flight_id for booking in holds))
+        seat_numbers = defaultdict(list)
+        for booking in holds:
+            seat_numbers[booking.flight_id].append(booking.seat_number)
+        release_seat_numbers_bulk(seat_numbers)
+        record_events(holds, status='EXPIRED', previous_status='PENDING')
+    return len(holds)
@@ -0,0 +1,167 @@
+"""
+Idempotency-Key support for booking creation.
+
+A client sending `Idempotency-Key: <unique value>` can retry a POST after a
+timeout or 503 as often as it likes: the first request does the work and
+its response is kept in the cache for IDEMPOTENCY_KEY_TTL; retries get that
+response back (with `Idempotent-Replayed: true`) without validation, seat
+reservation or another call to the external service.
+
+The key is claimed with cache.add() before the view runs, so of two
+concurrent requests with the same key only one gets through. The other
+waits up to IDEMPOTENCY_WAIT for the first to finish and replays its
+response, or gets 409 if it is still running. Reusing a key with a
+different body is a 422. Client errors (4xx) and exceptions aren't stored:
+the claim is dropped, so the client can correct the request and retry with
+the same key.
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.http import HttpResponse
+from functools import wraps
+from rest_framework import status
+from rest_framework.response import Response
+import asyncio
+import hashlib
+import json
+import logging
+import time
+
+logger = logging.getLogger(__name__)
+
+HEADER = 'Idempotency-Key'
+REPLAYED_HEADER = 'Idempotent-Replayed'
+MAX_KEY_LENGTH = 255
+CACHE_KEY_IDEMPOTENCY = "idempotency_{digest}"
+IN_FLIGHT = 'in-flight'
+POLL_INTERVAL = 0.05 # seconds between checks while waiting on the in-flight request
+STORED_HEADERS = ('Location',)
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+def _error(message, status_code):
+    return {"detail": message}, status_code
+
+STILL_RUNNING = _error(f"A request with this {HEADER} is still being processed.", status.HTTP_409_CONFLICT)
+
+def _cache_key(request, key):
+    # Scoped to the endpoint, so one key can't replay another endpoint's response
+    return CACHE_KEY_IDEMPOTENCY.format(digest=hashlib.sha256(f"{request.path}\n{key}".encode()).hexdigest())
+
+def _fingerprint(request):
+    return hashlib.sha256(request.body).hexdigest()
+
+def _lock_timeout():
+    # Longer than the slowest request: every external attempt timing out
+    return settings.EXTERNAL_SERVICE_TIMEOUT * (settings.EXTERNAL_SERVICE_MAX_RETRIES + 1) + 30
+
+def _check_key(request):
+    """ The request's key, or an error (data, status) if it is malformed. None without a key. """
+    key = request.headers.get(HEADER)
+    if key is None or request.method in SAFE_METHODS:
+        return None, None
+    if not key.strip() or len(key) > MAX_KEY_LENGTH:
+        return None, _error(f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters.", status.HTTP_400_BAD_REQUEST)
+    return key, None
+
+def _outcome(entry, fingerprint):
+    """ What to do about an existing entry: (stored response entry | None, error | None). """
+    if entry == IN_FLIGHT:
+        return None, None
+    if entry['fingerprint'] != fingerprint:
+        return None, _error(f"{HEADER} was already used for a different request.", status.HTTP_422_UNPROCESSABLE_ENTITY)
+    return entry, None
+
+def _storable(response):
+    return not 400 <= response.status_code < 500
+
+def _entry(fingerprint, status_code, headers, **body):
+    return {
+        'fingerprint': fingerprint,
+        'status': status_code,
+        'headers': {name: headers[name] for name in STORED_HEADERS if name in headers},
+        **body,
+    }
+
+def idempotent(view_method):
+    """ Decorator for DRF view methods (self, request, ...) returning a Response. """
+    @wraps(view_method)
+    def wrapper(self, request, *args, **kwargs):
+        key, error = _check_key(request)
+        if error:
+            return Response(*error)
+        if key is None:
+            return view_method(self, request, *args, **kwargs)
+
+        cache_key, fingerprint = _cache_key(request, key), _fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+        while not cache.add(cache_key, IN_FLIGHT, _lock_timeout()):
+            entry = cache.get(cache_key)
+            if entry is None:
+                continue # Finished with an error and released in between, try to claim again
+            stored, error = _outcome(entry, fingerprint)
+            if error:
+                return Response(*error)
+            if stored:
+                logger.info("Replaying the stored response to %s for a reused %s.", request.path, HEADER)
+                return Response(stored['data'], status=stored['status'], headers={**stored['headers'], REPLAYED_HEADER: 'true'})
+            if time.monotonic() >= deadline:
+                return Response(*STILL_RUNNING)
+            time.sleep(POLL_INTERVAL)
+
+        try:
+            response = view_method(self, request, *args, **kwargs)
+        except BaseException:
+            cache.delete(cache_key)
+            raise
+        if _storable(response):
+            cache.set(cache_key, _entry(fingerprint, response.status_code, response, data=response.data), settings.IDEMPOTENCY_KEY_TTL)
+        else:
+            cache.delete(cache_key)
+        return response
+    return wrapper
+
+def async_idempotent(view):
+    """ Decorator for async function views (request, ...) returning a JSON HttpResponse. """
+    def json_response(data, status_code, headers=None):
+        return HttpResponse(json.dumps(data), status=status_code, headers=headers, content_type='application/json')
+
+    @wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        key, error = _check_key(request)
+        if error:
+            return json_response(*error)
+        if key is None:
+            return await view(request, *args, **kwargs)
+
+        cache_key, fingerprint = _cache_key(request, key), _fingerprint(request)
+        deadline = time.monotonic() + settings.IDEMPOTENCY_WAIT
+        while not await cache.aadd(cache_key, IN_FLIGHT, _lock_timeout()):
+            entry = await cache.aget(cache_key)
+            if entry is None:
+                continue
+            stored, error = _outcome(entry, fingerprint)
+            if error:
+                return json_response(*error)
+            if stored:
+                logger.info("Replaying the stored response to %s for a reused %s.", request.path, HEADER)
+                return HttpResponse(
+                    stored['content'], status=stored['status'], content_type='application/json',
+                    headers={**stored['headers'], REPLAYED_HEADER: 'true'},
+                )
+            if time.monotonic() >= deadline:
+                return json_response(*STILL_RUNNING)
+            await asyncio.sleep(POLL_INTERVAL)
+
+        try:
+            response = await view(request, *args, **kwargs)
+        except BaseException:
+            await cache.adelete(cache_key)
+            raise
+        if _storable(response):
+            await cache.aset(
+                cache_key, _entry(fingerprint, response.status_code, response, content=response.content), settings.IDEMPOTENCY_KEY_TTL,
+            )
+        else:
+            await cache.adelete(cache_key)
+        return response
+    return wrapper
@@ -0,0 +1,208 @@
+from collections import defaultdict
+from django.db import transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from .models import Flight, Booking, SeatMap
+from .cache import record_seat_changes
+import logging
+
+logger = logging.getLogger(__name__)
+
+def reserve_seats(flight_id, seats=1):
+    """
+    Atomically takes seats from a flight's seats_booked counter.
+
+    The conditional UPDATE only matches while enough seats are left, so two
+    concurrent bookings can never both take the last seat. The flight row stays
+    locked until the surrounding transaction ends.
+
+    Returns:
+        bool: True if the seats were reserved, False if the flight is full
+              (or doesn't exist).
+    """
+    updated = Flight.objects.filter(
+        pk=flight_id, seats_booked__lte=F('total_seats') - seats
+    ).update(seats_booked=F('seats_booked') + seats)
+
+    if updated:
+        transaction.on_commit(lambda: record_seat_changes({flight_id: seats}))
+    else:
+        logger.info("Could not reserve %s seat(s) on flight %s: not enough seats left.", seats, flight_id)
+    return bool(updated)
+
+def release_seats(flight_id, seats=1):
+    """
+    Gives seats back to a flight's seats_booked counter.
+    Call this when a seat-holding booking is cancelled or fails.
+    """
+    updated = Flight.objects.filter(
+        pk=flight_id, seats_booked__gte=seats
+    ).update(seats_booked=F('seats_booked') - seats)
+
+    if updated:
+        transaction.on_commit(lambda: record_seat_changes({flight_id: -seats}))
+    else:
+        # The counter has drifted from the booking rows; reconcile_seat_counters fixes it.
+        logger.warning("Seat counter for flight %s is lower than the %s seat(s) being released.", flight_id, seats)
+    return bool(updated)
+
+def reserve_seats_bulk(requested):
+    """
+    Reserves seats on several flights at once for bulk bookings.
+
+    Locks the requested flight rows, grants each flight as many of its
+    requested seats as it still has free, and applies all grants in a single
+    UPDATE. Must be called inside a transaction.
+
+    Args:
+        requested (dict): {flight_id: number of seats wanted}
+
+    Returns:
+        dict: {flight_id: number of seats granted}, 0 for full or unknown flights.
+    """
+    granted = dict.fromkeys(requested, 0)
+    rows = Flight.objects.select_for_update().filter(pk__in=list(requested)).values_list('pk', 'total_seats', 'seats_booked')
+    for flight_id, total_seats, seats_booked in rows:
+        granted[flight_id] = max(min(requested[flight_id], total_seats - seats_booked), 0)
+
+    _apply_seat_deltas({flight_id: seats for flight_id, seats in granted.items() if seats})
+    return granted
+
+def release_seats_bulk(released):
+    """
+    Gives seats back on several flights in a single UPDATE.
+
+    Args:
+        released (dict): {flight_id: number of seats to release}
+    """
+    _apply_seat_deltas({flight_id: -seats for flight_id, seats in released.items() if seats})
+
+def _apply_seat_deltas(deltas):
+    if not deltas:
+        return
+    # One UPDATE per distinct delta: usually one or two, where a CASE over
+    # hundreds of flights costs more to build than to run
+    by_delta = defaultdict(list)
+    for flight_id, seats in deltas.items():
+        by_delta[seats].append(flight_id)
+    for seats, flight_ids in by_delta.items():
+        # Clamp at zero so a drifted counter can't violate the PositiveIntegerField constraint
+        Flight.objects.filter(pk__in=flight_ids).update(seats_booked=Greatest(F('seats_booked') + seats, Value(0)))
+    transaction.on_commit(lambda: record_seat_changes(deltas))
+
+def _locked_seat_maps(flight_ids):
+    """
+    Locks and returns {flight_id: SeatMap}. Lock flights (reserve_seats) before
+    seat maps, everywhere, so the two locks can't deadlock.
+    A missing seat map is created from the flight's seat-numbered bookings;
+    that is the only time the booking table is read.
+    """
+    flight_ids = set(flight_ids)
+    seat_maps = {
+        seat_map.flight_id: seat_map
+        for seat_map in SeatMap.objects.select_for_update(of=('self',)).select_related('flight').filter(flight_id__in=flight_ids)
+    }
+    for flight_id in flight_ids - seat_maps.keys():
+        seat_map, _ = SeatMap.objects.select_for_update(of=('self',)).select_related('flight').get_or_create(
+            flight_id=flight_id, defaults={'occupied': lambda flight_id=flight_id: _occupied_from_bookings(flight_id)},
+        )
+        seat_maps[flight_id] = seat_map
+    return seat_maps
+
+def _occupied_from_bookings(flight_id):
+    seat_map = SeatMap(flight=Flight.objects.get(pk=flight_id))
+    seat_numbers = Booking.objects.filter(
+        flight_id=flight_id, status__in=Booking.SEAT_HOLDING_STATUSES, seat_number__isnull=False,
+    ).values_list('seat_number', flat=True)
+    for seat_number in seat_numbers:
+        index = SeatMap.seat_index(seat_number, seat_map.flight.total_seats)
+        if index is not None: # Free-text seats from before seat maps existed are skipped
+            seat_map.take(index)
+    return seat_map.occupied
+
+def get_seat_map(flight_id):
+    """ The flight's SeatMap for reading (created if missing), or None for unknown flights. """
+    try:
+        return SeatMap.objects.select_related('flight').get(flight_id=flight_id)
+    except SeatMap.DoesNotExist:
+        if not Flight.objects.filter(pk=flight_id).exists():
+            return None
+    with transaction.atomic():
+        return _locked_seat_maps([flight_id])[flight_id]
+
+def claim_seat(flight_id, seat_number=None):
+    """
+    Assigns a seat on a flight: the given one, or the lowest-numbered free one
+    when seat_number is None. The seat map row stays locked until the
+    surrounding transaction ends, so a seat can't be assigned twice.
+    Must be called inside a transaction.
+
+    Returns:
+        str | None: The assigned seat label, None if the seat is taken (or the flight is fully assigned).
+    """
+    return claim_seats_bulk({flight_id: [seat_number]})[flight_id][0]
+
+def release_seat(flight_id, seat_number):
+    """ Frees an assigned seat. Call this alongside release_seats when a booking stops holding its seat. """
+    if seat_number:
+        release_seat_numbers_bulk({flight_id: [seat_number]})
+
+def claim_seats_bulk(wanted):
+    """
+    Bulk variant of claim_seat: one locking query for all the seat maps and
+    one UPDATE per flight. Must be called inside a transaction.
+
+    Args:
+        wanted (dict): {flight_id: [seat_number or None (any seat), ...]}
+
+    Returns:
+        dict: {flight_id: [assigned seat label or None, ...]}, in request order.
+    """
+    seat_maps = _locked_seat_maps(wanted)
+    assigned = {}
+    for flight_id, seat_numbers in wanted.items():
+        seat_map = seat_maps[flight_id]
+        # Explicit seats first, so auto-assignment can't take a seat someone asked for
+        indexes = [SeatMap.seat_index(seat_number, seat_map.flight.total_seats) if seat_number else None for seat_number in seat_numbers]
+        results = [None] * len(seat_numbers)
+        for position, index in enumerate(indexes):
+            if index is not None and seat_map.is_free(index):
+                seat_map.take(index)
+                results[position] = index
+        for position, seat_number in enumerate(seat_numbers):
+            if not seat_number:
+                results[position] = seat_map.next_free()
+                if results[position] is not None:
+                    seat_map.take(results[position])
+        assigned[flight_id] = [SeatMap.seat_label(index) if index is not None else None for index in results]
+        if any(index is not None for index in results):
+            seat_map.save(update_fields=['occupied', 'updated_at'])
+    return assigned
+
+def release_seat_numbers_bulk(released):
+    """
+    Frees assigned seats on several flights, one UPDATE per flight.
+
+    Args:
+        released (dict): {flight_id: [seat_number, ...]}; empty seat numbers are ignored.
+    """
+    released = {flight_id: [seat for seat in seats if seat] for flight_id, seats in released.items()}
+    released = {flight_id: seats for flight_id, seats in released.items() if seats}
+    if not released:
+        return
+    for flight_id, seat_map in _locked_seat_maps(released).items():
+        for seat_number in released[flight_id]:
+            index = SeatMap.seat_index(seat_number, seat_map.flight.total_seats)
+            if index is not None:
+                seat_map.free(index)
+        seat_map.save(update_fields=['occupied', 'updated_at'])
+
+def held_seats_subquery():
+    """
+    Expression counting the seat-holding bookings of the flight in the outer
+    query. Used to rebuild seats_booked from the booking rows.
+    """
+    return Coalesce(Subquery(
+        Booking.objects.filter(flight=OuterRef('pk'), status__in=Booking.SEAT_HOLDING_STATUSES)
+        .order_by().values('flight').annotate(count=Count('pk')).values('count')
+    ), 0)
@@ -0,0 +1,254 @@
+"""
+Multi-leg itinerary search over the flight schedule.
+
+Each worker process keeps a RouteGraph: every flight departing from a day
+ago onwards, indexed by origin and by (origin, destination) and sorted by
+departure time. It is a time-expanded graph: flight B connects to flight A
+when B leaves from A's destination between the minimum and maximum
+connection time after A lands.
+
+The graph is loaded once, then kept up to date incrementally. Whenever the
+flight catalog version (bookings.response_cache) has moved since the last
+search, only the flights updated since the last refresh are read and
+patched in. If the flight count doesn't match afterwards (something was
+deleted), or the graph is older than ITINERARY_GRAPH_MAX_AGE, it is
+reloaded in full.
+
+A search is best-first over partial itineraries, by arrival time or total
+price, expanding every airport a bounded number of times, so it looks at a
+few thousand connections at most however big the schedule is. Seat
+availability of the candidate legs is then joined with one bulk cache read
+(get_many_flight_availability).
+"""
+from bisect import bisect_left, bisect_right
+from collections import defaultdict, namedtuple
+from datetime import timedelta
+from heapq import heappop, heappush
+from itertools import count
+import logging
+import os
+import threading
+import time
+
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from django.utils import timezone
+
+from .cache import get_many_flight_availability
+from .models import Flight
+from .response_cache import catalog_version
+
+logger = logging.getLogger(__name__)
+
+SORT_KEYS = ('arrival', 'price')
+HORIZON = timedelta(days=1) # Flights that left longer ago than this aren't loaded
+REFRESH_OVERLAP = timedelta(minutes=1) # Re-read before the last refresh, for transactions that committed late
+MAX_PATCHED_FLIGHTS = 2000 # Bigger changes (schedule loads) are cheaper to reload in full
+CANDIDATES_PER_RESULT = 3 # Itineraries collected per requested result, to leave room for full flights
+
+Leg = namedtuple('Leg', (
+    'departure', 'arrival', # POSIX timestamps, for cheap comparisons
+    'origin_key', 'destination_key', 'price', 'id', 'flight_number', 'origin', 'destination',
+    'departure_time', 'arrival_time',
+))
+LEG_FIELDS = Leg._fields[2:]
+
+Itinerary = namedtuple('Itinerary', ('legs', 'price', 'available_seats'))
+
+def _leg(row):
+    values = dict(zip(LEG_FIELDS, row))
+    return Leg(departure=values['departure_time'].timestamp(), arrival=values['arrival_time'].timestamp(), **values)
+
+def _insert(index, key, leg):
+    """ Copy of index[key] with `leg` added in departure order (the old lists may be in use by a search). """
+    departures, legs = index.get(key, ((), ()))
+    i = bisect_right(departures, leg.departure)
+    index[key] = (departures[:i] + (leg.departure,) + departures[i:], legs[:i] + (leg,) + legs[i:])
+
+def _remove(index, key, leg):
+    departures, legs = index[key]
+    i = bisect_left(departures, leg.departure)
+    while legs[i].id != leg.id:
+        i += 1
+    index[key] = (departures[:i] + departures[i + 1:], legs[:i] + legs[i + 1:])
+
+class Schedule:
+    """ An immutable snapshot of the graph, replaced as a whole on every refresh. """
+
+    def __init__(self, flights, horizon, watermark, version):
+        self.flights = flights # id -> Leg
+        self.horizon = horizon
+        self.watermark = watermark # When the flights were last read
+        self.version = version # Catalog version the snapshot is current for
+        self.loaded_at = time.monotonic()
+        self.by_origin = {} # origin_key -> (departures, legs)
+        self.by_route = {} # (origin_key, destination_key) -> (departures, legs)
+
+    @classmethod
+    def load(cls, version):
+        watermark = timezone.now()
+        horizon = watermark - HORIZON
+        rows = (
+            # Not from a replica, which could still miss the change that moved the version
+            Flight.objects.db_manager(DEFAULT_DB_ALIAS)
+            .filter(departure_time__gte=horizon).order_by('departure_time')
+            .values_list(*LEG_FIELDS).iterator(chunk_size=10_000)
+        )
+        by_origin, by_route = defaultdict(lambda: ([], [])), defaultdict(lambda: ([], []))
+        flights = {}
+        for row in rows:
+            leg = _leg(row)
+            flights[leg.id] = leg
+            for departures, legs in (by_origin[leg.origin_key], by_route[leg.origin_key, leg.destination_key]):
+                departures.append(leg.departure)
+                legs.append(leg)
+        schedule = cls(flights, horizon, watermark, version)
+        schedule.by_origin = {key: (tuple(departures), tuple(legs)) for key, (departures, legs) in by_origin.items()}
+        schedule.by_route = {key: (tuple(departures), tuple(legs)) for key, (departures, legs) in by_route.items()}
+        return schedule
+
+    def updated(self, version):
+        """
+        A new snapshot with the flights updated since this one was taken,
+        or None if flights were deleted or too many changed and the graph
+        needs a full reload.
+        """
+        watermark = timezone.now()
+        manager = Flight.objects.db_manager(DEFAULT_DB_ALIAS)
+        rows = manager.filter(updated_at__gte=self.watermark - REFRESH_OVERLAP).values_list(*LEG_FIELDS)
+        rows = list(rows[:MAX_PATCHED_FLIGHTS + 1])
+        if len(rows) > MAX_PATCHED_FLIGHTS:
+            return None
+        schedule = Schedule(dict(self.flights), self.horizon, watermark, version)
+        schedule.by_origin, schedule.by_route = dict(self.by_origin), dict(self.by_route)
+        changed = 0
+        for row in rows:
+            leg = _leg(row)
+            old = schedule.flights.get(leg.id)
+            if old == leg:
+                continue # Re-read in the overlap
+            if old is not None:
+                _remove(schedule.by_origin, old.origin_key, old)
+                _remove(schedule.by_route, (old.origin_key, old.destination_key), old)
+                del schedule.flights[leg.id]
+            if leg.departure_time >= self.horizon:
+                _insert(schedule.by_origin, leg.origin_key, leg)
+                _insert(schedule.by_route, (leg.origin_key, leg.destination_key), leg)
+                schedule.flights[leg.id] = leg
+            changed += 1
+        if manager.filter(departure_time__gte=self.horizon).count() != len(schedule.flights):
+            return None
+        logger.debug("Itinerary graph patched with %d changed flights.", changed)
+        return schedule
+
+    def search(self, origin, destination, start, end, sort='arrival', max_legs=3,
+               min_connection=timedelta(minutes=45), max_connection=timedelta(hours=12), limit=10):
+        """
+        Up to `limit` itineraries from `origin` to `destination` (route keys)
+        with a first departure in [start, end), best first by arrival time or
+        total price. Never visits an airport twice.
+
+        Returns:
+            list: Tuples of Legs.
+        """
+        min_gap, max_gap = min_connection.total_seconds(), max_connection.total_seconds()
+        by_price = sort == 'price'
+        expansions = defaultdict(int) # airport -> times a partial itinerary was extended from it
+        results, queue, tiebreak = [], [], count()
+
+        def push(legs, price):
+            last = legs[-1]
+            key = (price, last.arrival) if by_price else (last.arrival, price)
+            heappush(queue, (key, next(tiebreak), legs, price))
+
+        departures, legs = self.by_origin.get(origin, ((), ()))
+        for leg in legs[bisect_left(departures, start.timestamp()):bisect_left(departures, end.timestamp())]:
+            if leg.destination_key != origin:
+                push((leg,), leg.price)
+
+        while queue and len(results) < limit:
+            _, _, path, price = heappop(queue)
+            airport = path[-1].destination_key
+            if airport == destination:
+                results.append(path)
+                continue
+            if len(path) == max_legs or expansions[airport] >= limit:
+                continue
+            expansions[airport] += 1
+            visited = {leg.origin_key for leg in path}
+            # The last leg must end at the destination, so only that route is scanned
+            index = self.by_route.get((airport, destination)) if len(path) == max_legs - 1 else self.by_origin.get(airport)
+            if index is None:
+                continue
+            departures, legs = index
+            arrival = path[-1].arrival
+            for leg in legs[bisect_left(departures, arrival + min_gap):bisect_right(departures, arrival + max_gap)]:
+                if leg.destination_key not in visited:
+                    push(path + (leg,), price + leg.price)
+        return results
+
+class RouteGraph:
+    """ The process's current Schedule, refreshed when the flight catalog changes. """
+
+    def __init__(self):
+        self.discard()
+
+    def discard(self):
+        """ Drops the loaded schedule, e.g. in a forked child. """
+        self._schedule = None
+        self._lock = threading.Lock()
+
+    def _usable(self, schedule, version):
+        return (
+            schedule is not None and schedule.version == version
+            and time.monotonic() - schedule.loaded_at < settings.ITINERARY_GRAPH_MAX_AGE
+        )
+
+    def current(self):
+        """ An up to date Schedule. While one thread refreshes it, the others search the previous one. """
+        schedule, version = self._schedule, catalog_version()
+        if self._usable(schedule, version):
+            return schedule
+        if not self._lock.acquire(blocking=schedule is None):
+            return schedule
+        try:
+            schedule = self._schedule # Possibly refreshed while this thread waited
+            if self._usable(schedule, version):
+                return schedule
+            started = time.perf_counter()
+            expired = schedule is None or time.monotonic() - schedule.loaded_at >= settings.ITINERARY_GRAPH_MAX_AGE
+            updated = None if expired else schedule.updated(version)
+            if updated is None:
+                updated = Schedule.load(version)
+                logger.info(
+                    "Loaded the itinerary graph: %d flights in %.0f ms.",
+                    len(updated.flights), (time.perf_counter() - started) * 1000,
+                )
+            self._schedule = updated
+            return updated
+        finally:
+            self._lock.release()
+
+def search_itineraries(origin, destination, start, end, seats=1, limit=10, **options):
+    """
+    Itineraries from `origin` to `destination` (route keys) with a first
+    departure in [start, end) and at least `seats` free seats on every leg.
+    `options` are passed to Schedule.search.
+
+    Returns:
+        list: Itinerary tuples, with available_seats as the lowest over the legs.
+    """
+    candidates = graph.current().search(origin, destination, start, end, limit=limit * CANDIDATES_PER_RESULT, **options)
+    availability = get_many_flight_availability({leg.id for legs in candidates for leg in legs})
+    itineraries = []
+    for legs in candidates:
+        free = min(availability.get(str(leg.id), 0) for leg in legs)
+        if free >= seats:
+            itineraries.append(Itinerary(legs, sum(leg.price for leg in legs), free))
+            if len(itineraries) == limit:
+                break
+    return itineraries
+
+graph = RouteGraph()
+# A forked child loads its own, the parent's lock may have been held at the fork
+os.register_at_fork(after_in_child=graph.discard)
@@ -0,0 +1,214 @@
+"""
+Bulk loaders for flight schedules and passenger files (CSV or NDJSON).
+
+Input is streamed and upserted in batches with
+bulk_create(update_conflicts=True), i.e. one INSERT ... ON CONFLICT DO
+UPDATE per batch keyed on flight_number / email, instead of a
+get_or_create query pair per row. Rows that can't be loaded, including
+schedule updates that would cut a flight below its booked seats, are
+reported by line number and skipped. With workers > 1 the batches are
+upserted by a pool of processes, each on its own database connection,
+while the parent only reads the file.
+"""
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+import csv
+import json
+import multiprocessing
+import time
+
+from django.db import close_old_connections, connections, transaction
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from .models import Flight, Passenger
+
+DEFAULT_BATCH_SIZE = 5000
+MAX_REPORTED_ERRORS = 20
+
+def read_records(path, input_format=None):
+    """
+    Yields (line_number, dict) for every record of a CSV (with a header row)
+    or NDJSON file, one at a time. The format defaults to the file extension.
+    """
+    input_format = input_format or ('ndjson' if path.endswith(('.ndjson', '.jsonl')) else 'csv')
+    with open(path, newline='', encoding='utf-8') as source:
+        if input_format == 'csv':
+            reader = csv.DictReader(source)
+            for record in reader:
+                yield reader.line_num, record
+        else:
+            for line_number, line in enumerate(source, start=1):
+                if line.strip():
+                    yield line_number, json.loads(line)
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+def _aware(value):
+    parsed = parse_datetime(value) if isinstance(value, str) else value
+    if not isinstance(parsed, datetime):
+        raise ValueError(f"invalid datetime {value!r}")
+    return parsed if timezone.is_aware(parsed) else timezone.make_aware(parsed)
+
+def _required(record, name):
+    value = record.get(name)
+    if value is None or (isinstance(value, str) and not value.strip()):
+        raise ValueError(f"{name} is required")
+    return value.strip() if isinstance(value, str) else value
+
+def flight_from_record(record):
+    """ Flight instance for one schedule record, raising ValueError for bad input. """
+    flight = Flight(
+        flight_number=_required(record, 'flight_number'),
+        origin=_required(record, 'origin'),
+        destination=_required(record, 'destination'),
+        departure_time=_aware(_required(record, 'departure_time')),
+        arrival_time=_aware(_required(record, 'arrival_time')),
+        total_seats=int(_required(record, 'total_seats')),
+    )
+    try:
+        flight.price = Decimal(str(_required(record, 'price')))
+    except InvalidOperation:
+        raise ValueError(f"invalid price {record.get('price')!r}")
+    if flight.arrival_time <= flight.departure_time:
+        raise ValueError("arrival_time must be after departure_time")
+    if flight.total_seats < 1:
+        raise ValueError("total_seats must be positive")
+    flight.set_route_keys() # bulk_create skips save()
+    return flight
+
+def passenger_from_record(record):
+    """ Passenger instance for one import record, raising ValueError for bad input. """
+    date_of_birth = parse_date(str(_required(record, 'date_of_birth')))
+    if date_of_birth is None:
+        raise ValueError(f"invalid date_of_birth {record.get('date_of_birth')!r}")
+    passenger = Passenger(
+        first_name=_required(record, 'first_name'),
+        last_name=_required(record, 'last_name'),
+        email=_required(record, 'email'),
+        date_of_birth=date_of_birth,
+    )
+    passenger.set_name_keys() # bulk_create skips save()
+    return passenger
+
+def keep_booked_seats(rows):
+    """
+    Refuses flight updates that would leave fewer seats than are already
+    booked. Locks the existing flights, so call in the upsert's transaction:
+    a booking on one of them waits until the new capacity has committed.
+
+    Args:
+        rows (dict): {flight_number: (line_number, Flight)}, refused flights are removed.
+
+    Returns:
+        list: (line_number, error message) per refused flight.
+    """
+    booked = (
+        Flight.objects.select_for_update()
+        .filter(flight_number__in=list(rows), seats_booked__gt=0)
+        .values_list('flight_number', 'seats_booked')
+    )
+    errors = []
+    for flight_number, seats_booked in booked:
+        line_number, flight = rows[flight_number]
+        if flight.total_seats < seats_booked:
+            errors.append((line_number, f"total_seats {flight.total_seats} is below the {seats_booked} seats already booked"))
+            del rows[flight_number]
+    return errors
+
+# kind -> (model, record parser, unique field, fields updated on conflict, check of the existing rows or None)
+LOADERS = {
+    'flights': (Flight, flight_from_record, 'flight_number', [
+        'origin', 'destination', 'origin_key', 'destination_key', 'departure_time', 'arrival_time',
+        'total_seats', 'price', 'updated_at',
+    ], keep_booked_seats),
+    'passengers': (Passenger, passenger_from_record, 'email', [
+        'first_name', 'last_name', 'first_name_key', 'last_name_key', 'date_of_birth', 'updated_at',
+    ], None),
+}
+
+def load_batch(kind, records):
+    """
+    Parses and upserts one batch of (line_number, record) pairs.
+    Existing rows (same flight_number / email) are updated in place, keeping
+    their id and, for flights, their seats_booked counter; a flight whose
+    new total_seats is below its seats_booked is rejected instead.
+
+    Returns:
+        tuple: (rows upserted, [(line_number, error message), ...] in line order)
+    """
+    model, parse, unique_field, update_fields, check = LOADERS[kind]
+    rows, errors = {}, []
+    for line_number, record in records:
+        if not isinstance(record, dict): # An NDJSON line holding an array, string, number or null
+            errors.append((line_number, "expected a JSON object"))
+            continue
+        try:
+            instance = parse(record)
+        except (ValueError, TypeError) as e:
+            errors.append((line_number, str(e)))
+            continue
+        # The same key twice in one INSERT ... ON CONFLICT is an error, the last one wins
+        rows[getattr(instance, unique_field)] = (line_number, instance)
+    with transaction.atomic():
+        if rows and check:
+            errors.extend(check(rows))
+        if rows:
+            model.objects.bulk_create(
+                [instance for _, instance in rows.values()],
+                update_conflicts=True, unique_fields=[unique_field], update_fields=update_fields,
+            )
+    errors.sort()
+    return len(rows), errors
+
+def _load_batch_in_worker(kind, records):
+    close_old_connections()
+    return load_batch(kind, records)
+
+def load_file(kind, path, input_format=None, batch_size=DEFAULT_BATCH_SIZE, workers=1, progress=None):
+    """
+    Streams a file into the database.
+
+    Args:
+        kind (str): 'flights' or 'passengers'.
+        workers (int): Processes upserting batches in parallel. Use 1 for
+            in-memory SQLite, which other processes can't see.
+        progress (callable, optional): Called with the running stats after each batch.
+
+    Returns:
+        dict: rows_loaded, rows_rejected, errors (the first MAX_REPORTED_ERRORS), seconds, rows_per_s.
+    """
+    stats = {'rows_loaded': 0, 'rows_rejected': 0, 'errors': []}
+    started = time.perf_counter()
+
+    def collect(loaded, errors):
+        stats['rows_loaded'] += loaded
+        stats['rows_rejected'] += len(errors)
+        stats['errors'].extend(errors[:MAX_REPORTED_ERRORS - len(stats['errors'])])
+        if progress:
+            progress(stats)
+
+    batches = batched(read_records(path, input_format), batch_size)
+    if workers <= 1:
+        for batch in batches:
+            collect(*load_batch(kind, batch))
+    else:
+        # Forked workers must not share the parent's open connection
+        connections.close_all()
+        with ProcessPoolExecutor(max_workers=workers, mp_context=multiprocessing.get_context('fork')) as pool:
+            pending = []
+            for batch in batches:
+                pending.append(pool.submit(_load_batch_in_worker, kind, batch))
+                if len(pending) >= workers * 2: # Bound the batches held in memory
+                    collect(*pending.pop(0).result())
+            for future in pending:
+                collect(*future.result())
+
+    stats['seconds'] = round(time.perf_counter() - started, 2)
+    stats['rows_per_s'] = round(stats['rows_loaded'] / stats['seconds']) if stats['seconds'] else stats['rows_loaded']
+    return stats
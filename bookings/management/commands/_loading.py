@@ -0,0 +1,38 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.loaders import DEFAULT_BATCH_SIZE, load_file
+
+class LoadCommand(BaseCommand):
+    """Shared options and reporting for the bulk file loaders"""
+
+    kind = None # A bookings.loaders.LOADERS key
+
+    def add_arguments(self, parser):
+        parser.add_argument('path', help='CSV file with a header row, or NDJSON (.ndjson/.jsonl).')
+        parser.add_argument('--input-format', choices=['csv', 'ndjson'], help='Override the format implied by the file extension.')
+        parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='Rows per INSERT ... ON CONFLICT.')
+        parser.add_argument('--workers', type=int, default=1, help='Processes upserting batches in parallel.')
+
+    def handle(self, *args, **options):
+        def progress(stats):
+            if options['verbosity'] > 1:
+                self.stderr.write(f"{stats['rows_loaded']} rows loaded, {stats['rows_rejected']} rejected...")
+
+        try:
+            stats = load_file(
+                self.kind, options['path'], input_format=options['input_format'],
+                batch_size=options['batch_size'], workers=options['workers'], progress=progress,
+            )
+        except (OSError, ValueError) as e: # Unreadable file or malformed NDJSON
+            raise CommandError(str(e))
+
+        for line_number, error in stats['errors']:
+            self.stderr.write(self.style.WARNING(f"Line {line_number}: {error}"))
+        self.after_load(stats)
+        self.stdout.write(self.style.SUCCESS(
+            f"Loaded {stats['rows_loaded']} {self.kind} in {stats['seconds']}s ({stats['rows_per_s']} rows/s), "
+            f"rejected {stats['rows_rejected']}."
+        ))
+
+    def after_load(self, stats):
+        pass
@@ -0,0 +1,84 @@
+import json
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.test.utils import setup_databases, teardown_databases
+
+from bookings.benchmarks import find_regressions, load_scenarios
+from bookings.references import allocator
+from bookings.testing import use_file_sqlite
+
+class Command(BaseCommand):
+    """Django command to run the bookings benchmarks"""
+
+    help = 'Runs benchmark scenarios (all of them by default). Data-bound scenarios use a throwaway test database.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('scenarios', nargs='*', help='Scenario names, see --list.')
+        parser.add_argument('--list', action='store_true', help='List the available scenarios.')
+        parser.add_argument('--scale', type=int, default=1, help='Multiplier for dataset and request counts.')
+        parser.add_argument('--concurrency', type=int, default=8, help='Concurrent clients (driver processes for api_*) where applicable.')
+        parser.add_argument('--client', choices=['wsgi', 'asgi'], default='wsgi', help='In-process client for the api_* scenarios.')
+        parser.add_argument('--json', action='store_true', help='Print results as JSON.')
+        parser.add_argument('--baseline', help='Fail if results regress against this JSON file (from --save-baseline).')
+        parser.add_argument('--tolerance', type=float, default=0.5, help='Allowed latency/throughput regression, 0.5 = 50%% (p99 on a busy machine is noisy).')
+        parser.add_argument('--save-baseline', metavar='PATH', help='Write the results to PATH as a baseline.')
+
+    def handle(self, *args, **options):
+        scenarios = load_scenarios()
+        if options['list']:
+            for name, func in sorted(scenarios.items()):
+                self.stdout.write(f"{name}: {(func.__doc__ or '').strip()}")
+            return
+
+        names = options['scenarios'] or sorted(scenarios)
+        unknown = set(names) - set(scenarios)
+        if unknown:
+            raise CommandError(f"Unknown scenario(s): {', '.join(sorted(unknown))}")
+
+        baseline = None
+        if options['baseline']:
+            try:
+                with open(options['baseline']) as source:
+                    baseline = json.load(source)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Can't read baseline {options['baseline']}: {e}")
+
+        old_config = None
+        if any(scenarios[name].concurrent_writes or scenarios[name].on_disk for name in names):
+            use_file_sqlite(prefix='smartfly-benchmark-')
+        if any(scenarios[name].needs_db for name in names):
+            old_config = setup_databases(verbosity=0, interactive=False)
+        try:
+            results = {}
+            for name in names:
+                self.stderr.write(f'Running {name}...')
+                results[name] = scenarios[name](options)
+                if scenarios[name].needs_db:
+                    # Every scenario seeds its own data from scratch
+                    call_command('flush', interactive=False, verbosity=0)
+                    cache.clear()
+                    allocator.discard() # The flush reset the reference sequence
+        finally:
+            if old_config is not None:
+                teardown_databases(old_config, verbosity=0)
+
+        if options['save_baseline']:
+            with open(options['save_baseline'], 'w') as out:
+                json.dump(results, out, indent=2, default=str)
+                out.write('\n')
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2, default=str))
+        else:
+            for name, measurements in results.items():
+                self.stdout.write(self.style.SUCCESS(name))
+                for key, value in measurements.items():
+                    self.stdout.write(f'  {key}: {value}')
+
+        if baseline is not None:
+            regressions = find_regressions(results, baseline, options['tolerance'])
+            if regressions:
+                raise CommandError("Regressions against the baseline:\n  " + "\n  ".join(regressions))
+            self.stdout.write(self.style.SUCCESS(f"No regressions against {options['baseline']}."))
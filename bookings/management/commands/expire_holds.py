@@ -0,0 +1,35 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bookings.holds import expire_holds, hold_cutoff
+from bookings.models import Booking
+
+class Command(BaseCommand):
+    """Django command to expire stale PENDING bookings and give their seats back"""
+
+    help = 'Moves bookings PENDING for longer than BOOKING_HOLD_TTL to EXPIRED and releases their seats, in short batches.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Bookings per transaction (default BOOKING_HOLD_SWEEP_BATCH_SIZE).')
+        parser.add_argument('--pause', type=float, default=0, help='Seconds to sleep between batches, to go easy on replicas.')
+        parser.add_argument('--interval', type=float, help='Keep sweeping every this many seconds instead of once.')
+        parser.add_argument('--dry-run', action='store_true', help='Count the expired holds without releasing them.')
+
+    def handle(self, *args, **options):
+        if options['dry_run']:
+            count = Booking.objects.filter(status='PENDING', created_at__lt=hold_cutoff()).count()
+            self.stdout.write(f'{count} expired hold(s). Dry run, nothing changed.')
+            return
+
+        while True:
+            started = time.monotonic()
+            expired = expire_holds(batch_size=options['batch_size'], pause=options['pause'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Expired {expired} hold(s) in {time.monotonic() - started:.1f}s.'
+            ))
+            if options['interval'] is None:
+                return
+            close_old_connections() # Don't keep a connection open between sweeps
+            time.sleep(options['interval'])
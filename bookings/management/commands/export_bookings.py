@@ -0,0 +1,53 @@
+import uuid
+
+from django.core.management.base import BaseCommand, CommandError
+
+from bookings.exports import (
+    BOOKING_EXPORT_FIELDS, EXPORT_FORMATS, MANIFEST_FIELDS, bookings_for_export, iter_export, manifest_for_export,
+)
+from bookings.models import Booking
+from bookings.search import parse_day
+
+class Command(BaseCommand):
+    """Django command to stream bookings or a flight manifest to a file"""
+
+    help = 'Exports bookings (or one flight\'s passenger manifest) as NDJSON or CSV, streaming from a server-side cursor.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--output', choices=list(EXPORT_FORMATS), default='ndjson', help='Output format.')
+        parser.add_argument('--file', help='Write here instead of stdout.')
+        parser.add_argument('--date', help='Only bookings created on this day (YYYY-MM-DD).')
+        parser.add_argument('--status', choices=[choice for choice, _ in Booking.STATUS_CHOICES], help='Only bookings with this status.')
+        parser.add_argument('--flight', help='Only bookings on this flight id.')
+        parser.add_argument('--manifest', action='store_true', help='Export the passenger manifest of --flight instead.')
+
+    def handle(self, *args, **options):
+        flight_id = None
+        if options['flight']:
+            try:
+                flight_id = uuid.UUID(options['flight'])
+            except ValueError:
+                raise CommandError('--flight must be a flight id.')
+
+        if options['manifest']:
+            if not flight_id:
+                raise CommandError('--manifest needs --flight.')
+            queryset, fields = manifest_for_export(flight_id), MANIFEST_FIELDS
+        else:
+            day = None
+            if options['date']:
+                day = parse_day(options['date'])
+                if day is None:
+                    raise CommandError('--date must be YYYY-MM-DD.')
+            queryset = bookings_for_export(day=day, status=options['status'], flight_id=flight_id)
+            fields = BOOKING_EXPORT_FIELDS
+
+        chunks = iter_export(queryset, fields, options['output'])
+        if not options['file']:
+            for chunk in chunks:
+                self.stdout.write(chunk, ending='')
+            return
+        with open(options['file'], 'w', newline='', encoding='utf-8') as out:
+            for chunk in chunks:
+                out.write(chunk)
+        self.stderr.write(self.style.SUCCESS(f"Exported to {options['file']}."))
@@ -0,0 +1,30 @@
+import os
+
+from django.core.management.base import BaseCommand
+
+from bookings.datagen import FLIGHT_FIELDS, PASSENGER_FIELDS, generate_flights, generate_passengers, write_records
+
+class Command(BaseCommand):
+    """Django command to write synthetic schedule and passenger files"""
+
+    help = 'Writes synthetic flights.<ext> and passengers.<ext> for load_schedule / import_passengers.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flights', type=int, default=100_000, help='Number of flights.')
+        parser.add_argument('--passengers', type=int, default=1_000_000, help='Number of passengers.')
+        parser.add_argument('--days', type=int, default=180, help='Days the schedule spans.')
+        parser.add_argument('--output', choices=['csv', 'ndjson'], default='csv')
+        parser.add_argument('--output-dir', default='.', help='Directory for the files.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        os.makedirs(options['output_dir'], exist_ok=True)
+        extension = options['output']
+        files = (
+            ('flights', generate_flights(options['flights'], days=options['days'], seed=options['seed']), FLIGHT_FIELDS),
+            ('passengers', generate_passengers(options['passengers'], seed=options['seed']), PASSENGER_FIELDS),
+        )
+        for name, records, fields in files:
+            path = os.path.join(options['output_dir'], f'{name}.{extension}')
+            written = write_records(records, fields, path, output=extension)
+            self.stdout.write(self.style.SUCCESS(f'Wrote {written} {name} to {path}'))
@@ -0,0 +1,7 @@
+from ._loading import LoadCommand
+
+class Command(LoadCommand):
+    """Django command to bulk import passengers"""
+
+    help = 'Upserts passengers from CSV/NDJSON (first_name, last_name, email, date_of_birth) in batches, keyed on email.'
+    kind = 'passengers'
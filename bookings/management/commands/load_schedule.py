@@ -0,0 +1,23 @@
+from django.utils import timezone
+
+from bookings.cache import rebuild_flight_availability_cache
+from bookings.calendar import rebuild_route_calendar
+from bookings.models import Flight
+from ._loading import LoadCommand
+
+class Command(LoadCommand):
+    """Django command to bulk load a flight schedule"""
+
+    help = ('Upserts flights from CSV/NDJSON (flight_number, origin, destination, departure_time, arrival_time, '
+            'total_seats, price) in batches, then rebuilds their availability cache and the route calendar.')
+    kind = 'flights'
+
+    def handle(self, *args, **options):
+        self.started = timezone.now()
+        super().handle(*args, **options)
+
+    def after_load(self, stats):
+        # Every inserted or updated flight has updated_at >= the start of the load
+        rebuild_flight_availability_cache(Flight.objects.filter(updated_at__gte=self.started))
+        # Updated flights may have moved to another route or day, so rebuild the whole calendar
+        rebuild_route_calendar()
@@ -0,0 +1,15 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from bookings.calendar import rebuild_route_calendar
+
+class Command(BaseCommand):
+    """Django command to rebuild the route calendar from the flight table"""
+
+    help = 'Recomputes every route/day availability summary from today onwards and drops stale ones.'
+
+    def handle(self, *args, **options):
+        started = time.monotonic()
+        written = rebuild_route_calendar()
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {written} route day(s) in {time.monotonic() - started:.1f}s.'))
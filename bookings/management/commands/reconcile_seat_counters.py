@@ -0,0 +1,45 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import F
+
+from bookings.cache import invalidate_flight_availability_cache
+from bookings.calendar import refresh_flights
+from bookings.inventory import held_seats_subquery
+from bookings.models import Flight
+
+class Command(BaseCommand):
+    """Django command to reconcile Flight.seats_booked against the actual booking rows"""
+
+    help = 'Recomputes Flight.seats_booked from PENDING/CONFIRMED bookings and fixes any drift.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--flight', action='append', dest='flights', help='Only check this flight id (repeatable).')
+        parser.add_argument('--dry-run', action='store_true', help='Report drift without fixing it.')
+
+    def handle(self, *args, **options):
+        flights = Flight.objects.all()
+        if options['flights']:
+            flights = flights.filter(pk__in=options['flights'])
+
+        drifted = (
+            flights.annotate(actual=held_seats_subquery())
+            .exclude(seats_booked=F('actual'))
+            .values_list('pk', 'flight_number', 'seats_booked', 'actual')
+        )
+
+        fixed = 0
+        for flight_id, flight_number, counted, actual in drifted.iterator():
+            self.stdout.write(f'{flight_number}: seats_booked={counted}, bookings={actual}')
+            if options['dry_run']:
+                continue
+            with transaction.atomic():
+                # Recount in the same statement that writes, while holding the flight row lock
+                Flight.objects.filter(pk=flight_id).update(seats_booked=held_seats_subquery())
+                transaction.on_commit(lambda flight_id=flight_id: invalidate_flight_availability_cache(flight_id))
+                transaction.on_commit(lambda flight_id=flight_id: refresh_flights([flight_id]))
+            fixed += 1
+
+        if options['dry_run']:
+            self.stdout.write('Dry run, no counters changed.')
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Reconciled {fixed} flight(s).'))
@@ -0,0 +1,37 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from bookings.events import get_consumers, prune_events, relay_events
+
+class Command(BaseCommand):
+    """Django command to relay the booking event outbox to its consumers"""
+
+    help = 'Hands new booking status change events to the BOOKING_EVENT_CONSUMERS in batches, then prunes old events.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, help='Events per consumer call (default BOOKING_EVENT_RELAY_BATCH_SIZE).')
+        parser.add_argument('--interval', type=float, help='Keep relaying, polling the outbox every this many seconds once caught up.')
+
+    def handle(self, *args, **options):
+        consumers = get_consumers()
+        batch_size = options['batch_size'] or settings.BOOKING_EVENT_RELAY_BATCH_SIZE
+        while True:
+            started = time.monotonic()
+            relayed = 0
+            while True:
+                delivered = relay_events(consumers, batch_size)
+                relayed += delivered
+                if delivered < batch_size: # Caught up
+                    break
+            pruned = prune_events(consumers)
+            if relayed or pruned or options['interval'] is None:
+                self.stdout.write(self.style.SUCCESS(
+                    f'Relayed {relayed} event(s) to {len(consumers)} consumer(s) in {time.monotonic() - started:.1f}s, pruned {pruned}.'
+                ))
+            if options['interval'] is None:
+                return
+            close_old_connections()
+            time.sleep(options['interval'])
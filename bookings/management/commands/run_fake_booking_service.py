@@ -0,0 +1,32 @@
+from django.core.management.base import BaseCommand
+
+from bookings.fake_external_service import make_server
+
+class Command(BaseCommand):
+    """Django command to run a local stand-in for the external booking system"""
+
+    help = 'Runs a fake external booking service with configurable latency and error rates.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--host', default='127.0.0.1')
+        parser.add_argument('--port', type=int, default=8001)
+        parser.add_argument('--latency', type=float, default=0.05, help='Seconds per request.')
+        parser.add_argument('--error-rate', type=float, default=0.0, help='Share of requests answered with 503.')
+        parser.add_argument('--reject-rate', type=float, default=0.0, help='Share of bookings rejected.')
+
+    def handle(self, *args, **options):
+        server = make_server(
+            options['host'], options['port'],
+            latency=options['latency'], error_rate=options['error_rate'], reject_rate=options['reject_rate'],
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Fake booking service on http://{options['host']}:{options['port']}/ "
+            f"(latency={options['latency']}s, error_rate={options['error_rate']}, reject_rate={options['reject_rate']})"
+        ))
+        self.stdout.write('Point EXTERNAL_BOOKING_SERVICE_URL here and set EXTERNAL_BOOKING_SERVICE_MODE=http.')
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+        finally:
+            server.server_close()
@@ -0,0 +1,207 @@
+"""
+Per-request instrumentation, exported in the Prometheus text format on /metrics.
+
+bookings.middleware.RequestMetricsMiddleware opens a RequestMetrics for every
+request in a context variable, so whatever the request does on the way adds
+to it, in this thread or in sync_to_async worker threads:
+
+* SQL queries and their time, through an execute wrapper installed on every
+  database connection;
+* hits and misses of the availability and response caches (record_cache);
+* time spent waiting on the external booking service (observe_external).
+
+When the request finishes the totals are added to this process's registry,
+labelled by view (the URL name, e.g. booking-list or flight-availability).
+Recording costs a few additions under a lock. A structured log line is only
+built for a sample of requests (METRICS_LOG_SAMPLE_RATE) and slow ones, and
+only formatted if a handler emits it.
+
+Each worker process keeps its own registry, so scrape every worker (or run
+one worker per container) to see all traffic.
+"""
+from bisect import bisect_left
+from collections import defaultdict
+from contextvars import ContextVar
+from functools import wraps
+import asyncio
+import json
+import threading
+import time
+
+from django.conf import settings
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import Http404, HttpResponse
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+BACKGROUND_VIEW = 'background' # Label for work outside a request, e.g. async confirmations
+
+_lock = threading.Lock()
+_current = ContextVar('request_metrics', default=None)
+
+class Counter:
+    def __init__(self, name, documentation, labels):
+        self.name, self.documentation, self.labels = name, documentation, labels
+        self.type = 'counter'
+        self._values = defaultdict(float)
+
+    def inc(self, label_values, amount=1):
+        self._values[label_values] += amount
+
+    def samples(self):
+        for label_values, value in self._values.items():
+            yield self.name, dict(zip(self.labels, label_values)), value
+
+class Histogram:
+    def __init__(self, name, documentation, labels, buckets):
+        self.name, self.documentation, self.labels, self.buckets = name, documentation, labels, buckets
+        self.type = 'histogram'
+        self._values = {} # label values -> [count per bucket..., +Inf count, sum]
+
+    def observe(self, label_values, value):
+        values = self._values.get(label_values)
+        if values is None:
+            values = self._values[label_values] = [0] * (len(self.buckets) + 2)
+        values[bisect_left(self.buckets, value)] += 1
+        values[-1] += value
+
+    def samples(self):
+        for label_values, values in self._values.items():
+            labels = dict(zip(self.labels, label_values))
+            cumulative = 0
+            for bound, count in zip(self.buckets + ('+Inf',), values):
+                cumulative += count
+                yield f'{self.name}_bucket', {**labels, 'le': str(bound)}, cumulative
+            yield f'{self.name}_count', labels, cumulative
+            yield f'{self.name}_sum', labels, values[-1]
+
+REQUESTS = Counter('smartfly_http_requests_total', 'Requests by view, method and status.', ('view', 'method', 'status'))
+REQUEST_DURATION = Histogram(
+    'smartfly_http_request_duration_seconds', 'Time to build the response.', ('view',), LATENCY_BUCKETS,
+)
+DB_QUERIES = Histogram('smartfly_db_queries_per_request', 'SQL queries per request.', ('view',), QUERY_COUNT_BUCKETS)
+DB_DURATION = Counter('smartfly_db_duration_seconds_total', 'Time spent in SQL queries.', ('view',))
+CACHE_REQUESTS = Counter('smartfly_cache_requests_total', 'Cache lookups by cache and result.', ('view', 'cache', 'result'))
+EXTERNAL_DURATION = Histogram(
+    'smartfly_external_call_duration_seconds', 'External booking service calls.', ('view',), LATENCY_BUCKETS,
+)
+METRICS = (REQUESTS, REQUEST_DURATION, DB_QUERIES, DB_DURATION, CACHE_REQUESTS, EXTERNAL_DURATION)
+
+class RequestMetrics:
+    """ What one request did, filled in while it runs. """
+    __slots__ = ('queries', 'db_seconds', 'external_seconds', 'cache')
+
+    def __init__(self):
+        self.queries = 0
+        self.db_seconds = 0.0
+        self.external_seconds = []
+        self.cache = defaultdict(int) # (cache, result) -> lookups
+
+def start_request():
+    """ Starts collecting for the current request. Returns a token for finish_request. """
+    return _current.set(RequestMetrics())
+
+def finish_request(token, view, method, status, duration):
+    """ Adds the request's totals to the registry and returns them. """
+    current = _current.get()
+    _current.reset(token)
+    with _lock:
+        REQUESTS.inc((view, method, str(status)))
+        REQUEST_DURATION.observe((view,), duration)
+        DB_QUERIES.observe((view,), current.queries)
+        DB_DURATION.inc((view,), current.db_seconds)
+        for (cache, result), lookups in current.cache.items():
+            CACHE_REQUESTS.inc((view, cache, result), lookups)
+        for seconds in current.external_seconds:
+            EXTERNAL_DURATION.observe((view,), seconds)
+    return current
+
+def record_cache(cache, hits=0, misses=0):
+    """ Counts cache lookups against the current request (no-op outside one). """
+    current = _current.get()
+    if current is not None:
+        if hits:
+            current.cache[cache, 'hit'] += hits
+        if misses:
+            current.cache[cache, 'miss'] += misses
+
+def _record_external(seconds):
+    current = _current.get()
+    if current is not None:
+        current.external_seconds.append(seconds)
+    else:
+        with _lock:
+            EXTERNAL_DURATION.observe((BACKGROUND_VIEW,), seconds)
+
+def observe_external(func):
+    """ Decorator timing calls to the external booking service, sync or async. """
+    if asyncio.iscoroutinefunction(func):
+        @wraps(func)
+        async def async_wrapper(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return await func(*args, **kwargs)
+            finally:
+                _record_external(time.perf_counter() - started)
+        return async_wrapper
+
+    @wraps(func)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter()
+        try:
+            return func(*args, **kwargs)
+        finally:
+            _record_external(time.perf_counter() - started)
+    return wrapper
+
+def _instrument_query(execute, sql, params, many, context):
+    current = _current.get()
+    if current is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        current.queries += 1
+        current.db_seconds += time.perf_counter() - started
+
+@receiver(connection_created)
+def _install_query_instrumentation(sender, connection, **kwargs):
+    # The wrapper list outlives reconnects of the same connection object
+    if _instrument_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_instrument_query)
+
+class LazyJSON:
+    """ Serializes `fields` only if the log record is actually formatted. """
+    __slots__ = ('fields',)
+
+    def __init__(self, fields):
+        self.fields = fields
+
+    def __str__(self):
+        return json.dumps(self.fields, separators=(',', ':'))
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+def _number(value):
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+def render():
+    """ The registry in the Prometheus text exposition format. """
+    lines = []
+    with _lock:
+        for metric in METRICS:
+            lines.append(f'# HELP {metric.name} {metric.documentation}')
+            lines.append(f'# TYPE {metric.name} {metric.type}')
+            for name, labels, value in metric.samples():
+                label_text = ','.join(f'{key}="{_escape(label)}"' for key, label in labels.items())
+                lines.append(f'{name}{{{label_text}}} {_number(value)}' if label_text else f'{name} {_number(value)}')
+    return '\n'.join(lines) + '\n'
+
+def metrics_view(request):
+    """ GET /metrics for Prometheus. """
+    if not settings.METRICS_ENABLED:
+        raise Http404
+    return HttpResponse(render(), content_type='text/plain; version=0.0.4; charset=utf-8')
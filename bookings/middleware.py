@@ -0,0 +1,111 @@
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+import logging
+import random
+import time
+
+from . import db_router, metrics
+
+logger = logging.getLogger('bookings.requests')
+
+class RequestMetricsMiddleware:
+    """
+    Records query count, database time, cache lookups, external service time
+    and total time for every request (see bookings.metrics), and logs a
+    sample of requests as JSON lines. Works under WSGI and ASGI.
+    """
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not settings.METRICS_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token, started = metrics.start_request(), time.perf_counter()
+        response = self.get_response(request)
+        self._finish(request, response, token, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        token, started = metrics.start_request(), time.perf_counter()
+        response = await self.get_response(request)
+        self._finish(request, response, token, time.perf_counter() - started)
+        return response
+
+    def _finish(self, request, response, token, duration):
+        match = request.resolver_match
+        view = match.view_name if match else 'unmatched'
+        recorded = metrics.finish_request(token, view, request.method, response.status_code, duration)
+        if duration >= settings.METRICS_SLOW_REQUEST_SECONDS or random.random() < settings.METRICS_LOG_SAMPLE_RATE:
+            if logger.isEnabledFor(logging.INFO):
+                logger.info('%s', metrics.LazyJSON({
+                    'view': view,
+                    'method': request.method,
+                    'path': request.path,
+                    'status': response.status_code,
+                    'duration_ms': round(duration * 1000, 2),
+                    'queries': recorded.queries,
+                    'db_ms': round(recorded.db_seconds * 1000, 2),
+                    'external_ms': round(sum(recorded.external_seconds) * 1000, 2),
+                    'cache': {f'{cache}_{result}': lookups for (cache, result), lookups in recorded.cache.items()},
+                }))
+
+class ReplicaRoutingMiddleware:
+    """
+    Lets safe-method requests read from a replica (see bookings.db_router),
+    unless the client is within its sticky-primary window after a write.
+    Responses to any other method set or renew that window, even on errors:
+    a failed booking is still written.
+    """
+    sync_capable = True
+    async_capable = True
+    SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+    def __init__(self, get_response):
+        if not settings.DATABASE_REPLICAS:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        self.is_async = iscoroutinefunction(get_response)
+        if self.is_async:
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if self.is_async:
+            return self.__acall__(request)
+        token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            db_router.reset_replica(token)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            db_router.reset_replica(token)
+        return self._finish(request, response)
+
+    def _start(self, request):
+        if request.method not in self.SAFE_METHODS:
+            return None
+        if db_router.is_sticky(request.COOKIES.get(settings.REPLICA_STICKY_COOKIE)):
+            return None
+        return db_router.use_replica()
+
+    def _finish(self, request, response):
+        if request.method not in self.SAFE_METHODS:
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, db_router.sticky_until(),
+                max_age=settings.REPLICA_STICKY_SECONDS, httponly=True, samesite='Lax',
+            )
+        return response
@@ -0,0 +1,31 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:29
+
+from django.db import migrations, models
+from django.db.models import Count, OuterRef, Subquery
+from django.db.models.functions import Coalesce
+
+
+def populate_seats_booked(apps, schema_editor):
+    Flight = apps.get_model('bookings', 'Flight')
+    Booking = apps.get_model('bookings', 'Booking')
+    held = (
+        Booking.objects.filter(flight=OuterRef('pk'), status__in=('PENDING', 'CONFIRMED'))
+        .order_by().values('flight').annotate(count=Count('pk')).values('count')
+    )
+    Flight.objects.update(seats_booked=Coalesce(Subquery(held), 0))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='seats_booked',
+            field=models.PositiveIntegerField(default=0),
+        ),
+        migrations.RunPython(populate_seats_booked, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,43 @@
+# Generated by Django 4.2.30 on 2026-10-17 00:37
+
+from django.db import migrations, models
+
+
+def populate_route_keys(apps, schema_editor):
+    # Mirrors bookings.search.route_key; historical models have no custom methods
+    Flight = apps.get_model('bookings', 'Flight')
+    batch = []
+    for flight in Flight.objects.only('pk', 'origin', 'destination').iterator(chunk_size=2000):
+        flight.origin_key = ' '.join(flight.origin.split()).casefold()
+        flight.destination_key = ' '.join(flight.destination.split()).casefold()
+        batch.append(flight)
+        if len(batch) >= 2000:
+            Flight.objects.bulk_update(batch, ['origin_key', 'destination_key'])
+            batch = []
+    if batch:
+        Flight.objects.bulk_update(batch, ['origin_key', 'destination_key'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0004_flight_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='flight',
+            name='destination_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='flight',
+            name='origin_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(populate_route_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='flight',
+            index=models.Index(fields=['origin_key', 'destination_key', 'departure_time'], name='flight_route_departure_idx'),
+        ),
+    ]
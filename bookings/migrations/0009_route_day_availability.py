@@ -0,0 +1,30 @@
+# Generated by Django 4.2.30 on 2026-10-17 02:08
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0008_booking_event_outbox'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RouteDayAvailability',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('origin_key', models.CharField(max_length=100)),
+                ('destination_key', models.CharField(max_length=100)),
+                ('day', models.DateField()),
+                ('flights', models.PositiveIntegerField()),
+                ('available_seats', models.PositiveIntegerField()),
+                ('min_price', models.DecimalField(decimal_places=2, max_digits=10, null=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name='routedayavailability',
+            constraint=models.UniqueConstraint(fields=('origin_key', 'destination_key', 'day'), name='route_day_unique'),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 4.2.30 on 2026-10-17 03:12
+
+from django.db import migrations, models
+import re
+import unicodedata
+
+
+def _name_key(value):
+    # Mirrors bookings.search.name_key; historical models have no custom methods
+    decomposed = unicodedata.normalize('NFKD', re.sub("['\u2019\u02bc`]", '', value))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(re.sub(r'[\W_]+', ' ', stripped.casefold()).split())
+
+
+def populate_name_keys(apps, schema_editor):
+    Passenger = apps.get_model('bookings', 'Passenger')
+    batch = []
+    for passenger in Passenger.objects.only('pk', 'first_name', 'last_name').iterator(chunk_size=2000):
+        passenger.first_name_key = _name_key(passenger.first_name)
+        passenger.last_name_key = _name_key(passenger.last_name)
+        batch.append(passenger)
+        if len(batch) >= 2000:
+            Passenger.objects.bulk_update(batch, ['first_name_key', 'last_name_key'])
+            batch = []
+    if batch:
+        Passenger.objects.bulk_update(batch, ['first_name_key', 'last_name_key'])
+
+
+TRIGRAM_INDEXES = (
+    ('passenger_last_name_trgm', 'last_name_key'),
+    ('passenger_first_name_trgm', 'first_name_key'),
+)
+
+
+def create_trigram_indexes(apps, schema_editor):
+    # Substring search on PostgreSQL (bookings.passenger_search); other databases only get prefix search
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute('CREATE EXTENSION IF NOT EXISTS pg_trgm')
+    for name, column in TRIGRAM_INDEXES:
+        schema_editor.execute(f'CREATE INDEX IF NOT EXISTS {name} ON bookings_passenger USING gin ({column} gin_trgm_ops)')
+
+
+def drop_trigram_indexes(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    for name, _ in TRIGRAM_INDEXES:
+        schema_editor.execute(f'DROP INDEX IF EXISTS {name}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0009_route_day_availability'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='passenger',
+            name='first_name_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.AddField(
+            model_name='passenger',
+            name='last_name_key',
+            field=models.CharField(default='', editable=False, max_length=100),
+        ),
+        migrations.RunPython(populate_name_keys, migrations.RunPython.noop),
+        migrations.AddIndex(
+            model_name='passenger',
+            index=models.Index(fields=['last_name_key', 'first_name_key', 'date_of_birth'], name='passenger_name_dob_idx', opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'date_ops']),
+        ),
+        migrations.RunPython(create_trigram_indexes, drop_trigram_indexes),
+    ]
@@ -0,0 +1,21 @@
+# Generated by Django 4.2.30 on 2026-10-17 05:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('bookings', '0010_passenger_name_keys'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='booking',
+            index=models.Index(fields=['created_at', 'id'], name='bookings_bo_created_b97bfb_idx'),
+        ),
+        migrations.RemoveIndex(
+            model_name='booking',
+            name='bookings_bo_created_1720a2_idx',
+        ),
+    ]
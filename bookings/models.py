@@ -1,40 +1,127 @@
+from django.conf import settings
 from django.db import models
+import re
 import uuid
 
+from .search import name_key, route_key
+
 class Passenger(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     email = models.EmailField(unique=True)
     date_of_birth = models.DateField()
+    # Normalized copies of the names for indexed lookups and dedup (see set_name_keys, bookings.passenger_search)
+    first_name_key = models.CharField(max_length=100, editable=False, default='')
+    last_name_key = models.CharField(max_length=100, editable=False, default='')
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    def set_name_keys(self):
+        """ Call before bulk_create/bulk_update, which bypass save(). """
+        self.first_name_key = name_key(self.first_name)
+        self.last_name_key = name_key(self.last_name)
+
+    def save(self, *args, **kwargs):
+        self.set_name_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'first_name', 'last_name'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'first_name_key', 'last_name_key'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.first_name} {self.last_name} ({self.email})"
 
+    class Meta:
+        indexes = [
+            # Name lookups: last name equality or prefix, then first name, then date of birth.
+            # The pattern opclasses let PostgreSQL use it for LIKE 'prefix%' under any collation.
+            models.Index(
+                fields=['last_name_key', 'first_name_key', 'date_of_birth'], name='passenger_name_dob_idx',
+                opclasses=['varchar_pattern_ops', 'varchar_pattern_ops', 'date_ops'],
+            ),
+        ]
+
 class Flight(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     flight_number = models.CharField(max_length=10, unique=True)
     origin = models.CharField(max_length=100)
     destination = models.CharField(max_length=100)
+    # Case-folded copies of origin/destination for indexed route searches (see set_route_keys)
+    origin_key = models.CharField(max_length=100, editable=False, default='')
+    destination_key = models.CharField(max_length=100, editable=False, default='')
     departure_time = models.DateTimeField()
     arrival_time = models.DateTimeField()
     total_seats = models.PositiveIntegerField(default=150)
+    # Denormalized count of seats held by PENDING/CONFIRMED bookings.
+    # Only changed through bookings.inventory so it can't overbook.
+    seats_booked = models.PositiveIntegerField(default=0)
     price = models.DecimalField(max_digits=10, decimal_places=2)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @property
+    def seats_available(self):
+        return self.total_seats - self.seats_booked
+
+    def set_route_keys(self):
+        """ Call before bulk_create/bulk_update, which bypass save(). """
+        self.origin_key = route_key(self.origin)
+        self.destination_key = route_key(self.destination)
+
+    def save(self, *args, **kwargs):
+        self.set_route_keys()
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and {'origin', 'destination'} & set(update_fields):
+            kwargs['update_fields'] = set(update_fields) | {'origin_key', 'destination_key'}
+        super().save(*args, **kwargs)
+
     def __str__(self):
         return f"{self.flight_number}: {self.origin} -> {self.destination}"
 
+    class Meta:
+        indexes = [
+            # Route search: origin + destination equality, departure date range
+            models.Index(fields=['origin_key', 'destination_key', 'departure_time'], name='flight_route_departure_idx'),
+            # Keyset pagination of /api/flights/ for each supported ordering
+            models.Index(fields=['departure_time', 'id']),
+            models.Index(fields=['price', 'id']),
+        ]
+
+class RouteDayAvailability(models.Model):
+    """
+    Availability summary of the flights on a route departing on a (local)
+    day, for calendar searches. Maintained by bookings.calendar.
+    """
+    origin_key = models.CharField(max_length=100)
+    destination_key = models.CharField(max_length=100)
+    day = models.DateField()
+    flights = models.PositiveIntegerField()
+    available_seats = models.PositiveIntegerField() # Free seats over all the day's flights
+    min_price = models.DecimalField(max_digits=10, decimal_places=2, null=True) # Cheapest flight with a free seat, None when sold out
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.origin_key} -> {self.destination_key} on {self.day}: {self.available_seats} seats from {self.min_price}"
+
+    class Meta:
+        constraints = [
+            # Also the index calendar range scans read
+            models.UniqueConstraint(fields=['origin_key', 'destination_key', 'day'], name='route_day_unique'),
+        ]
+
 class Booking(models.Model):
     STATUS_CHOICES = (
         ('PENDING', 'Pending'),
         ('CONFIRMED', 'Confirmed'),
         ('CANCELLED', 'Cancelled'),
         ('FAILED', 'Failed'), # Added for integration failures
+        ('EXPIRED', 'Expired'), # PENDING for longer than BOOKING_HOLD_TTL, see bookings.holds
     )
+    # Statuses that occupy a seat (counted in Flight.seats_booked)
+    SEAT_HOLDING_STATUSES = ('PENDING', 'CONFIRMED')
+    # Statuses a booking never leaves: its seat may already be someone else's
+    FINAL_STATUSES = ('CANCELLED', 'FAILED', 'EXPIRED')
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     passenger = models.ForeignKey(Passenger, on_delete=models.CASCADE, related_name='bookings')
@@ -46,12 +133,15 @@ class Booking(models.Model):
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    @staticmethod
+    def generate_reference():
+        """ Next collision-free reference, see bookings.references. Use allocate_references() for bulk_create. """
+        from .references import next_reference
+        return next_reference()
+
     def save(self, *args, **kwargs):
         if not self.booking_reference:
-            # Generate a simple pseudo-random reference
-            import random
-            import string
-            self.booking_reference = ''.join(random.choices(string.ascii_uppercase + string.digits, k=6))
+            self.booking_reference = self.generate_reference()
         super().save(*args, **kwargs)
 
     def __str__(self):
@@ -59,8 +149,102 @@ class Booking(models.Model):
 
     class Meta:
         indexes = [
-            models.Index(fields=['status']),
+            models.Index(fields=['status', 'created_at']), # Also serves status-only lookups
             models.Index(fields=['flight', 'passenger']),
-            models.Index(fields=['created_at']),
+            # Keyset pagination of /api/bookings/, (created_at, id) as KeysetPagination orders it
+            models.Index(fields=['created_at', 'id']),
         ]
-        ordering = ['-created_at'] 
\ No newline at end of file
+        ordering = ['-created_at']
+
+class SeatMap(models.Model):
+    """
+    Which seats of a flight are assigned, as a bitmap: bit i is set while seat
+    i is held by a PENDING or CONFIRMED booking. Seat i is in row
+    i // len(SEAT_LETTERS) + 1, e.g. 0 -> 1A, 7 -> 2B with 'ABCDEF'.
+    Claimed and released by bookings.inventory under a row lock.
+    """
+    SEAT_LETTERS = settings.SEAT_MAP_LETTERS
+
+    flight = models.OneToOneField(Flight, on_delete=models.CASCADE, primary_key=True, related_name='seat_map')
+    occupied = models.BinaryField(default=bytes) # Little-endian bitmap
+    updated_at = models.DateTimeField(auto_now=True)
+
+    @classmethod
+    def seat_label(cls, index):
+        row, column = divmod(index, len(cls.SEAT_LETTERS))
+        return f"{row + 1}{cls.SEAT_LETTERS[column]}"
+
+    @classmethod
+    def seat_index(cls, label, total_seats):
+        """ Index of a seat label such as '12A', or None if the flight has no such seat. """
+        match = re.fullmatch(r'(\d{1,3})([A-Z])', (label or '').strip().upper())
+        if not match or match.group(2) not in cls.SEAT_LETTERS:
+            return None
+        index = (int(match.group(1)) - 1) * len(cls.SEAT_LETTERS) + cls.SEAT_LETTERS.index(match.group(2))
+        return index if 0 <= index < total_seats else None
+
+    @property
+    def bits(self):
+        return int.from_bytes(self.occupied, 'little')
+
+    @bits.setter
+    def bits(self, value):
+        self.occupied = value.to_bytes(max((self.flight.total_seats + 7) // 8, (value.bit_length() + 7) // 8), 'little')
+
+    def is_free(self, index):
+        return not self.bits >> index & 1
+
+    def take(self, index):
+        self.bits |= 1 << index
+
+    def free(self, index):
+        self.bits &= ~(1 << index)
+
+    def next_free(self):
+        """ Lowest free seat index, or None when every seat is assigned. """
+        free = ~self.bits & ((1 << self.flight.total_seats) - 1)
+        if not free:
+            return None
+        return (free & -free).bit_length() - 1 # Lowest set bit
+
+    def seats(self):
+        """ (label, is_free) for every seat, in order. """
+        bits = self.bits
+        return [(self.seat_label(index), not bits >> index & 1) for index in range(self.flight.total_seats)]
+
+    def __str__(self):
+        return f"Seat map for {self.flight}"
+
+class ReferenceSequence(models.Model):
+    """ Database-backed counter that booking reference blocks are reserved from. """
+    name = models.CharField(max_length=50, primary_key=True)
+    next_value = models.BigIntegerField(default=0)
+
+    def __str__(self):
+        return f"{self.name}: {self.next_value}"
+
+class BookingEvent(models.Model):
+    """
+    Transactional outbox of booking status changes, written in the same
+    transaction as the change (bookings.events). The auto-increment id is
+    the change feed's cursor and the relay's position.
+    """
+    id = models.BigAutoField(primary_key=True)
+    booking_id = models.UUIDField() # No foreign key: events outlive deleted bookings and never lock them
+    booking_reference = models.CharField(max_length=6)
+    flight_id = models.UUIDField()
+    status = models.CharField(max_length=10, choices=Booking.STATUS_CHOICES)
+    previous_status = models.CharField(max_length=10, choices=Booking.STATUS_CHOICES, blank=True, null=True) # None when created
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True)
+
+    def __str__(self):
+        return f"{self.booking_reference}: {self.previous_status or '-'} -> {self.status}"
+
+class EventRelayPosition(models.Model):
+    """ The last BookingEvent id each relay consumer has processed. """
+    consumer = models.CharField(max_length=50, primary_key=True)
+    last_event_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.consumer}: {self.last_event_id}"
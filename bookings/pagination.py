@@ -0,0 +1,149 @@
+from base64 import b64decode, b64encode
+from collections import OrderedDict
+import json
+
+from django.db.models import Q
+from django.core.exceptions import ValidationError as DjangoValidationError
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import BasePagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset (cursor) pagination for large, append-heavy listings.
+
+    Pages are fetched with `WHERE (key, id) > (last key, last id)` on the
+    queryset's own ordering plus the primary key as a tie-breaker, so every
+    page costs one index range scan no matter how deep it is, and rows
+    inserted while a client pages through don't shift or repeat results.
+    Responses keep the `count` / `next` / `previous` / `results` shape;
+    pass `?count=false` to skip the total COUNT(*).
+    """
+    cursor_query_param = 'cursor'
+    count_query_param = 'count'
+    page_size = api_settings.PAGE_SIZE
+    page_size_query_param = 'page_size'
+    max_page_size = 100
+    ordering = '-created_at' # Used when the queryset isn't ordered
+    invalid_cursor_message = 'Invalid cursor'
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.key, self.descending = self.get_ordering(queryset)
+        cursor = self.decode_cursor(request, queryset.model)
+
+        self.count = None
+        if request.query_params.get(self.count_query_param, 'true').lower() not in ('false', '0', 'no'):
+            self.count = queryset.count()
+
+        backwards = cursor is not None and cursor['reverse']
+        # Walking backwards means scanning the index in the opposite direction
+        descending = self.descending != backwards
+        prefix = '-' if descending else ''
+        queryset = queryset.order_by(f'{prefix}{self.key}', f'{prefix}pk')
+        if cursor is not None:
+            after = 'lt' if descending else 'gt'
+            queryset = queryset.filter(
+                Q(**{f'{self.key}__{after}': cursor['key']}) |
+                Q(**{self.key: cursor['key'], f'pk__{after}': cursor['pk']})
+            )
+
+        rows = list(queryset[:self.page_size + 1])
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if backwards:
+            rows.reverse()
+
+        self.page = rows
+        self.has_next = has_more if not backwards else True
+        self.has_previous = cursor is not None and (has_more if backwards else True)
+        return rows
+
+    def get_ordering(self, queryset):
+        """ The first field the queryset is ordered by, and whether it is descending. """
+        ordering = queryset.query.order_by or queryset.model._meta.ordering or (self.ordering,)
+        field = ordering[0]
+        if not isinstance(field, str) or field.lstrip('-') in ('?', 'pk', 'id'):
+            field = self.ordering
+        return field.lstrip('-'), field.startswith('-')
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return max(1, min(size, self.max_page_size))
+
+    def decode_cursor(self, request, model):
+        encoded = request.query_params.get(self.cursor_query_param)
+        if not encoded:
+            return None
+        try:
+            data = json.loads(b64decode(encoded.encode('ascii')).decode('utf-8'))
+            field = model._meta.get_field(self.key)
+            return {
+                'key': field.to_python(data['k']),
+                'pk': model._meta.pk.to_python(data['p']),
+                'reverse': bool(data.get('r')),
+            }
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+
+    def encode_cursor(self, row, reverse):
+        if isinstance(row, dict): # .values() querysets
+            key, pk = row[self.key], row.get('pk', row.get('id'))
+        else:
+            key, pk = getattr(row, self.key), row.pk
+        data = {'k': key.isoformat() if hasattr(key, 'isoformat') else str(key), 'p': str(pk)}
+        if reverse:
+            data['r'] = 1
+        encoded = b64encode(json.dumps(data, separators=(',', ':')).encode('utf-8')).decode('ascii')
+        return replace_query_param(self.base_url, self.cursor_query_param, encoded)
+
+    def get_next_link(self):
+        if not self.has_next:
+            return None
+        if not self.page: # Walked back past the start
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[-1], reverse=False)
+
+    def get_previous_link(self):
+        if not self.has_previous:
+            return None
+        if not self.page:
+            return remove_query_param(self.base_url, self.cursor_query_param)
+        return self.encode_cursor(self.page[0], reverse=True)
+
+    def get_paginated_response(self, data):
+        response = OrderedDict()
+        if self.count is not None:
+            response['count'] = self.count
+        response['next'] = self.get_next_link()
+        response['previous'] = self.get_previous_link()
+        response['results'] = data
+        return Response(response)
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            'type': 'object',
+            'properties': {
+                'count': {'type': 'integer', 'example': 123},
+                'next': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'previous': {'type': 'string', 'nullable': True, 'format': 'uri'},
+                'results': schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {'name': self.cursor_query_param, 'required': False, 'in': 'query',
+             'description': 'The pagination cursor value.', 'schema': {'type': 'string'}},
+            {'name': self.page_size_query_param, 'required': False, 'in': 'query',
+             'description': 'Number of results to return per page.', 'schema': {'type': 'integer'}},
+            {'name': self.count_query_param, 'required': False, 'in': 'query',
+             'description': 'Set to false to skip the total count.', 'schema': {'type': 'boolean'}},
+        ]
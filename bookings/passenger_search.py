@@ -0,0 +1,152 @@
+"""
+Passenger lookup by name, for check-in desks, the admin and imports.
+
+Names are matched on their normalized copies (Passenger.first_name_key and
+last_name_key, see bookings.search.name_key) so no lookup case-folds the
+column of every row:
+
+* the (last_name_key, first_name_key, date_of_birth) index serves exact
+  name + date of birth matches and last name prefixes ("smi" finds Smith
+  and Smithers), optionally narrowed by a first name prefix;
+* on PostgreSQL, the pg_trgm GIN indexes on both keys (migration 0010)
+  also serve substring matches of 3 characters or more anywhere in either
+  name. Other databases fall back to prefix matches.
+
+match_passengers() is the import side: it finds the existing passengers of
+thousands of incoming records with one query, by email or by name and date
+of birth.
+"""
+from collections import defaultdict
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+
+from .models import Passenger
+from .search import name_key
+
+TRIGRAM_MIN_LENGTH = 3 # pg_trgm can't use its index for shorter patterns
+PREFIX_UPPER_BOUND = '\U0010ffff' # Sorts after any character that can follow a prefix
+SEARCH_ORDERING = ('last_name_key', 'first_name_key', 'date_of_birth', 'id')
+MATCH_FIELDS = ('id', 'first_name', 'last_name', 'email', 'date_of_birth')
+
+def _uses_trigrams(queryset):
+    return connections[queryset.db].vendor == 'postgresql'
+
+def _prefix(field, prefix, trigrams):
+    """ Q for `field` starting with `prefix` that stays a range scan on the name index. """
+    if trigrams:
+        # LIKE 'prefix%', served by the varchar_pattern_ops index
+        return Q(**{f'{field}__startswith': prefix})
+    # SQLite never uses an index for LIKE on a case-sensitive column, but does for a range
+    return Q(**{f'{field}__gte': prefix, f'{field}__lt': prefix + PREFIX_UPPER_BOUND})
+
+def name_filter(query, trigrams=False):
+    """
+    Q matching the passengers whose names match a free-form `query`, or
+    None if it has nothing to search on. The words are tried as a last
+    name prefix, and when there are several, split into a last and a first
+    name prefix in either order ("smith jo", "jo smith"; a last name shorter
+    than TRIGRAM_MIN_LENGTH must then match whole). With `trigrams`
+    (PostgreSQL) and words of TRIGRAM_MIN_LENGTH or more, every word must
+    appear anywhere in either name instead.
+    """
+    words = name_key(query).split()
+    if not words:
+        return None
+    if trigrams and all(len(word) >= TRIGRAM_MIN_LENGTH for word in words):
+        q = Q()
+        for word in words:
+            q &= Q(last_name_key__contains=word) | Q(first_name_key__contains=word)
+        return q
+
+    def last_name(value):
+        # Next to a first name, a short last name is most likely whole ("li wei"), and
+        # as a prefix it would range over a large part of the index
+        if len(value) < TRIGRAM_MIN_LENGTH:
+            return Q(last_name_key=value)
+        return _prefix('last_name_key', value, trigrams)
+
+    q = _prefix('last_name_key', ' '.join(words), trigrams)
+    for split in range(1, len(words)):
+        head, tail = ' '.join(words[:split]), ' '.join(words[split:])
+        q |= last_name(head) & _prefix('first_name_key', tail, trigrams)
+        q |= last_name(tail) & _prefix('first_name_key', head, trigrams)
+    return q
+
+def search_passengers(query, date_of_birth=None, queryset=None):
+    """
+    Passengers matching `query`, in name order: an exact email match if it
+    contains an @, otherwise the name matches of name_filter(). `queryset`
+    defaults to every passenger. Slice the result.
+    """
+    queryset = Passenger.objects.all() if queryset is None else queryset
+    query = query.strip()
+    if '@' in query:
+        queryset = queryset.filter(email=query)
+    else:
+        q = name_filter(query, trigrams=_uses_trigrams(queryset))
+        if q is None:
+            return queryset.none()
+        queryset = queryset.filter(q)
+    if date_of_birth is not None:
+        queryset = queryset.filter(date_of_birth=date_of_birth)
+    return queryset.order_by(*SEARCH_ORDERING)
+
+def _same_name_dob(keys, connection):
+    """
+    Subquery of the ids of the passengers with any of the given
+    (last_name_key, first_name_key, date_of_birth) keys: a join of the keys
+    as a VALUES list with the name index, so one index seek per key. (Per
+    column IN lists would probe every combination of them, and an OR per
+    key goes past SQLite's expression depth limit.)
+    """
+    qn = connection.ops.quote_name
+    opts = Passenger._meta
+    last, first, date_of_birth = (qn(opts.get_field(name).column) for name in ('last_name_key', 'first_name_key', 'date_of_birth'))
+    params = []
+    for key in keys:
+        params.extend((key[0], key[1], connection.ops.adapt_datefield_value(key[2])))
+    sql = (
+        f"SELECT p.{qn(opts.pk.column)} FROM (VALUES {', '.join(['(%s, %s, %s)'] * len(keys))}) AS v "
+        f"JOIN {qn(opts.db_table)} p ON p.{last} = v.column1 AND p.{first} = v.column2 AND p.{date_of_birth} = v.column3"
+    )
+    return RawSQL(sql, params)
+
+def match_passengers(records):
+    """
+    Existing passengers for each incoming record, read with one query.
+
+    Args:
+        records (list[dict]): first_name, last_name, date_of_birth (date) and optionally email.
+
+    Returns:
+        list: Per record, in order, a list of match dicts (MATCH_FIELDS plus
+              `match`: "email" or "name_dob"), the email match first.
+    """
+    emails = {record['email'] for record in records if record.get('email')}
+    keys = [(name_key(record['last_name']), name_key(record['first_name']), record['date_of_birth']) for record in records]
+    if not keys:
+        return []
+    passengers = Passenger.objects.all()
+    candidates = passengers.filter(
+        Q(email__in=emails) | Q(pk__in=_same_name_dob(set(keys), connections[passengers.db]))
+    ).values(*MATCH_FIELDS, 'last_name_key', 'first_name_key')
+
+    by_email, by_key = {}, defaultdict(list)
+    for passenger in candidates:
+        key = (passenger.pop('last_name_key'), passenger.pop('first_name_key'), passenger['date_of_birth'])
+        by_email[passenger['email']] = passenger
+        by_key[key].append(passenger)
+
+    results = []
+    for record, key in zip(records, keys):
+        matches = []
+        email_match = by_email.get(record.get('email'))
+        if email_match is not None:
+            matches.append({**email_match, 'match': 'email'})
+        for passenger in by_key.get(key, ()):
+            if passenger is not email_match:
+                matches.append({**passenger, 'match': 'name_dob'})
+        results.append(matches)
+    return results
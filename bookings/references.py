@@ -0,0 +1,190 @@
+"""
+Collision-free booking references.
+
+References are consecutive integers from a database sequence (the
+ReferenceSequence row), pushed through a keyed Feistel permutation of
+[0, 36^6) and written as 6 base-36 characters. The permutation is a
+bijection, so distinct sequence numbers always give distinct references
+without checking the table, and consecutive bookings don't get guessable
+neighbouring codes.
+
+Each worker process reserves a block of sequence numbers at a time,
+shared by its threads, so there is no database round trip per booking;
+this also works for bulk_create.
+"""
+from django.conf import settings
+from django.db import connections, transaction
+import hashlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+REFERENCE_LENGTH = 6
+HALF_SPACE = 36 ** (REFERENCE_LENGTH // 2) # 46656 values per Feistel half
+SPACE = HALF_SPACE * HALF_SPACE # 36^6 = 2,176,782,336 references
+ROUNDS = 4
+SEQUENCE_NAME = 'booking_reference'
+
+def _round_keys(secret):
+    digest = hashlib.sha256(f"booking-reference:{secret}".encode()).digest()
+    return [int.from_bytes(digest[i * 4:(i + 1) * 4], 'big') for i in range(ROUNDS)]
+
+_KEYS = _round_keys(settings.BOOKING_REFERENCE_KEY)
+
+def _round_function(value, key):
+    # Any deterministic function works for a Feistel network; this one just mixes bits
+    value = (value * 0x9E3779B1 + key) & 0xFFFFFFFF
+    value ^= value >> 15
+    value = (value * 0x85EBCA6B) & 0xFFFFFFFF
+    value ^= value >> 13
+    return value % HALF_SPACE
+
+def scramble(number):
+    """ Bijectively maps a sequence number in [0, 36^6) to another number in the same range. """
+    left, right = divmod(number, HALF_SPACE)
+    for key in _KEYS:
+        left, right = right, (left + _round_function(right, key)) % HALF_SPACE
+    return left * HALF_SPACE + right
+
+def unscramble(number):
+    """ Inverse of scramble(). """
+    left, right = divmod(number, HALF_SPACE)
+    for key in reversed(_KEYS):
+        left, right = (right - _round_function(left, key)) % HALF_SPACE, left
+    return left * HALF_SPACE + right
+
+def encode(number):
+    """ Sequence number -> 6 character reference. """
+    value = scramble(number)
+    chars = []
+    for _ in range(REFERENCE_LENGTH):
+        value, digit = divmod(value, 36)
+        chars.append(ALPHABET[digit])
+    return ''.join(reversed(chars))
+
+def decode(reference):
+    """ 6 character reference -> sequence number it was allocated from. """
+    value = 0
+    for char in reference:
+        value = value * 36 + ALPHABET.index(char)
+    return unscramble(value)
+
+def reserve_block(size):
+    """
+    Takes the next `size` sequence numbers from the database.
+    Returns (start, end) of the half-open range.
+    """
+    from .models import Booking, ReferenceSequence
+
+    with transaction.atomic():
+        sequence, _ = ReferenceSequence.objects.select_for_update().get_or_create(name=SEQUENCE_NAME)
+        start = sequence.next_value
+        end = min(start + size, SPACE)
+        if start >= end:
+            raise RuntimeError("Booking reference space exhausted.")
+        sequence.next_value = end
+        sequence.save(update_fields=['next_value'])
+
+    # References from before this allocator were random and may sit anywhere in the
+    # space. One indexed lookup per block finds any that clash so they can be skipped.
+    references = {number: encode(number) for number in range(start, end)}
+    taken = set(Booking.objects.filter(booking_reference__in=references.values()).values_list('booking_reference', flat=True))
+    if taken:
+        logger.info("Skipping %s references already used by legacy bookings.", len(taken))
+    return [reference for reference in references.values() if reference not in taken]
+
+def _in_own_transaction(func, *args):
+    """
+    Calls func in a thread of its own, so its queries run on a separate
+    connection and commit whatever the caller's transaction does later.
+    """
+    outcome = {}
+
+    def run():
+        try:
+            outcome['value'] = func(*args)
+        except BaseException as e:
+            outcome['error'] = e
+        finally:
+            connections.close_all() # This thread's connection, not the caller's
+
+    thread = threading.Thread(target=run, name='reference-block')
+    thread.start()
+    thread.join()
+    if 'error' in outcome:
+        raise outcome['error']
+    return outcome['value']
+
+class ReferenceAllocator:
+    """
+    Hands out references from a block reserved for the whole process,
+    refilling it when empty. Threads share it behind a lock, so an ASGI
+    worker running every request in a new thread still reserves one block
+    per BOOKING_REFERENCE_BLOCK_SIZE bookings.
+
+    A block is reserved in a short transaction of its own, on its own
+    connection when the caller is inside atomic(), so it is durable before
+    any of it is handed out: a booking that rolls back only skips its
+    reference, it can't put the sequence row back and have the numbers
+    handed out twice.
+
+    SQLite is the exception: it allows one writer, and the caller's
+    transaction may hold the write lock. There the block is reserved in the
+    caller's transaction, kept by that caller, and whatever is left joins
+    the shared block once it commits (and is dropped if it rolls back).
+    """
+
+    def __init__(self, block_size=None):
+        self.block_size = block_size or settings.BOOKING_REFERENCE_BLOCK_SIZE
+        self.discard()
+
+    def discard(self):
+        """ Drops the reserved references, e.g. in a forked child or after the sequence was reset by a flush. """
+        self._available = []
+        self._lock = threading.Lock()
+
+    def _take(self, count):
+        # Served from the end of the list, newest first
+        allocated = self._available[-count:]
+        del self._available[-count:]
+        return list(reversed(allocated))
+
+    def _release(self, references):
+        with self._lock:
+            self._available = list(reversed(references)) + self._available
+
+    def allocate(self, count=1):
+        """ Returns `count` new, unused references. """
+        if count <= 0:
+            return []
+        connection = transaction.get_connection()
+        in_transaction = connection.in_atomic_block
+
+        if in_transaction and connection.vendor == 'sqlite':
+            with self._lock:
+                if len(self._available) >= count:
+                    return self._take(count)
+            # Not under the lock: reserving may wait for another thread's write lock
+            fresh = reserve_block(max(self.block_size, count))
+            transaction.on_commit(lambda: self._release(fresh[count:]))
+            return fresh[:count]
+
+        with self._lock:
+            while len(self._available) < count:
+                size = max(self.block_size, count - len(self._available))
+                fresh = _in_own_transaction(reserve_block, size) if in_transaction else reserve_block(size)
+                self._available = list(reversed(fresh)) + self._available
+            return self._take(count)
+
+allocator = ReferenceAllocator()
+# A forked child (gunicorn --preload, multiprocessing) must not hand out the parent's block again
+os.register_at_fork(after_in_child=allocator.discard)
+
+def next_reference():
+    return allocator.allocate(1)[0]
+
+def allocate_references(count):
+    return allocator.allocate(count)
@@ -0,0 +1,157 @@
+"""
+Response cache for the read-only flight endpoints.
+
+Serialized responses are cached per normalized query and validated against
+version tokens instead of being deleted on writes:
+
+* every flight has a version, bumped when the flight is saved and when its
+  seat counter changes (record_seat_changes / the invalidate helpers);
+* the flight catalog has a version, bumped when any flight is created,
+  edited or deleted, since that can change which flights a search returns.
+
+A cached list is served while the catalog version and the versions of the
+flights it contains are unchanged, so a booking on one flight only expires
+the searches that include it. A hit costs two cache round trips and no
+queries. Versions are time_ns() tokens, so they double as modification times
+for Last-Modified, and a response computed while a version moved is never
+stored. Responses read from a replica are only stored when nothing they
+show changed within the replica's sticky window (bookings.db_router).
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.dateparse import parse_datetime
+from django.utils.http import http_date, quote_etag
+from rest_framework.response import Response
+import hashlib
+import logging
+import time
+
+from .db_router import reading_from_replica
+from .metrics import record_cache
+from .search import route_key
+
+logger = logging.getLogger(__name__)
+
+CACHE_KEY_FLIGHT_RESPONSE = "flight_response_{digest}"
+CACHE_KEY_FLIGHT_VERSION = "flight_version_{flight_id}"
+CACHE_KEY_FLIGHT_CATALOG_VERSION = "flight_catalog_version"
+VERSION_TIMEOUT = 60 * 60 * 24 # Versions outlive any cached response
+NORMALIZED_PARAMS = {'origin': route_key, 'destination': route_key}
+
+def _flight_version_key(flight_id):
+    return CACHE_KEY_FLIGHT_VERSION.format(flight_id=flight_id)
+
+def bump_flight_versions(flight_ids, catalog=False):
+    """
+    Expires cached responses containing the given flights (and every cached
+    list, with catalog=True). Call after the change has committed.
+    """
+    token = time.time_ns()
+    versions = {_flight_version_key(flight_id): token for flight_id in flight_ids}
+    if catalog:
+        versions[CACHE_KEY_FLIGHT_CATALOG_VERSION] = token
+    if versions:
+        cache.set_many(versions, VERSION_TIMEOUT)
+
+def _current_versions(keys):
+    """
+    Reads version tokens in one round trip. A missing (never set or evicted)
+    version starts now, so it can't match a response stored before it was lost.
+    """
+    versions = cache.get_many(keys)
+    missing = [key for key in keys if key not in versions]
+    if missing:
+        token = time.time_ns()
+        for key in missing:
+            if not cache.add(key, token, VERSION_TIMEOUT):
+                token = cache.get(key, token) # Set concurrently by someone else
+            versions[key] = token
+    return versions
+
+def catalog_version():
+    """ The flight catalog's current version token, moved by every flight create, edit or delete. """
+    return _current_versions([CACHE_KEY_FLIGHT_CATALOG_VERSION])[CACHE_KEY_FLIGHT_CATALOG_VERSION]
+
+def response_cache_key(request):
+    """ Cache key for a request: host, path and its non-empty query params, normalized and sorted. """
+    params = []
+    for name, values in request.query_params.lists():
+        normalize = NORMALIZED_PARAMS.get(name, str.strip)
+        params.extend((name, normalize(value)) for value in values if value.strip())
+    # The host is part of the key because pagination links are absolute URLs
+    raw = repr((request.get_host(), request.path, sorted(params)))
+    return CACHE_KEY_FLIGHT_RESPONSE.format(digest=hashlib.sha1(raw.encode()).hexdigest())
+
+class CachedFlightResponseMixin:
+    """
+    Serves `list` and `retrieve` from the response cache, with ETag and
+    Last-Modified headers and 304 responses to conditional requests.
+    The serialized data is cached, so rendering still honours the requested format.
+    """
+
+    def list(self, request, *args, **kwargs):
+        return self._cached_response(request, super().list, args, kwargs, is_list=True)
+
+    def retrieve(self, request, *args, **kwargs):
+        return self._cached_response(request, super().retrieve, args, kwargs, is_list=False)
+
+    def _version_keys(self, flight_ids, is_list):
+        keys = [_flight_version_key(flight_id) for flight_id in flight_ids]
+        if is_list:
+            keys.append(CACHE_KEY_FLIGHT_CATALOG_VERSION)
+        return keys
+
+    def _served_items(self, response, is_list):
+        """ (id, updated_at) of the flights in the response. """
+        rows = getattr(self, 'served_rows', None) # Set by FastReadMixin, also when ?fields= leaves these out
+        if rows is not None:
+            return [(row['id'], row['updated_at']) for row in rows]
+        items = response.data['results'] if is_list else [response.data]
+        return [(item['id'], parse_datetime(item['updated_at'])) for item in items]
+
+    def _cached_response(self, request, view, args, kwargs, is_list):
+        cache_key = response_cache_key(request)
+        entry = cache.get(cache_key)
+        if entry is not None:
+            if _current_versions(list(entry['versions'])) == entry['versions']:
+                record_cache('flight_response', hits=1)
+                return self._conditional_response(request, entry)
+            logger.debug("Response cache stale: %s", request.path)
+        record_cache('flight_response', misses=1)
+
+        started = time.time_ns()
+        if reading_from_replica():
+            # A change that committed this recently may not have reached the replica yet
+            started -= int(settings.REPLICA_STICKY_SECONDS * 1e9)
+        response = view(request, *args, **kwargs)
+        if response.status_code != 200:
+            return response
+
+        items = self._served_items(response, is_list)
+        versions = _current_versions(self._version_keys([item_id for item_id, _ in items], is_list))
+        entry = {
+            'data': response.data,
+            'versions': versions,
+            'etag': quote_etag(hashlib.sha1(f"{cache_key}:{sorted(versions.items())}".encode()).hexdigest()),
+            'last_modified': max(
+                [updated_at.timestamp() for _, updated_at in items]
+                + [token / 1e9 for token in versions.values()]
+            ),
+        }
+        # Something changed while the response was being built, so it may already be out of date
+        if max(versions.values()) < started:
+            cache.set(cache_key, entry, settings.FLIGHT_RESPONSE_CACHE_TIMEOUT)
+        return self._conditional_response(request, entry, response)
+
+    def _conditional_response(self, request, entry, response=None):
+        if response is None:
+            response = Response(entry['data'])
+        response['ETag'] = entry['etag']
+        response['Last-Modified'] = http_date(entry['last_modified'])
+        # Clients may keep the response but must revalidate it, availability changes constantly
+        patch_cache_control(response, max_age=0, must_revalidate=True)
+        # Returns a 304 (keeping the validators) when the client's copy is current
+        return get_conditional_response(
+            request, etag=entry['etag'], last_modified=int(entry['last_modified']), response=response,
+        )
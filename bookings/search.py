@@ -0,0 +1,49 @@
+"""
+Helpers that turn user search input into index-friendly lookups.
+"""
+from datetime import datetime, time, timedelta
+import re
+import unicodedata
+
+from django.utils import timezone
+from django.utils.dateparse import parse_date
+
+def route_key(value):
+    """
+    Normalized form of an origin/destination stored in Flight.origin_key and
+    destination_key, so searches are plain equality matches on an index
+    instead of case-insensitive scans.
+    """
+    return ' '.join(value.split()).casefold()
+
+NAME_APOSTROPHES = re.compile("['\u2019\u02bc`]")
+NAME_SEPARATORS = re.compile(r'[\W_]+')
+
+def name_key(value):
+    """
+    Normalized form of a passenger name stored in Passenger.first_name_key and
+    last_name_key: accents and apostrophes stripped, case-folded, other
+    punctuation and runs of whitespace turned into single spaces
+    ("  Zoë O'Brien-Smith" -> "zoe obrien smith"), so name lookups are
+    equality and prefix matches on an index.
+    """
+    decomposed = unicodedata.normalize('NFKD', NAME_APOSTROPHES.sub('', value))
+    stripped = ''.join(char for char in decomposed if not unicodedata.combining(char))
+    return ' '.join(NAME_SEPARATORS.sub(' ', stripped.casefold()).split())
+
+def parse_day(value):
+    """ Parses YYYY-MM-DD, returning None for anything invalid. """
+    try:
+        return parse_date(value)
+    except ValueError: # Well formed but impossible, e.g. 2025-02-30
+        return None
+
+def day_range(day):
+    """
+    Half-open [start, end) datetime range covering `day` in the current time
+    zone. Filtering a DateTimeField with it uses the column's index, unlike
+    `__date`, which casts every row.
+    """
+    start = timezone.make_aware(datetime.combine(day, time.min))
+    end = timezone.make_aware(datetime.combine(day + timedelta(days=1), time.min))
+    return start, end
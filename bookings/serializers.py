@@ -1,5 +1,14 @@
+from datetime import timedelta
+from django.conf import settings
+from django.db.models import Exists, OuterRef, Subquery
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Passenger, Flight, Booking
+from operator import sub
+from .fast_serializers import ValuesRepresentation
+from .holds import expire_holds, live_hold_filter
+from .itineraries import SORT_KEYS
+from .models import Passenger, Flight, Booking, SeatMap
+from .search import route_key
 
 class PassengerSerializer(serializers.ModelSerializer):
     class Meta:
@@ -19,21 +28,67 @@ class FlightSerializer(serializers.ModelSerializer):
         read_only_fields = ('id', 'available_seats', 'created_at', 'updated_at')
 
     def get_available_seats(self, obj):
-        # Basic calculation, could be optimized with annotation in the viewset
-        booked_seats = Booking.objects.filter(flight=obj, status='CONFIRMED').count()
-        return obj.total_seats - booked_seats
+        # Read from the denormalized counter, no per-row COUNT needed
+        return obj.seats_available
+
+def validate_seat_number(seat_number, auto_assign, flight):
+    """
+    Normalizes a requested seat ('12a ' -> '12A'). Whether it's free is only
+    known once bookings.inventory.claim_seat has the seat map locked.
+    """
+    if not seat_number:
+        return None
+    if auto_assign:
+        raise serializers.ValidationError({"seat_number": "Pass either seat_number or auto_assign_seat, not both."})
+    if SeatMap.seat_index(seat_number, flight.total_seats) is None:
+        raise serializers.ValidationError({"seat_number": f"Seat {seat_number} does not exist on this flight."})
+    return seat_number.strip().upper()
+
+PASSENGER_FIELDS = [field.attname for field in Passenger._meta.concrete_fields]
+
+def load_booking_targets(passenger_id, flight_id):
+    """
+    Fetches what booking validation needs in one query: the flight row, with
+    the passenger's columns and whether the passenger already holds a seat on
+    the flight (expired holds don't count) as correlated subqueries on primary keys and the
+    (flight, passenger) index. Only a missing flight costs a second query, to
+    tell whether the passenger exists too.
+
+    Returns:
+        tuple: (Passenger | None, Flight | None, already_booked: bool)
+    """
+    passenger = Passenger.objects.filter(pk=passenger_id)
+    flight = (
+        Flight.objects.filter(pk=flight_id)
+        .annotate(
+            **{f'passenger_{name}': Subquery(passenger.values(name)) for name in PASSENGER_FIELDS},
+            already_booked=Exists(Booking.objects.filter(
+                live_hold_filter(), passenger_id=passenger_id, flight=OuterRef('pk'),
+            )),
+        )
+        .first()
+    )
+    if flight is None:
+        return (passenger.first() if passenger.exists() else None), None, False
+    values = [getattr(flight, f'passenger_{name}') for name in PASSENGER_FIELDS]
+    if values[0] is None:
+        return None, flight, False
+    return Passenger.from_db(flight._state.db, PASSENGER_FIELDS, values), flight, flight.already_booked
 
 class BookingSerializer(serializers.ModelSerializer):
     passenger = PassengerSerializer(read_only=True) # Nested read-only representation
     flight = FlightSerializer(read_only=True)       # Nested read-only representation
-    passenger_id = serializers.UUIDField(write_only=True)
-    flight_id = serializers.UUIDField(write_only=True)
+    # extra_kwargs don't apply to declared fields, so the source mapping lives here
+    passenger_id = serializers.UUIDField(source='passenger', write_only=True)
+    flight_id = serializers.UUIDField(source='flight', write_only=True)
+    # Assign the lowest-numbered free seat instead of a requested seat_number
+    auto_assign_seat = serializers.BooleanField(write_only=True, required=False, default=False)
 
     class Meta:
         model = Booking
         fields = (
             'id', 'booking_reference', 'passenger', 'flight',
-            'passenger_id', 'flight_id', # Write-only fields for creating/updating
+            'passenger_id', 'flight_id', 'auto_assign_seat', # Write-only fields for creating/updating
             'status', 'seat_number', 'external_system_ref',
             'created_at', 'updated_at'
         )
@@ -42,37 +97,171 @@ class BookingSerializer(serializers.ModelSerializer):
             'status', 'external_system_ref', # Status managed by backend logic
             'created_at', 'updated_at'
         )
-        # Ensure write_only fields are used for input
-        extra_kwargs = {
-            'passenger_id': {'source': 'passenger', 'write_only': True},
-            'flight_id': {'source': 'flight', 'write_only': True},
-        }
 
     def validate(self, data):
-        # Check if flight and passenger exist
-        try:
-            passenger = Passenger.objects.get(pk=data['passenger'])
-        except Passenger.DoesNotExist:
+        passenger, flight, already_booked = load_booking_targets(data['passenger'], data['flight'])
+        if passenger is None:
             raise serializers.ValidationError({"passenger_id": "Passenger not found."})
+        if flight is None:
+            raise serializers.ValidationError({"flight_id": "Flight not found."})
 
-        try:
-            flight = Flight.objects.get(pk=data['flight'])
-        except Flight.DoesNotExist:
-            raise serializers.ValidationError({"flight_id": "Flight not found."}) 
-
-        # Check for available seats (simplified check)
-        booked_seats = Booking.objects.filter(flight=flight, status='CONFIRMED').count()
-        if booked_seats >= flight.total_seats:
-            raise serializers.ValidationError({"flight_id": "No available seats on this flight."}) 
+        # Early exit on full flights; the seat itself is taken atomically by
+        # bookings.inventory.reserve_seats when the booking is created.
+        # A full flight may have expired holds the sweeper hasn't got to yet.
+        if flight.seats_available <= 0:
+            expired = expire_holds(flight_id=flight.pk)
+            if not expired:
+                raise serializers.ValidationError({"flight_id": "No available seats on this flight."})
+            flight.seats_booked -= expired
 
         # Prevent duplicate bookings for the same passenger on the same flight
-        if Booking.objects.filter(passenger=passenger, flight=flight, status__in=['PENDING', 'CONFIRMED']).exists():
+        if already_booked:
              raise serializers.ValidationError("Passenger already has a booking on this flight.")
 
+        data['seat_number'] = validate_seat_number(data.get('seat_number'), data.get('auto_assign_seat'), flight)
         data['passenger'] = passenger
-        data['flight'] = flight    
+        data['flight'] = flight
+        return data
+
+class BulkBookingItemSerializer(serializers.Serializer): # One entry of a bulk booking request
+    passenger_id = serializers.UUIDField()
+    flight_id = serializers.UUIDField()
+    seat_number = serializers.CharField(max_length=4, required=False, allow_blank=True, allow_null=True)
+    auto_assign_seat = serializers.BooleanField(required=False, default=False)
+
+class BulkBookingSerializer(serializers.Serializer):
+    """
+    Validates a bulk booking request with a fixed number of set-based queries,
+    whatever the number of items. Invalid items don't fail the request:
+    validated_data['items'] holds every item with its resolved passenger and
+    flight, or the same errors BookingSerializer would have raised for it.
+    """
+    bookings = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_bookings(self, value):
+        if len(value) > settings.BULK_BOOKING_MAX_ITEMS:
+            raise serializers.ValidationError(f"At most {settings.BULK_BOOKING_MAX_ITEMS} bookings per request.")
+        return value
+
+    def validate(self, data):
+        items = []
+        for index, raw_item in enumerate(data['bookings']):
+            item_serializer = BulkBookingItemSerializer(data=raw_item)
+            if item_serializer.is_valid():
+                items.append({'index': index, 'errors': None, **item_serializer.validated_data})
+            else:
+                items.append({'index': index, 'errors': item_serializer.errors})
+
+        candidates = [item for item in items if not item['errors']]
+        passengers = Passenger.objects.in_bulk({item['passenger_id'] for item in candidates})
+        flights = Flight.objects.in_bulk({item['flight_id'] for item in candidates})
+        existing = set(
+            Booking.objects.filter(
+                live_hold_filter(), passenger_id__in=list(passengers), flight_id__in=list(flights),
+            ).values_list('passenger_id', 'flight_id')
+        )
+
+        for item in candidates:
+            passenger = passengers.get(item['passenger_id'])
+            flight = flights.get(item['flight_id'])
+            pair = (item['passenger_id'], item['flight_id'])
+            if passenger is None:
+                item['errors'] = {"passenger_id": ["Passenger not found."]}
+            elif flight is None:
+                item['errors'] = {"flight_id": ["Flight not found."]}
+            elif flight.seats_available <= 0:
+                item['errors'] = {"flight_id": ["No available seats on this flight."]}
+            elif pair in existing:
+                item['errors'] = {"non_field_errors": ["Passenger already has a booking on this flight."]}
+            else:
+                try:
+                    item['seat_number'] = validate_seat_number(item.get('seat_number'), item['auto_assign_seat'], flight)
+                except serializers.ValidationError as e:
+                    item['errors'] = {field: [message] for field, message in e.detail.items()}
+                    continue
+                existing.add(pair) # Also catches the same pair twice in one request
+                item['passenger'] = passenger
+                item['flight'] = flight
+
+        data['items'] = items
+        return data
+
+class ItinerarySearchSerializer(serializers.Serializer): # Query parameters of /itineraries/
+    origin = serializers.CharField()
+    destination = serializers.CharField()
+    departure_date = serializers.DateField()
+    max_legs = serializers.IntegerField(min_value=1, max_value=settings.ITINERARY_MAX_LEGS, default=settings.ITINERARY_MAX_LEGS)
+    # Minutes between landing and the next departure
+    min_connection = serializers.IntegerField(min_value=0, default=settings.ITINERARY_MIN_CONNECTION_MINUTES)
+    max_connection = serializers.IntegerField(min_value=0, default=settings.ITINERARY_MAX_CONNECTION_MINUTES)
+    sort = serializers.ChoiceField(choices=SORT_KEYS, default=SORT_KEYS[0])
+    seats = serializers.IntegerField(min_value=1, default=1) # Free seats needed on every leg
+    limit = serializers.IntegerField(min_value=1, max_value=settings.ITINERARY_MAX_RESULTS, default=10)
+
+    def validate(self, data):
+        if route_key(data['origin']) == route_key(data['destination']):
+            raise serializers.ValidationError({"destination": "Must differ from the origin."})
+        if data['max_connection'] < data['min_connection']:
+            raise serializers.ValidationError({"max_connection": "Must not be shorter than min_connection."})
+        return data
+
+class PassengerSearchSerializer(serializers.Serializer): # Query parameters of /passengers/search/
+    q = serializers.CharField(max_length=200) # Name words, or an email address
+    date_of_birth = serializers.DateField(required=False)
+    limit = serializers.IntegerField(min_value=1, max_value=settings.PASSENGER_SEARCH_MAX_RESULTS, default=20)
+
+class PassengerMatchItemSerializer(serializers.Serializer): # One incoming record of a match request
+    first_name = serializers.CharField(max_length=100)
+    last_name = serializers.CharField(max_length=100)
+    date_of_birth = serializers.DateField()
+    email = serializers.EmailField(required=False, allow_blank=True, allow_null=True)
+
+class PassengerMatchSerializer(serializers.Serializer):
+    """
+    Validates the records of a passenger match request. Invalid records
+    don't fail the request: validated_data['items'] holds every record,
+    validated or with its errors.
+    """
+    passengers = serializers.ListField(child=serializers.DictField(), allow_empty=False)
+
+    def validate_passengers(self, value):
+        if len(value) > settings.PASSENGER_MATCH_MAX_ITEMS:
+            raise serializers.ValidationError(f"At most {settings.PASSENGER_MATCH_MAX_ITEMS} passengers per request.")
+        return value
+
+    def validate(self, data):
+        items = []
+        for index, raw_item in enumerate(data['passengers']):
+            item_serializer = PassengerMatchItemSerializer(data=raw_item)
+            if item_serializer.is_valid():
+                items.append({'index': index, 'errors': None, **item_serializer.validated_data})
+            else:
+                items.append({'index': index, 'errors': item_serializer.errors})
+        data['items'] = items
         return data
 
 class BookingStatusUpdateSerializer(serializers.Serializer): # Non-model serializer
     status = serializers.ChoiceField(choices=Booking.STATUS_CHOICES)
-    # Potentially add fields for cancellation reasons, etc. 
\ No newline at end of file
+    # Potentially add fields for cancellation reasons, etc.
+
+# .values() based list/retrieve output of the serializers above (bookings.fast_serializers)
+AVAILABLE_SEATS = {'available_seats': (('total_seats', 'seats_booked'), sub)} # Flight.seats_available
+PASSENGER_REPRESENTATION = ValuesRepresentation(PassengerSerializer)
+FLIGHT_REPRESENTATION = ValuesRepresentation(FlightSerializer, computed=AVAILABLE_SEATS)
+BOOKING_REPRESENTATION = ValuesRepresentation(BookingSerializer, computed=AVAILABLE_SEATS)
+
+class CalendarSearchSerializer(serializers.Serializer): # Query parameters of /flights/calendar/
+    origin = serializers.CharField()
+    destination = serializers.CharField()
+    start_date = serializers.DateField(required=False) # Default today
+    end_date = serializers.DateField(required=False) # Inclusive, default 30 days after start_date
+
+    def validate(self, data):
+        data.setdefault('start_date', timezone.localdate())
+        data.setdefault('end_date', data['start_date'] + timedelta(days=30))
+        days = (data['end_date'] - data['start_date']).days + 1
+        if days < 1:
+            raise serializers.ValidationError({"end_date": "Must not be before start_date."})
+        if days > settings.FLIGHT_CALENDAR_MAX_DAYS:
+            raise serializers.ValidationError({"end_date": f"At most {settings.FLIGHT_CALENDAR_MAX_DAYS} days per request."})
+        return data
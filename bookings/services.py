@@ -2,8 +2,30 @@ import requests
 import logging
 from django.conf import settings
 
+from .external_client import ExternalServiceError, get_async_client, get_client
+from .metrics import observe_external
+
 logger = logging.getLogger(__name__)
 
+def build_booking_request(booking):
+    """ Builds the external system's representation of a single booking. """
+    return {
+        "passengerDetails": {
+            "firstName": booking.passenger.first_name,
+            "lastName": booking.passenger.last_name,
+            "email": booking.passenger.email,
+            "dob": booking.passenger.date_of_birth.isoformat(),
+        },
+        "flightDetails": {
+            "flightNumber": booking.flight.flight_number,
+            "origin": booking.flight.origin,
+            "destination": booking.flight.destination,
+            "departure": booking.flight.departure_time.isoformat(),
+        },
+        "internalBookingRef": str(booking.id),
+    }
+
+@observe_external
 def simulate_external_booking_confirmation(booking):
     """
     Simulates calling an external booking system (like a legacy SOAP service).
@@ -23,24 +45,20 @@ def simulate_external_booking_confirmation(booking):
 
     payload = {
         # Simulate SOAP-like structure or relevant data
-        "bookingRequest": {
-            "passengerDetails": {
-                "firstName": booking.passenger.first_name,
-                "lastName": booking.passenger.last_name,
-                "email": booking.passenger.email,
-                "dob": booking.passenger.date_of_birth.isoformat(),
-            },
-            "flightDetails": {
-                "flightNumber": booking.flight.flight_number,
-                "origin": booking.flight.origin,
-                "destination": booking.flight.destination,
-                "departure": booking.flight.departure_time.isoformat(),
-            },
-            "internalBookingRef": str(booking.id),
-        }
+        "bookingRequest": build_booking_request(booking)
     }
 
-    logger.info(f"Simulating external API call for booking {booking.id} to {url}")
+    if settings.EXTERNAL_BOOKING_SERVICE_MODE == 'http':
+        # Real call through the pooled client (retries, circuit breaker, concurrency cap)
+        try:
+            success, external_ref, error_message = get_client().confirm(payload["bookingRequest"])
+        except ExternalServiceError as e:
+            logger.error("External service call FAILED for booking %s: %s", booking.id, e)
+            return False, None, str(e)
+        logger.info("External service call for booking %s finished. Success: %s", booking.id, success)
+        return success, external_ref, error_message
+
+    logger.info("Simulating external API call for booking %s to %s", booking.id, url)
 
     try:
         # In a real SOAP call,use a SOAP client library here.
@@ -51,21 +69,116 @@ def simulate_external_booking_confirmation(booking):
         if random.random() < 0.9: # 90% chance of success
             # Simulate successful response
             external_ref = f"EXT-{booking.booking_reference}-{random.randint(1000, 9999)}"
-            logger.info(f"External service simulation SUCCESS for booking {booking.id}. Ref: {external_ref}")
+            logger.info("External service simulation SUCCESS for booking %s. Ref: %s", booking.id, external_ref)
             return True, external_ref, None
         else:
             # Simulate failure response
             error_message = "Simulated external service error: Capacity exceeded."
-            logger.warning(f"External service simulation FAILED for booking {booking.id}: {error_message}")
+            logger.warning("External service simulation FAILED for booking %s: %s", booking.id, error_message)
             return False, None, error_message
 
     except requests.exceptions.RequestException as e:
         # Handle network errors, timeouts, etc.
         error_message = f"Network error contacting external service: {e}"
-        logger.error(f"External service call FAILED for booking {booking.id}: {error_message}")
+        logger.error("External service call FAILED for booking %s: %s", booking.id, error_message)
         return False, None, error_message
     except Exception as e:
         # Handle unexpected errors during simulation/call
         error_message = f"Unexpected error during external service call: {e}"
-        logger.error(f"External service call FAILED for booking {booking.id}: {error_message}")
-        return False, None, error_message 
\ No newline at end of file
+        logger.error("External service call FAILED for booking %s: %s", booking.id, error_message)
+        return False, None, error_message
+
+@observe_external
+async def async_external_booking_confirmation(booking):
+    """
+    asyncio counterpart of simulate_external_booking_confirmation for the
+    async views: in `http` mode the call goes through the event loop's
+    AsyncExternalBookingClient, so waiting on the service doesn't hold a thread.
+
+    Returns:
+        tuple: (success: bool, external_ref: str | None, error_message: str | None)
+    """
+    if settings.EXTERNAL_BOOKING_SERVICE_MODE != 'http':
+        # The simulation does no I/O, so it's safe to run on the event loop
+        # (unwrapped, this call is already being timed)
+        return simulate_external_booking_confirmation.__wrapped__(booking)
+
+    try:
+        success, external_ref, error_message = await get_async_client().confirm(build_booking_request(booking))
+    except ExternalServiceError as e:
+        logger.error("External service call FAILED for booking %s: %s", booking.id, e)
+        return False, None, str(e)
+    logger.info("External service call for booking %s finished. Success: %s", booking.id, success)
+    return success, external_ref, error_message
+
+@observe_external
+def simulate_external_batch_confirmation(bookings):
+    """
+    Simulates confirming many bookings with a single batched request to the
+    external system, as used by the bulk booking endpoint.
+
+    Args:
+        bookings (list[Booking]): Bookings with passenger and flight loaded.
+
+    Returns:
+        list[tuple]: One (success, external_ref, error_message) per booking, in order.
+    """
+    url = settings.EXTERNAL_BOOKING_SERVICE_URL
+    timeout = settings.EXTERNAL_SERVICE_TIMEOUT
+
+    payload = {
+        "batchBookingRequest": [build_booking_request(booking) for booking in bookings]
+    }
+
+    if settings.EXTERNAL_BOOKING_SERVICE_MODE == 'http':
+        try:
+            results = get_client().confirm_batch(payload["batchBookingRequest"])
+        except ExternalServiceError as e:
+            logger.error("External batch call FAILED for %s bookings: %s", len(bookings), e)
+            return [(False, None, str(e))] * len(bookings)
+        if len(results) != len(bookings):
+            error_message = f"External service returned {len(results)} results for {len(bookings)} bookings."
+            logger.error(error_message)
+            return [(False, None, error_message)] * len(bookings)
+        return results
+
+    logger.info("Simulating batched external API call for %s bookings to %s", len(bookings), url)
+
+    try:
+        import random
+        results = []
+        for booking in bookings:
+            if random.random() < 0.9: # Same 90% per-item success rate as single bookings
+                results.append((True, f"EXT-{booking.booking_reference}-{random.randint(1000, 9999)}", None))
+            else:
+                results.append((False, None, "Simulated external service error: Capacity exceeded."))
+        failures = sum(1 for success, _, _ in results if not success)
+        logger.info("External batch simulation finished: %s confirmed, %s failed.", len(bookings) - failures, failures)
+        return results
+
+    except requests.exceptions.RequestException as e:
+        error_message = f"Network error contacting external service: {e}"
+        logger.error("External batch call FAILED for %s bookings: %s", len(bookings), error_message)
+        return [(False, None, error_message)] * len(bookings)
+    except Exception as e:
+        error_message = f"Unexpected error during external service call: {e}"
+        logger.error("External batch call FAILED for %s bookings: %s", len(bookings), error_message)
+        return [(False, None, error_message)] * len(bookings)
+
+def notify_external_cancellations(events):
+    """
+    Booking event consumer (bookings.events) telling the external system
+    about cancelled bookings, one batched request per relay batch. Raises
+    ExternalServiceError on failure, so the relay sends the batch again.
+    """
+    notices = [
+        {"internalBookingRef": str(event['booking_id']), "bookingReference": event['booking_reference']}
+        for event in events if event['status'] == 'CANCELLED'
+    ]
+    if not notices:
+        return
+    if settings.EXTERNAL_BOOKING_SERVICE_MODE == 'http':
+        get_client().post({"cancellationNotice": notices})
+        logger.info("Sent %d cancellation notice(s) to the external service.", len(notices))
+    else:
+        logger.info("Simulating %d cancellation notice(s) to %s", len(notices), settings.EXTERNAL_BOOKING_SERVICE_URL)
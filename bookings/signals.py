@@ -0,0 +1,35 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .calendar import flight_bucket, refresh_route_days
+from .models import Flight
+from .response_cache import bump_flight_versions
+
+BUCKET_FIELDS = ('origin_key', 'destination_key', 'departure_time')
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+def expire_flight_responses(sender, instance, **kwargs):
+    """ Any saved or deleted flight can change search results, so expire every cached list too. """
+    # After commit, or a reader could cache the old row under the new version
+    transaction.on_commit(lambda: bump_flight_versions([instance.pk], catalog=True))
+
+@receiver(pre_save, sender=Flight)
+def remember_calendar_day(sender, instance, update_fields=None, **kwargs):
+    """ The route day an existing flight is leaving, if the save may move it. """
+    instance._previous_bucket = None
+    if instance._state.adding or (update_fields is not None and not {'origin', 'destination', 'departure_time'} & set(update_fields)):
+        return
+    row = Flight.objects.filter(pk=instance.pk).values_list(*BUCKET_FIELDS).first()
+    if row is not None:
+        instance._previous_bucket = flight_bucket(*row)
+
+@receiver(post_save, sender=Flight)
+@receiver(post_delete, sender=Flight)
+def refresh_calendar_days(sender, instance, **kwargs):
+    """ Recomputes the route calendar days the flight is on (and was on) once the change commits. """
+    buckets = {flight_bucket(*(getattr(instance, field) for field in BUCKET_FIELDS))}
+    if getattr(instance, '_previous_bucket', None):
+        buckets.add(instance._previous_bucket)
+    transaction.on_commit(lambda: refresh_route_days(buckets))
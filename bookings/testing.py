@@ -0,0 +1,36 @@
+"""
+Test database setup shared by the test runner (bookings.tests.runner) and
+the benchmark command, which both book from several threads or processes
+at once.
+"""
+import os
+import tempfile
+
+from django.db import connections
+from django.db.backends.signals import connection_created
+
+def _enable_wal(sender, connection, **kwargs):
+    if connection.vendor == 'sqlite':
+        with connection.cursor() as cursor:
+            cursor.execute('PRAGMA journal_mode=WAL')
+            cursor.execute('PRAGMA synchronous=NORMAL') # No fsync per commit, it's a throwaway database
+        # A deferred transaction that reads and then writes fails at once with "database is
+        # locked" when another process is writing, instead of waiting for the busy timeout.
+        # Take the write lock up front (Django 5.1's "transaction_mode": "IMMEDIATE").
+        connection._start_transaction_under_autocommit = lambda: connection.cursor().execute('BEGIN IMMEDIATE')
+
+def use_file_sqlite(prefix):
+    """
+    Call before creating the test databases. The default in-memory SQLite
+    test database is one shared-cache connection pool where a second
+    writer fails at once with "table is locked". A file database (in a new
+    temporary directory named after `prefix`) in WAL mode makes concurrent
+    writers wait for each other instead, and holds datasets bigger than
+    memory. Does nothing on other databases or if a test NAME is configured.
+    """
+    database = connections['default'].settings_dict
+    if database['ENGINE'] != 'django.db.backends.sqlite3' or database['TEST'].get('NAME'):
+        return
+    database['TEST']['NAME'] = os.path.join(tempfile.mkdtemp(prefix=prefix), 'test.sqlite3')
+    database['OPTIONS'].setdefault('timeout', 60)
+    connection_created.connect(_enable_wal)
@@ -0,0 +1,42 @@
+"""
+Test data for the bookings tests. Rows go through save() (unlike the
+benchmarks' bulk seeding), so route and name keys and the signals that keep
+caches and calendar summaries in step all run as in production.
+"""
+from datetime import date, timedelta
+from decimal import Decimal
+
+from django.db.models import F
+from django.utils import timezone
+
+from bookings.models import Booking, Flight, Passenger
+
+def make_flight(number=0, **fields):
+    departure = timezone.now().replace(microsecond=0) + timedelta(days=1, hours=number)
+    defaults = {
+        'flight_number': f'SF{number}', 'origin': 'Johannesburg', 'destination': 'Cape Town',
+        'departure_time': departure, 'arrival_time': departure + timedelta(hours=2),
+        'total_seats': 10, 'price': Decimal('1500.00'),
+    }
+    return Flight.objects.create(**{**defaults, **fields})
+
+def make_flights(count, **fields):
+    return [make_flight(number, **fields) for number in range(count)]
+
+def make_passenger(number=0, **fields):
+    defaults = {
+        'first_name': f'First{number}', 'last_name': f'Last{number}', 'email': f'passenger{number}@example.com',
+        'date_of_birth': date(1980, 1, 1) + timedelta(days=number),
+    }
+    return Passenger.objects.create(**{**defaults, **fields})
+
+def make_passengers(count, **fields):
+    return [make_passenger(number, **fields) for number in range(count)]
+
+def make_booking(passenger, flight, status='CONFIRMED', **fields):
+    """ A booking holding a seat, counted in the flight's seats_booked like the API would. """
+    booking = Booking.objects.create(passenger=passenger, flight=flight, status=status, **fields)
+    if status in Booking.SEAT_HOLDING_STATUSES:
+        Flight.objects.filter(pk=flight.pk).update(seats_booked=F('seats_booked') + 1)
+        flight.seats_booked += 1
+    return booking
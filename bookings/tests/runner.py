@@ -0,0 +1,23 @@
+from django.conf import settings
+from django.db import connections
+from django.test.runner import DiscoverRunner
+
+from bookings.testing import use_file_sqlite
+
+TEST_REPLICA = 'replica_1'
+
+class TestRunner(DiscoverRunner):
+    """
+    DiscoverRunner on a file SQLite database, so the concurrency tests can
+    write from several threads. Without DATABASE_REPLICA_URLS it also adds
+    TEST_REPLICA, a second connection to the same test database standing in
+    for a read replica; DATABASE_REPLICAS stays empty unless a test
+    overrides it, so only the routing tests read from it.
+    """
+
+    def setup_databases(self, **kwargs):
+        use_file_sqlite(prefix='smartfly-test-')
+        if TEST_REPLICA not in settings.DATABASES:
+            # connections reads the same dict, already filled in with the defaults for 'default'
+            settings.DATABASES[TEST_REPLICA] = {**connections['default'].settings_dict, 'TEST': {'MIRROR': 'default'}}
+        return super().setup_databases(**kwargs)
@@ -0,0 +1,79 @@
+"""
+The async booking endpoints, through the project's ASGI application as
+uvicorn runs it: every request in a thread of its own, so the data has to
+be committed (TransactionTestCase). Responses match the sync endpoints, and
+the threads share one block of booking references.
+"""
+import asyncio
+from unittest import mock
+
+import httpx
+from django.core.asgi import get_asgi_application
+from django.core.cache import cache
+from django.test import TransactionTestCase
+
+from bookings.models import Booking, ReferenceSequence
+from bookings.references import SEQUENCE_NAME, ReferenceAllocator
+from .factories import make_flight, make_passengers
+from .test_overbooking import CONFIRMED
+
+REJECTED = (False, None, 'Seat no longer available in the legacy system.')
+
+def _asgi(*requests):
+    """ Sends (method, path, json) requests concurrently to the ASGI application. Returns the responses in order. """
+    async def send():
+        transport = httpx.ASGITransport(app=get_asgi_application())
+        async with httpx.AsyncClient(transport=transport, base_url='http://testserver') as client:
+            return await asyncio.gather(*(client.request(method, path, json=data) for method, path, data in requests))
+    return asyncio.run(send())
+
+@mock.patch('bookings.confirmation.async_external_booking_confirmation', new_callable=mock.AsyncMock, return_value=CONFIRMED)
+class AsyncBookingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight(total_seats=5)
+        self.passengers = make_passengers(8)
+
+    def booking(self, passenger, **data):
+        return ('POST', '/api/async/bookings/', {'passenger_id': str(passenger.pk), 'flight_id': str(self.flight.pk), **data})
+
+    def test_books_like_the_sync_endpoint(self, confirm):
+        response, = _asgi(self.booking(self.passengers[0], seat_number='1C'))
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual((data['status'], data['seat_number'], data['external_system_ref']), ('CONFIRMED', '1C', 'EXT-TEST'))
+        self.assertEqual(data['flight']['available_seats'], 4)
+        self.assertEqual(Booking.objects.get(pk=data['id']).status, 'CONFIRMED')
+
+        duplicate, unknown = _asgi(self.booking(self.passengers[0]), ('POST', '/api/async/bookings/', {'flight_id': str(self.flight.pk)}))
+        self.assertEqual(duplicate.status_code, 400)
+        self.assertEqual(duplicate.json(), {'non_field_errors': ['Passenger already has a booking on this flight.']})
+        self.assertEqual(unknown.status_code, 400)
+        self.assertIn('passenger_id', unknown.json())
+
+    def test_concurrent_bookings_share_one_reference_block(self, confirm):
+        with mock.patch('bookings.references.allocator', ReferenceAllocator(block_size=100)):
+            responses = _asgi(*(self.booking(passenger) for passenger in self.passengers))
+
+        self.assertEqual(sorted(response.status_code for response in responses), [201] * 5 + [400] * 3)
+        for response in responses:
+            if response.status_code == 400: # Same shape as the sync endpoint, whichever check turned it away
+                self.assertEqual(response.json(), {'flight_id': ['No available seats on this flight.']})
+        references = [response.json()['booking_reference'] for response in responses if response.status_code == 201]
+        self.assertEqual(len(set(references)), 5)
+        # A block per booking would have moved the sequence by 100 each time
+        self.assertLessEqual(ReferenceSequence.objects.get(name=SEQUENCE_NAME).next_value, 200)
+
+    def test_rejected_booking_frees_its_seat(self, confirm):
+        confirm.return_value = REJECTED
+        response, = _asgi(self.booking(self.passengers[0]))
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response.json()['detail'], REJECTED[2])
+        self.assertEqual(Booking.objects.get().status, 'FAILED')
+
+        availability, = _asgi(('GET', f'/api/async/flights/{self.flight.pk}/availability/', None))
+        self.assertEqual(availability.json(), {'available_seats': 5})
+
+    def test_availability_of_an_unknown_flight(self, confirm):
+        response, = _asgi(('GET', '/api/async/flights/00000000-0000-0000-0000-000000000000/availability/', None))
+        self.assertEqual(response.status_code, 404)
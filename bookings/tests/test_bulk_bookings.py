@@ -0,0 +1,104 @@
+"""
+POST /api/bookings/bulk/: one result per item in request order, invalid
+items rejected with the errors the single booking endpoint gives without
+failing the others, and a query count that doesn't grow with the number
+of items.
+"""
+from unittest import mock
+import uuid
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from bookings.models import Booking, BookingEvent, Flight
+from .factories import make_booking, make_flight, make_passengers
+from .test_overbooking import CONFIRMED
+
+# Validation 3, seat counters 2, seat maps 2, insert 2, confirmation 3, and the savepoints around them
+BULK_QUERIES = 16
+
+def _confirm_all(bookings):
+    return [CONFIRMED] * len(bookings)
+
+@mock.patch('bookings.confirmation.simulate_external_batch_confirmation', side_effect=_confirm_all)
+class BulkBookingTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight(total_seats=60)
+        self.passengers = make_passengers(60)
+        self.client = APIClient()
+
+    def item(self, passenger, flight=None, **extra):
+        return {'passenger_id': str(self.passengers[passenger].pk), 'flight_id': str((flight or self.flight).pk), **extra}
+
+    def post(self, items):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/bookings/bulk/', {'bookings': items}, format='json')
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results']
+
+    def test_mixed_items_get_their_own_results(self, confirm):
+        full = make_flight(1, total_seats=1)
+        make_booking(self.passengers[9], full)
+        make_booking(self.passengers[8], self.flight, seat_number='1C')
+        unknown = str(uuid.uuid4())
+
+        results = self.post([
+            self.item(0, seat_number='1A'),
+            {'passenger_id': 'not-a-uuid', 'flight_id': str(self.flight.pk)},
+            {'passenger_id': unknown, 'flight_id': str(self.flight.pk)},
+            {'passenger_id': str(self.passengers[1].pk), 'flight_id': unknown},
+            self.item(1, flight=full),
+            self.item(2, auto_assign_seat=True),
+            self.item(0), # Same pair as item 0
+            self.item(8), # Already booked
+            self.item(3, seat_number='1C'), # Someone else's seat
+            self.item(4, seat_number='1A'), # Item 0's seat
+            self.item(5, seat_number='99Z'),
+        ])
+
+        self.assertEqual([result['index'] for result in results], list(range(11)))
+        self.assertEqual(
+            [result['status'] for result in results],
+            ['CONFIRMED', 'REJECTED', 'REJECTED', 'REJECTED', 'REJECTED', 'CONFIRMED', 'REJECTED', 'REJECTED', 'REJECTED', 'REJECTED', 'REJECTED'],
+        )
+        errors = {result['index']: result['errors'] for result in results if 'errors' in result}
+        self.assertEqual(errors[1], {'passenger_id': ['Must be a valid UUID.']})
+        self.assertEqual(errors[2], {'passenger_id': ['Passenger not found.']})
+        self.assertEqual(errors[3], {'flight_id': ['Flight not found.']})
+        self.assertEqual(errors[4], {'flight_id': ['No available seats on this flight.']})
+        self.assertEqual(errors[6], errors[7])
+        self.assertEqual(errors[7], {'non_field_errors': ['Passenger already has a booking on this flight.']})
+        self.assertEqual(errors[8], {'seat_number': ['This seat is already taken.']})
+        self.assertEqual(errors[9], {'seat_number': ['This seat is already taken.']})
+        self.assertIn('seat_number', errors[10])
+
+        booked = [results[0]['booking'], results[5]['booking']]
+        self.assertEqual([booking['seat_number'] for booking in booked], ['1A', '1B'])
+        self.assertEqual({booking['passenger']['id'] for booking in booked}, {str(self.passengers[0].pk), str(self.passengers[2].pk)})
+        # Only the accepted items hold seats and have bookings and events
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).seats_booked, 3)
+        self.assertEqual(Booking.objects.filter(flight=self.flight, status='CONFIRMED').count(), 3)
+        self.assertEqual(BookingEvent.objects.filter(status='PENDING').count(), 2)
+        confirm.assert_called_once()
+
+    def test_request_level_errors(self, confirm):
+        response = self.client.post('/api/bookings/bulk/', {'bookings': []}, format='json')
+        self.assertEqual(response.status_code, 400)
+        with self.settings(BULK_BOOKING_MAX_ITEMS=2):
+            response = self.client.post('/api/bookings/bulk/', {'bookings': [self.item(i) for i in range(3)]}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_query_count_does_not_grow_with_the_items(self, confirm):
+        # The first booking also creates the seat map and takes a block of references
+        self.post([self.item(0, auto_assign_seat=True)])
+        first = 1
+        for count in (5, 50):
+            items = [self.item(i, auto_assign_seat=bool(i % 2)) for i in range(first, first + count)]
+            items.append({'passenger_id': str(uuid.uuid4()), 'flight_id': str(self.flight.pk)}) # And a rejected one
+            first += count
+            with self.subTest(count=count), self.assertNumQueries(BULK_QUERIES):
+                results = self.post(items)
+            self.assertEqual(sum(result['status'] == 'CONFIRMED' for result in results), count)
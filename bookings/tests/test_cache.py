@@ -0,0 +1,149 @@
+"""
+The shared flight availability cache (bookings.cache) on LocMemCache and,
+through fakeredis, on RedisCache: write-through INCR/DECR on commit,
+single recompute on a miss, and no stale value cached when a booking
+commits while a miss is being loaded.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from unittest import mock, skipIf
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from bookings import cache as availability_cache
+from bookings.cache import (
+    CACHE_KEY_FLIGHT_AVAILABILITY, get_flight_availability, get_many_flight_availability, record_seat_changes,
+)
+from bookings.inventory import release_seats, reserve_seats
+from bookings.models import Flight
+from .factories import make_flight
+
+try:
+    import fakeredis
+    import redis
+except ImportError: # Test-only dependency
+    fakeredis = None
+
+if fakeredis is not None:
+    class FakeRedisPool(redis.ConnectionPool):
+        """ Connection pool for RedisCache (OPTIONS pool_class) talking to an in-process fakeredis server. """
+        server = fakeredis.FakeServer()
+
+        @classmethod
+        def from_url(cls, url, **kwargs):
+            return cls(connection_class=fakeredis.FakeConnection, server=cls.server)
+
+def _key(flight):
+    return CACHE_KEY_FLIGHT_AVAILABILITY.format(flight_id=flight.pk)
+
+class AvailabilityCacheTests(TestCase):
+    """ Runs on the configured cache (LocMemCache in development and CI). """
+
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight(total_seats=10)
+
+    def book(self, seats=1):
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            self.assertTrue(reserve_seats(self.flight.pk, seats))
+
+    def test_miss_loads_once_then_hits(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(get_flight_availability(self.flight.pk), 10)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_flight_availability(self.flight.pk), 10)
+
+    def test_bookings_adjust_the_cached_value_in_place(self):
+        get_flight_availability(self.flight.pk)
+        self.book(seats=2)
+        with self.assertNumQueries(0):
+            self.assertEqual(get_flight_availability(self.flight.pk), 8)
+
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            release_seats(self.flight.pk)
+        self.assertEqual(cache.get(_key(self.flight)), 9)
+
+    def test_nothing_is_cached_by_a_booking_on_a_miss(self):
+        self.book()
+        self.assertIsNone(cache.get(_key(self.flight)))
+        self.assertEqual(get_flight_availability(self.flight.pk), 9)
+
+    def test_value_loaded_before_a_booking_committed_is_not_kept(self):
+        load = availability_cache._load_flight_availability
+
+        def load_then_book(flight_id):
+            value = load(flight_id)
+            self.book() # Commits after the read, before the value is cached
+            return value
+
+        with mock.patch('bookings.cache._load_flight_availability', side_effect=load_then_book):
+            self.assertEqual(get_flight_availability(self.flight.pk), 10) # What the caller read
+        self.assertIsNone(cache.get(_key(self.flight)))
+        self.assertEqual(get_flight_availability(self.flight.pk), 9)
+
+    def test_bulk_lookup_loads_the_misses_in_one_query(self):
+        flights = [self.flight, make_flight(1, total_seats=20), make_flight(2, total_seats=20)]
+        get_flight_availability(self.flight.pk)
+        with self.assertNumQueries(1):
+            availability = get_many_flight_availability([flight.pk for flight in flights])
+        self.assertEqual(availability, {str(flight.pk): flight.total_seats for flight in flights})
+        with self.assertNumQueries(0):
+            get_many_flight_availability([flight.pk for flight in flights])
+
+    def test_bulk_lookup_drops_values_loaded_before_a_booking_committed(self):
+        set_many, booked = cache.set_many, []
+
+        def book_then_set_many(*args, **kwargs):
+            if not booked: # Booking goes through set_many itself
+                booked.append(True)
+                self.book() # Commits after the read, before the values are cached
+            return set_many(*args, **kwargs)
+
+        with mock.patch.object(cache, 'set_many', side_effect=book_then_set_many):
+            self.assertEqual(get_many_flight_availability([self.flight.pk]), {str(self.flight.pk): 10})
+        self.assertIsNone(cache.get(_key(self.flight)))
+
+    def test_one_caller_recomputes_a_miss(self):
+        loads = []
+
+        def slow_load(flight_id):
+            loads.append(flight_id)
+            time.sleep(0.1)
+            return 7
+
+        with mock.patch('bookings.cache._load_flight_availability', side_effect=slow_load):
+            with ThreadPoolExecutor(max_workers=8) as pool:
+                results = list(pool.map(lambda _: get_flight_availability(self.flight.pk), range(8)))
+        self.assertEqual(results, [7] * 8)
+        self.assertEqual(len(loads), 1)
+
+    @override_settings(FLIGHT_AVAILABILITY_CACHE_MODE='invalidate')
+    def test_invalidate_mode_deletes_on_booking(self):
+        get_flight_availability(self.flight.pk)
+        self.book()
+        self.assertIsNone(cache.get(_key(self.flight)))
+
+    def test_cache_errors_never_fail_a_booking(self):
+        get_flight_availability(self.flight.pk)
+        with mock.patch('bookings.cache._incr_if_exists', side_effect=ConnectionError):
+            self.book()
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).seats_booked, 1)
+
+@skipIf(fakeredis is None, "fakeredis is not installed")
+@override_settings(CACHES={
+    'default': {
+        'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+        'LOCATION': 'redis://fakeredis',
+        'OPTIONS': {'pool_class': FakeRedisPool if fakeredis else None},
+    },
+})
+class RedisAvailabilityCacheTests(AvailabilityCacheTests):
+    """ The same on RedisCache, where write-through runs the conditional INCR script. """
+
+    def test_write_through_keeps_the_ttl(self):
+        get_flight_availability(self.flight.pk)
+        self.book()
+        client = cache._cache.get_client()
+        self.assertGreater(client.ttl(cache.make_and_validate_key(_key(self.flight))), 0)
@@ -0,0 +1,119 @@
+"""
+Route calendar (bookings.calendar, /api/flights/calendar/): a booking or
+cancellation, once relayed, recomputes only its own route day, a moved
+flight refreshes the day it left and the day it joined, and the rebuild
+reproduces what the incremental refreshes keep up.
+"""
+from datetime import datetime, timedelta
+from decimal import Decimal
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bookings.calendar import rebuild_route_calendar, refresh_from_events
+from bookings.events import relay_events
+from bookings.models import RouteDayAvailability
+from .factories import make_flight, make_passengers
+from .test_overbooking import CONFIRMED
+
+def _at(day, hour):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour))
+
+@override_settings(BOOKING_EVENT_SETTLE_SECONDS=0)
+@mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=CONFIRMED)
+class RouteCalendarTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = timezone.localdate() + timedelta(days=7)
+        cls.next_day = cls.day + timedelta(days=1)
+        schedule = [
+            ('Cape Town', cls.day, 8, 1, '900.00'),
+            ('Cape Town', cls.day, 14, 10, '1500.00'),
+            ('Cape Town', cls.next_day, 8, 10, '1200.00'),
+            ('Durban', cls.day, 8, 10, '800.00'),
+        ]
+        cls.flights = [
+            make_flight(number, destination=destination, departure_time=_at(day, hour), arrival_time=_at(day, hour + 2), total_seats=seats, price=price)
+            for number, (destination, day, hour, seats, price) in enumerate(schedule)
+        ]
+        cls.passengers = make_passengers(2)
+        rebuild_route_calendar() # The test transaction never commits, so the signals' refreshes don't run
+
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+
+    def rows(self):
+        return {
+            (row.destination_key, row.day): (row.flights, row.available_seats, row.min_price, row.updated_at)
+            for row in RouteDayAvailability.objects.all()
+        }
+
+    def relay(self):
+        relay_events({'route_calendar': refresh_from_events})
+
+    def calendar(self, destination='Cape Town'):
+        response = self.client.get('/api/flights/calendar/', {'origin': 'Johannesburg', 'destination': destination, 'start_date': self.day.isoformat()})
+        self.assertEqual(response.status_code, 200)
+        return [(day['date'], day['flights'], day['available_seats'], day['min_price']) for day in response.json()['days']]
+
+    def test_rebuilt_calendar(self, confirm):
+        self.assertEqual(self.calendar(), [
+            (self.day.isoformat(), 2, 11, '900.00'),
+            (self.next_day.isoformat(), 1, 10, '1200.00'),
+        ])
+        self.assertEqual(self.calendar(destination='durban'), [(self.day.isoformat(), 1, 10, '800.00')])
+        self.assertEqual(self.calendar(destination='Windhoek'), [])
+
+    def test_booking_and_cancellation_refresh_only_their_day(self, confirm):
+        before = self.rows()
+        # The last seat on the cheap flight
+        response = self.client.post('/api/bookings/', {'passenger_id': str(self.passengers[0].pk), 'flight_id': str(self.flights[0].pk)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.rows(), before) # Until the relay passes the event on
+        self.relay()
+
+        after = self.rows()
+        changed = {key for key in after if after[key] != before[key]}
+        self.assertEqual(changed, {('cape town', self.day)})
+        self.assertEqual(after['cape town', self.day][:3], (2, 10, Decimal('1500.00'))) # Sold out, so the next fare
+        self.assertEqual(self.calendar()[0], (self.day.isoformat(), 2, 10, '1500.00'))
+
+        self.client.post(f"/api/bookings/{response.json()['id']}/cancel/")
+        self.relay()
+        cancelled = self.rows()
+        self.assertEqual({key for key in cancelled if cancelled[key] != after[key]}, {('cape town', self.day)})
+        self.assertEqual(self.calendar()[0], (self.day.isoformat(), 2, 11, '900.00'))
+
+    def test_moved_flight_refreshes_both_days(self, confirm):
+        before = self.rows()
+        flight = self.flights[0]
+        flight.departure_time, flight.arrival_time = _at(self.next_day, 6), _at(self.next_day, 8)
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.save()
+
+        after = self.rows()
+        self.assertEqual({key for key in after if after[key] != before[key]}, {('cape town', self.day), ('cape town', self.next_day)})
+        self.assertEqual(self.calendar(), [
+            (self.day.isoformat(), 1, 10, '1500.00'),
+            (self.next_day.isoformat(), 2, 11, '900.00'),
+        ])
+
+        # And a day left without flights disappears
+        with self.captureOnCommitCallbacks(execute=True):
+            self.flights[3].delete()
+        self.assertEqual(self.calendar(destination='Durban'), [])
+
+    def test_rebuild_matches_the_incremental_refreshes(self, confirm):
+        self.client.post('/api/bookings/', {'passenger_id': str(self.passengers[1].pk), 'flight_id': str(self.flights[2].pk)}, format='json')
+        self.relay()
+        incremental = {key: row[:3] for key, row in self.rows().items()}
+        rebuild_route_calendar()
+        self.assertEqual({key: row[:3] for key, row in self.rows().items()}, incremental)
+
+    def test_invalid_range(self, confirm):
+        response = self.client.get('/api/flights/calendar/', {'origin': 'Johannesburg', 'destination': 'Cape Town', 'start_date': self.next_day, 'end_date': self.day})
+        self.assertEqual(response.status_code, 400)
@@ -0,0 +1,68 @@
+"""
+External confirmation outside the booking transaction: in 'sync' mode after
+the commit, in 'async' mode on the background pool (bookings.confirmation)
+with clients polling /bookings/{id}/status/.
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from bookings.confirmation import record_confirmation
+from bookings.models import Booking, Flight
+from .factories import make_booking, make_flight, make_passenger
+
+CONFIRMED = (True, 'EXT-TEST', None)
+REJECTED = (False, None, 'Capacity exceeded.')
+
+class ConfirmationTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.client = APIClient()
+        self.flight = make_flight(total_seats=5)
+        self.payload = {'passenger_id': str(make_passenger().pk), 'flight_id': str(self.flight.pk)}
+
+    def test_sync_confirmation_runs_after_the_booking_committed(self):
+        def confirm(booking):
+            self.assertFalse(connection.in_atomic_block)
+            self.assertTrue(Booking.objects.filter(pk=booking.pk, status='PENDING').exists())
+            return CONFIRMED
+
+        with mock.patch('bookings.confirmation.simulate_external_booking_confirmation', side_effect=confirm):
+            response = self.client.post('/api/bookings/', self.payload, format='json')
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['status'], 'CONFIRMED')
+
+    @override_settings(BOOKING_CONFIRMATION_MODE='async')
+    def test_async_booking_is_accepted_then_confirmed_in_the_background(self):
+        with mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=CONFIRMED):
+            response = self.client.post('/api/bookings/', self.payload, format='json')
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(response.json()['status'], 'PENDING')
+            self.assertTrue(response['Location'].endswith(f"/api/bookings/{response.json()['id']}/status/"))
+
+            status = self.client.get(response['Location'], {'wait': 10}).json()
+        self.assertEqual(status['status'], 'CONFIRMED')
+        self.assertEqual(status['external_system_ref'], 'EXT-TEST')
+
+    @override_settings(BOOKING_CONFIRMATION_MODE='async')
+    def test_rejected_async_booking_fails_and_gives_its_seat_back(self):
+        with mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=REJECTED):
+            response = self.client.post('/api/bookings/', self.payload, format='json')
+            status = self.client.get(response['Location'], {'wait': 10}).json()
+        self.assertEqual(status['status'], 'FAILED')
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).seats_booked, 0)
+        self.assertEqual(self.client.get(f'/api/flights/{self.flight.pk}/availability/').json(), {'available_seats': 5})
+
+class RecordConfirmationTests(TestCase):
+    def test_result_for_a_booking_cancelled_meanwhile_is_discarded(self):
+        flight = make_flight(total_seats=5)
+        booking = make_booking(make_passenger(), flight, status='PENDING')
+        self.assertEqual(APIClient().post(f'/api/bookings/{booking.pk}/cancel/').status_code, 200)
+
+        record_confirmation(booking, *REJECTED)
+
+        self.assertEqual(booking.status, 'CANCELLED')
+        self.assertEqual(Flight.objects.get(pk=flight.pk).seats_booked, 0) # Released once, by the cancellation
@@ -0,0 +1,186 @@
+"""
+The booking event outbox (bookings.events): one event per status change,
+committed or rolled back with the change; the relay's at-least-once
+delivery and per-consumer positions; and cursor paging of
+/api/bookings/changes/.
+"""
+from io import StringIO
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient, APIRequestFactory
+
+from bookings.events import record_events, relay_events
+from bookings.models import Booking, BookingEvent, EventRelayPosition
+from bookings.views import BookingStatusView
+from .factories import make_booking, make_flight, make_passengers
+from .test_overbooking import CONFIRMED
+
+REJECTED = (False, None, 'No seat in the legacy system.')
+
+collected = [] # Filled by collect, the consumer the relay command is configured with
+
+def collect(events):
+    collected.extend(event['id'] for event in events)
+
+def _changes(booking):
+    return list(BookingEvent.objects.filter(booking_id=booking.pk).order_by('id').values_list('previous_status', 'status'))
+
+class OutboxTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight()
+        self.passengers = make_passengers(3)
+        self.client = APIClient()
+
+    def book(self, passenger=0, answer=CONFIRMED):
+        with mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=answer):
+            self.client.post('/api/bookings/', {'passenger_id': str(self.passengers[passenger].pk), 'flight_id': str(self.flight.pk)}, format='json')
+        return Booking.objects.filter(passenger=self.passengers[passenger]).order_by('created_at').last()
+
+    def set_status(self, booking, new_status):
+        request = APIRequestFactory().patch(f'/bookings/{booking.pk}/status/', {'status': new_status}, format='json')
+        return BookingStatusView.as_view()(request, pk=booking.pk) # Not routed, see bookings.urls
+
+    def test_each_transition_writes_one_event(self):
+        confirmed = self.book(0)
+        failed = self.book(1, answer=REJECTED)
+        self.client.post(f'/api/bookings/{confirmed.pk}/cancel/')
+        forced = self.book(2)
+        self.set_status(forced, 'PENDING')
+        self.set_status(forced, 'FAILED')
+
+        self.assertEqual(_changes(confirmed), [(None, 'PENDING'), ('PENDING', 'CONFIRMED'), ('CONFIRMED', 'CANCELLED')])
+        self.assertEqual(_changes(failed), [(None, 'PENDING'), ('PENDING', 'FAILED')])
+        self.assertEqual(_changes(forced), [(None, 'PENDING'), ('PENDING', 'CONFIRMED'), ('CONFIRMED', 'PENDING'), ('PENDING', 'FAILED')])
+        event = BookingEvent.objects.filter(booking_id=confirmed.pk).last()
+        self.assertEqual((event.booking_reference, event.flight_id), (confirmed.booking_reference, self.flight.pk))
+
+    def test_no_event_without_a_change(self):
+        booking = self.book()
+        events = BookingEvent.objects.count()
+        self.client.post(f'/api/bookings/{booking.pk}/cancel/')
+        self.client.post(f'/api/bookings/{booking.pk}/cancel/') # Already cancelled
+        self.set_status(booking, 'CONFIRMED') # Final
+        self.set_status(self.book(1), 'CONFIRMED') # Unchanged
+        self.assertEqual(BookingEvent.objects.count(), events + 1 + 2) # The cancel, then the second booking's two
+        self.book(1) # Turned away, the passenger is already booked
+        self.assertEqual(BookingEvent.objects.count(), events + 3)
+
+    def test_event_rolls_back_with_the_change(self):
+        booking = self.book()
+        events = BookingEvent.objects.count()
+        # Fails after the status and its event are written, in the same transaction
+        with mock.patch('bookings.views.release_seats', side_effect=RuntimeError('lost the database')):
+            with self.assertRaises(RuntimeError):
+                self.set_status(booking, 'CANCELLED')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'CONFIRMED')
+        self.assertEqual(BookingEvent.objects.count(), events)
+
+        # And the other way round: no change without its event
+        with mock.patch('bookings.views.record_events', side_effect=RuntimeError('lost the database')):
+            with self.assertRaises(RuntimeError):
+                self.client.post(f'/api/bookings/{booking.pk}/cancel/')
+        self.assertEqual(Booking.objects.get(pk=booking.pk).status, 'CONFIRMED')
+
+@override_settings(BOOKING_EVENT_SETTLE_SECONDS=0)
+class RelayTests(TestCase):
+    def setUp(self):
+        flight = make_flight()
+        self.bookings = [make_booking(passenger, flight) for passenger in make_passengers(5)]
+        record_events(self.bookings)
+        self.ids = list(BookingEvent.objects.order_by('id').values_list('id', flat=True))
+
+    def position(self, consumer):
+        return EventRelayPosition.objects.filter(consumer=consumer).values_list('last_event_id', flat=True).first()
+
+    def test_failed_consumer_gets_the_events_again(self):
+        good, flaky = [], []
+
+        def fail_once(events):
+            if not flaky:
+                flaky.append(None)
+                raise ConnectionError('broker unavailable')
+            flaky.extend(event['id'] for event in events)
+
+        consumers = {'good': lambda events: good.extend(event['id'] for event in events), 'flaky': fail_once}
+        self.assertEqual(relay_events(consumers, batch_size=3), 3)
+        self.assertEqual((good, self.position('good'), self.position('flaky')), (self.ids[:3], self.ids[2], None))
+
+        # The behind consumer retries from where it was, the other carries on
+        self.assertEqual(relay_events(consumers, batch_size=3), 3)
+        self.assertEqual(flaky[1:], self.ids[:3])
+        self.assertEqual(good, self.ids)
+        self.assertEqual((self.position('good'), self.position('flaky')), (self.ids[-1], self.ids[2]))
+
+        relay_events(consumers, batch_size=3)
+        self.assertEqual(flaky[1:], self.ids)
+        self.assertEqual(relay_events(consumers, batch_size=3), 0) # Caught up, nothing delivered twice
+        self.assertEqual(good, self.ids)
+
+    def test_position_only_moves_past_delivered_events(self):
+        with mock.patch('bookings.events.EventRelayPosition.objects.update_or_create', side_effect=RuntimeError('lost the database')):
+            with self.assertRaises(RuntimeError):
+                relay_events({'good': lambda events: None})
+        received = []
+        relay_events({'good': lambda events: received.extend(event['id'] for event in events)})
+        self.assertEqual(received, self.ids) # Delivered again, at least once
+
+    @override_settings(BOOKING_EVENT_SETTLE_SECONDS=60)
+    def test_unsettled_events_wait(self):
+        received = []
+        self.assertEqual(relay_events({'good': received.extend}), 0)
+        self.assertEqual(received, [])
+
+    @override_settings(BOOKING_EVENT_CONSUMERS={'collect': 'bookings.tests.test_events.collect'})
+    def test_relay_command_drains_the_outbox_in_batches(self):
+        collected.clear()
+        out = StringIO()
+        call_command('relay_booking_events', batch_size=2, stdout=out)
+        self.assertEqual(collected, self.ids)
+        self.assertEqual(self.position('collect'), self.ids[-1])
+        self.assertIn('Relayed 5 event(s) to 1 consumer(s)', out.getvalue())
+
+@override_settings(BOOKING_EVENT_SETTLE_SECONDS=0)
+class ChangeFeedTests(TestCase):
+    def setUp(self):
+        self.flight = make_flight()
+        self.passengers = make_passengers(6)
+        record_events([make_booking(passenger, self.flight) for passenger in self.passengers[:5]])
+        self.client = APIClient()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_cursor_pages_through_the_changes(self):
+        pages = [self.get('/api/bookings/changes/?limit=2')]
+        while pages[-1]['has_more']:
+            pages.append(self.get(pages[-1]['next']))
+
+        self.assertEqual([len(page['changes']) for page in pages], [2, 2, 1])
+        ids = [change['id'] for page in pages for change in page['changes']]
+        self.assertEqual(ids, list(BookingEvent.objects.order_by('id').values_list('id', flat=True)))
+        self.assertEqual(pages[-1]['cursor'], str(ids[-1]))
+        self.assertEqual(set(pages[0]['changes'][0]), {'id', 'booking_id', 'booking_reference', 'flight_id', 'status', 'previous_status', 'created_at'})
+
+        # Polling from the last cursor returns nothing, then only what changed since
+        last = self.get(pages[-1]['next'])
+        self.assertEqual((last['changes'], last['cursor'], last['has_more']), ([], str(ids[-1]), False))
+        booking = make_booking(self.passengers[5], self.flight, status='PENDING')
+        record_events([booking])
+        new = self.get(pages[-1]['next'])['changes']
+        self.assertEqual([(change['booking_id'], change['status']) for change in new], [(str(booking.pk), 'PENDING')])
+
+    @override_settings(BOOKING_EVENT_SETTLE_SECONDS=60)
+    def test_unsettled_changes_are_not_served_yet(self):
+        page = self.get('/api/bookings/changes/')
+        self.assertEqual((page['changes'], page['cursor'], page['has_more']), ([], '0', False))
+
+    def test_invalid_parameters(self):
+        for query in ('since=abc', 'limit=x', 'since=-1', 'limit=0'):
+            with self.subTest(query=query):
+                self.assertEqual(self.client.get(f'/api/bookings/changes/?{query}').status_code, 400)
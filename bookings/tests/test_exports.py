@@ -0,0 +1,71 @@
+"""
+Streaming exports: NDJSON and CSV rows match the bookings, and under ASGI
+the response streams through an async iterator instead of being buffered.
+"""
+import csv
+import io
+import json
+
+from asgiref.sync import async_to_sync
+from django.core.management import CommandError, call_command
+from django.test import AsyncClient, TestCase
+from rest_framework.test import APIClient
+
+from bookings.models import Booking
+from .factories import make_booking, make_flights, make_passengers
+
+async def _ajoin(chunks):
+    return b''.join([chunk async for chunk in chunks])
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.flights = make_flights(2)
+        passengers = make_passengers(5)
+        for passenger in passengers:
+            make_booking(passenger, cls.flights[0])
+        make_booking(passengers[0], cls.flights[1], status='CANCELLED')
+
+    def ndjson(self, content):
+        return [json.loads(line) for line in content.decode().splitlines()]
+
+    def test_bookings_ndjson(self):
+        response = APIClient().get('/api/bookings/export/')
+        self.assertEqual(response['Content-Type'], 'application/x-ndjson')
+        self.assertFalse(response.is_async)
+        rows = self.ndjson(b''.join(response.streaming_content))
+        self.assertEqual({row['id'] for row in rows}, {str(pk) for pk in Booking.objects.values_list('pk', flat=True)})
+
+        rows = self.ndjson(b''.join(APIClient().get('/api/bookings/export/?status=CANCELLED').streaming_content))
+        self.assertEqual([row['status'] for row in rows], ['CANCELLED'])
+
+    def test_manifest_csv(self):
+        response = APIClient().get(f'/api/flights/{self.flights[0].pk}/manifest/?output=csv')
+        self.assertIn('manifest-SF0', response['Content-Disposition'])
+        rows = list(csv.DictReader(io.StringIO(b''.join(response.streaming_content).decode())))
+        self.assertEqual(len(rows), 5)
+
+    def test_invalid_parameters(self):
+        self.assertEqual(APIClient().get('/api/bookings/export/?output=xml').status_code, 400)
+        self.assertEqual(APIClient().get('/api/bookings/export/?status=LOST').status_code, 400)
+        self.assertEqual(APIClient().get('/api/bookings/export/?date=2026-13-01').status_code, 400)
+
+    def test_export_command(self):
+        out = io.StringIO()
+        call_command('export_bookings', '--flight', str(self.flights[1].pk), stdout=out)
+        self.assertEqual([row['status'] for row in self.ndjson(out.getvalue().encode())], ['CANCELLED'])
+
+        for arguments in (['--flight', 'SF0'], ['--flight', 'nope', '--manifest'], ['--manifest'], ['--date', '01/02/2030']):
+            with self.subTest(arguments=arguments):
+                with self.assertRaises(CommandError):
+                    call_command('export_bookings', *arguments, stdout=io.StringIO())
+
+    def test_streams_asynchronously_under_asgi(self):
+        # The export's queries run back in this thread, inside the test transaction
+        get = async_to_sync(AsyncClient().get)
+        for url in ('/api/bookings/export/', f'/api/flights/{self.flights[0].pk}/manifest/'):
+            with self.subTest(url=url):
+                response = get(url)
+                self.assertTrue(response.is_async)
+                wsgi_rows = self.ndjson(b''.join(APIClient().get(url).streaming_content))
+                self.assertEqual(self.ndjson(async_to_sync(_ajoin)(response.streaming_content)), wsgi_rows)
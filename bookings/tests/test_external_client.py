@@ -0,0 +1,213 @@
+"""
+ExternalBookingClient and AsyncExternalBookingClient against the local
+stand-in service (bookings.fake_external_service): pooling, retries, the
+circuit breaker and the concurrency cap.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, datetime, timezone
+from unittest import mock
+import asyncio
+import time
+
+from django.test import SimpleTestCase, override_settings
+
+from bookings.external_client import (
+    AsyncExternalBookingClient, CircuitBreaker, CircuitOpenError, ExternalBookingClient, ExternalServiceError, reset_clients,
+)
+from bookings.fake_external_service import start_in_thread
+from bookings.models import Booking, Flight, Passenger
+from bookings.services import simulate_external_booking_confirmation
+
+def _client(url, **overrides):
+    return ExternalBookingClient.from_settings(url=url, **{'retry_backoff': 0.001, **overrides})
+
+class FakeServiceTestCase(SimpleTestCase):
+    """ Starts a stand-in service per behaviour in `services` ({name: start_in_thread kwargs}); self.<name> is its URL. """
+    services = {}
+
+    @classmethod
+    def setUpClass(cls):
+        super().setUpClass()
+        for name, behaviour in cls.services.items():
+            server, url = start_in_thread(**{'latency': 0.001, 'jitter': 0, **behaviour})
+            cls.addClassCleanup(server.server_close)
+            cls.addClassCleanup(server.shutdown)
+            setattr(cls, name, url)
+
+class ExternalBookingClientTests(FakeServiceTestCase):
+    services = {
+        'healthy': {},
+        'down': {'error_rate': 1.0},
+        'rejecting': {'reject_rate': 1.0},
+        'slow': {'latency': 0.05},
+    }
+
+    def test_confirms_over_one_kept_alive_connection(self):
+        client = _client(self.healthy)
+        self.addCleanup(client.close)
+        for _ in range(20):
+            success, external_ref, error = client.confirm({})
+            self.assertTrue(success)
+            self.assertTrue(external_ref.startswith('EXT-'))
+            self.assertIsNone(error)
+        pool = client.session.get_adapter(self.healthy).poolmanager.connection_from_url(self.healthy)
+        self.assertEqual(pool.num_connections, 1)
+        self.assertEqual(client.stats.snapshot()['count'], 20)
+
+    def test_confirms_a_batch_in_one_call(self):
+        client = _client(self.healthy)
+        self.addCleanup(client.close)
+        results = client.confirm_batch([{}, {}, {}])
+        self.assertEqual([success for success, _, _ in results], [True] * 3)
+        self.assertEqual(client.stats.count, 1)
+
+    def test_rejection_is_a_result_not_an_error(self):
+        client = _client(self.rejecting)
+        self.addCleanup(client.close)
+        success, external_ref, error = client.confirm({})
+        self.assertFalse(success)
+        self.assertIsNone(external_ref)
+        self.assertIn('Capacity exceeded', error)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_retries_transient_errors_then_gives_up(self):
+        client = _client(self.down, max_retries=2)
+        self.addCleanup(client.close)
+        with self.assertRaisesMessage(ExternalServiceError, 'HTTP 503'):
+            client.confirm({})
+        self.assertEqual(client.stats.count, 3)
+        self.assertEqual(client.stats.retries, 2)
+
+    def test_client_errors_are_not_retried(self):
+        client = _client(self.healthy, max_retries=2)
+        self.addCleanup(client.close)
+        with self.assertRaises(ExternalServiceError) as raised:
+            client.post({'unknown': True}) # The stand-in answers 400
+        self.assertFalse(raised.exception.retryable)
+        self.assertEqual(client.stats.count, 1)
+
+    def test_open_circuit_fails_fast_until_the_trial_call(self):
+        client = _client(self.down, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=0.2))
+        self.addCleanup(client.close)
+        for _ in range(2):
+            with self.assertRaises(ExternalServiceError):
+                client.confirm({})
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+
+        with self.assertRaises(CircuitOpenError):
+            client.confirm({})
+        self.assertEqual(client.stats.count, 2) # The service wasn't called
+        self.assertEqual(client.stats.rejected, 1)
+
+        time.sleep(0.25)
+        client.url = self.healthy # The service is back for the trial call
+        self.assertTrue(client.confirm({})[0])
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def _half_open(self, **overrides):
+        """ A client whose breaker has opened on self.down and whose reset timeout has passed. """
+        client = _client(self.down, max_retries=0, breaker=CircuitBreaker(failure_threshold=1, reset_timeout=0.05), **overrides)
+        self.addCleanup(client.close)
+        with self.assertRaises(ExternalServiceError):
+            client.confirm({})
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        time.sleep(0.06)
+        return client
+
+    def test_failed_trial_call_reopens_the_circuit(self):
+        client = self._half_open()
+        with self.assertRaises(ExternalServiceError) as raised:
+            client.confirm({})
+        self.assertNotIsInstance(raised.exception, CircuitOpenError) # The trial reached the service
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        with self.assertRaises(CircuitOpenError):
+            client.confirm({})
+
+    def test_rejected_trial_call_closes_the_circuit(self):
+        # A 400 or an unreadable body is an answer: the service is up
+        client = self._half_open()
+        client.url = self.healthy
+        with self.assertRaises(ExternalServiceError) as raised:
+            client.post({'unknown': True})
+        self.assertFalse(raised.exception.retryable)
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+        self.assertTrue(client.confirm({})[0])
+
+        client = self._half_open()
+        with mock.patch.object(client.session, 'post', return_value=mock.Mock(status_code=200, text='<html>', json=mock.Mock(side_effect=ValueError('no JSON')))):
+            with self.assertRaisesRegex(ExternalServiceError, 'Invalid response'):
+                client.confirm({})
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_interrupted_trial_call_lets_the_next_call_try(self):
+        client = self._half_open()
+        with mock.patch.object(client.session, 'post', side_effect=RuntimeError('interrupted')):
+            with self.assertRaises(RuntimeError):
+                client.confirm({})
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        client.url = self.healthy
+        self.assertTrue(client.confirm({})[0]) # The next call is the trial
+        self.assertEqual(client.breaker.state, CircuitBreaker.CLOSED)
+
+    def test_unexpected_errors_are_not_successes(self):
+        client = _client(self.down, max_retries=0, breaker=CircuitBreaker(failure_threshold=2, reset_timeout=30))
+        self.addCleanup(client.close)
+        with self.assertRaises(ExternalServiceError):
+            client.confirm({})
+        with mock.patch.object(client.session, 'post', side_effect=RuntimeError('interrupted')):
+            with self.assertRaises(RuntimeError):
+                client.confirm({})
+        with self.assertRaises(ExternalServiceError):
+            client.confirm({}) # Still the second consecutive failure
+        self.assertEqual(client.breaker.state, CircuitBreaker.OPEN)
+        self.assertEqual(client.stats.errors, 3)
+
+    def test_caps_calls_in_flight(self):
+        client = _client(self.slow, max_concurrency=2)
+        self.addCleanup(client.close)
+        started = time.monotonic()
+        with ThreadPoolExecutor(max_workers=8) as pool:
+            results = list(pool.map(lambda _: client.confirm({}), range(8)))
+        self.assertTrue(all(success for success, _, _ in results))
+        self.assertGreaterEqual(time.monotonic() - started, 4 * 0.05) # 8 calls, 2 at a time
+
+class AsyncExternalBookingClientTests(FakeServiceTestCase):
+    services = {'healthy': {}, 'down': {'error_rate': 1.0}}
+
+    def run_with_client(self, url, calls, **overrides):
+        async def run():
+            client = AsyncExternalBookingClient.from_settings(url=url, **{'retry_backoff': 0.001, **overrides})
+            try:
+                return client, await calls(client)
+            finally:
+                await client.aclose()
+        return asyncio.run(run())
+
+    def test_confirms_concurrently(self):
+        client, results = self.run_with_client(self.healthy, lambda client: asyncio.gather(*(client.confirm({}) for _ in range(10))))
+        self.assertEqual([success for success, _, _ in results], [True] * 10)
+        self.assertEqual(client.stats.count, 10)
+
+    def test_retries_then_raises(self):
+        async def confirm(client):
+            with self.assertRaises(ExternalServiceError):
+                await client.confirm({})
+        client, _ = self.run_with_client(self.down, confirm, max_retries=1)
+        self.assertEqual(client.stats.retries, 1)
+
+class HttpModeTests(FakeServiceTestCase):
+    services = {'healthy': {}}
+
+    def test_bookings_are_confirmed_through_the_shared_client(self):
+        departure = datetime(2030, 1, 1, 8, tzinfo=timezone.utc)
+        booking = Booking(
+            booking_reference='ABC123',
+            passenger=Passenger(first_name='Ada', last_name='Lovelace', email='ada@example.com', date_of_birth=date(1990, 1, 1)),
+            flight=Flight(flight_number='SF1', origin='JNB', destination='CPT', departure_time=departure, arrival_time=departure, price=1),
+        )
+        self.addCleanup(reset_clients)
+        with override_settings(EXTERNAL_BOOKING_SERVICE_MODE='http', EXTERNAL_BOOKING_SERVICE_URL=self.healthy):
+            reset_clients()
+            success, external_ref, error = simulate_external_booking_confirmation(booking)
+        self.assertTrue(success)
+        self.assertTrue(external_ref.startswith('EXT-'))
@@ -0,0 +1,98 @@
+"""
+The .values() read path (bookings.fast_serializers) and FastJSONRenderer
+produce byte for byte what the DRF serializers and JSONRenderer do, nested
+and computed fields included, and ?fields= narrows the output.
+"""
+from datetime import datetime, timezone as dt_timezone
+from decimal import Decimal
+import uuid
+
+from django.core.cache import cache
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.utils.translation import gettext_lazy
+from rest_framework.renderers import JSONRenderer
+from rest_framework.test import APIClient
+
+from bookings.models import Booking, Flight, Passenger
+from bookings.renderers import FastJSONRenderer
+from bookings.serializers import BookingSerializer, FlightSerializer, PassengerSerializer
+from .factories import make_booking, make_flights, make_passengers
+
+class FastReadPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        flights = make_flights(3)
+        passengers = make_passengers(3, first_name='Zoë', last_name="O'Brien-Nkosi")
+        make_booking(passengers[0], flights[0], seat_number='1A', external_system_ref='EXT-1')
+        make_booking(passengers[1], flights[0], status='PENDING')
+        make_booking(passengers[2], flights[1], status='CANCELLED')
+        Flight.objects.filter(pk=flights[2].pk).update(price=Decimal('999.90'))
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, url, fast):
+        cache.clear()
+        with override_settings(FAST_READ_SERIALIZERS=fast):
+            response = APIClient().get(url)
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def test_same_json_as_the_serializers(self):
+        for model, serializer_class, base in (
+            (Flight, FlightSerializer, '/api/flights/'),
+            (Booking, BookingSerializer, '/api/bookings/'),
+            (Passenger, PassengerSerializer, '/api/passengers/'),
+        ):
+            instance = model.objects.order_by('created_at').first()
+            for url in (base, f'{base}{instance.pk}/'):
+                with self.subTest(url=url):
+                    fast, drf = self.get(url, fast=True), self.get(url, fast=False)
+                    self.assertEqual(fast.content, drf.content)
+            # And what the serializer itself renders
+            detail = self.get(f'{base}{instance.pk}/', fast=True)
+            self.assertEqual(detail.content, JSONRenderer().render(serializer_class(instance).data))
+
+    def test_nested_and_computed_fields(self):
+        booking = Booking.objects.get(seat_number='1A')
+        data = self.get(f'/api/bookings/{booking.pk}/', fast=True).json()
+        self.assertEqual(data['passenger']['last_name'], "O'Brien-Nkosi")
+        self.assertEqual(data['flight']['available_seats'], 8) # 10 seats, a CONFIRMED and a PENDING booking
+        self.assertEqual(data['flight']['price'], '1500.00')
+        self.assertIsNone(self.get(f'/api/bookings/{Booking.objects.get(status="PENDING").pk}/', fast=True).json()['seat_number'])
+
+    def test_sparse_fieldsets(self):
+        for fast in (True, False): # ?fields= always takes the fast path
+            with self.subTest(fast=fast):
+                results = self.get('/api/bookings/?fields=id,status,seat_number', fast=fast).json()['results']
+                self.assertEqual(len(results), 3)
+                self.assertTrue(all(list(row) == ['id', 'status', 'seat_number'] for row in results))
+
+        booking = Booking.objects.get(seat_number='1A')
+        with self.assertNumQueries(1):
+            data = APIClient().get(f'/api/bookings/{booking.pk}/?fields=flight,booking_reference').json()
+        self.assertEqual(list(data), ['booking_reference', 'flight']) # In the serializer's order
+        self.assertEqual(data['flight'], self.get(f'/api/flights/{booking.flight_id}/', fast=False).json())
+
+    def test_unknown_fields_are_rejected(self):
+        response = APIClient().get('/api/bookings/?fields=id,password')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'fields': 'Unknown field(s): password.'})
+        self.assertEqual(APIClient().get('/api/bookings/?fields=passenger_id').status_code, 400) # Write-only
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_same_bytes_as_json_renderer(self):
+        data = {
+            'id': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+            'price': Decimal('1500.10'),
+            'at': datetime(2026, 10, 17, 8, 30, 0, 123456, tzinfo=dt_timezone.utc),
+            'naive': datetime(2026, 10, 17, 8, 30),
+            'label': gettext_lazy('Pending'),
+            'text': 'Zo\u00eb\u2028line\u2029end "quoted"', # JavaScript line terminators are escaped
+            'nested': [{'none': None, 'flag': True, 'count': 3}],
+        }
+        self.assertEqual(FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+    def test_indented_output_falls_back(self):
+        context = {'indent': 2}
+        self.assertEqual(FastJSONRenderer().render({'a': [1]}, renderer_context=context), JSONRenderer().render({'a': [1]}, renderer_context=context))
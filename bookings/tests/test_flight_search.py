@@ -0,0 +1,76 @@
+"""
+Flight search (/api/flights/?origin=&destination=&departure_date=): route
+matching on the normalized keys, the half-open day range, and the query
+plans, which must be served by flight_route_departure_idx.
+"""
+from datetime import datetime, timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from .factories import make_flight
+
+ROUTE_INDEX = 'flight_route_departure_idx'
+
+def _at(day, hour, minute=0, second=0):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=minute, seconds=second))
+
+class FlightSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = timezone.localdate() + timedelta(days=7)
+        flights = [
+            ('Johannesburg', 'Cape Town', _at(cls.day, 0)), # First second of the day
+            ('johannesburg ', 'CAPE  TOWN', _at(cls.day, 23, 59, 59)), # Last second, differently written
+            ('Johannesburg', 'Cape Town', _at(cls.day, 24)), # Next day
+            ('Johannesburg', 'Durban', _at(cls.day, 12)),
+            ('Cape Town', 'Johannesburg', _at(cls.day, 12)),
+        ]
+        cls.flights = [
+            make_flight(number, origin=origin, destination=destination, departure_time=departure, arrival_time=departure + timedelta(hours=2))
+            for number, (origin, destination, departure) in enumerate(flights)
+        ]
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, **params):
+        response = APIClient().get('/api/flights/', params)
+        self.assertEqual(response.status_code, 200)
+        return [flight['flight_number'] for flight in response.json()['results']]
+
+    def test_matches_the_route_whatever_the_spelling_within_the_day(self):
+        found = self.search(origin='JOHANNESBURG', destination='cape town', departure_date=self.day.isoformat())
+        self.assertEqual(found, ['SF0', 'SF1'])
+
+    def test_route_without_a_date(self):
+        self.assertEqual(self.search(origin='Johannesburg', destination='Cape Town'), ['SF0', 'SF1', 'SF2'])
+
+    def test_rejects_an_invalid_date(self):
+        response = APIClient().get('/api/flights/', {'departure_date': '2025-02-30'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'departure_date': 'Expected a valid date in YYYY-MM-DD format.'})
+
+    def test_search_queries_use_the_route_index(self):
+        for ordering in ('departure_time', '-departure_time', 'price', '-price'):
+            params = {'origin': 'Johannesburg', 'destination': 'Cape Town', 'departure_date': self.day.isoformat(), 'ordering': ordering}
+            with self.subTest(ordering=ordering), CaptureQueriesContext(connection) as queries:
+                cache.clear()
+                APIClient().get('/api/flights/', params)
+                searches = [query['sql'] for query in queries if query['sql'].startswith('SELECT') and 'bookings_flight' in query['sql']]
+                self.assertEqual(len(searches), 2) # The count and the page
+                for sql in searches:
+                    self.assertIn(ROUTE_INDEX, self.plan(sql))
+
+    def plan(self, sql):
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off') # A handful of rows would be read sequentially anyway
+                cursor.execute(f'EXPLAIN {sql}')
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return '\n'.join(str(row) for row in cursor.fetchall())
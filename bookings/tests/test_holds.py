@@ -0,0 +1,94 @@
+"""
+Seat hold expiry: a PENDING booking older than BOOKING_HOLD_TTL stops
+blocking its passenger and its seat, and once swept to EXPIRED it never
+holds a seat again, whatever answer or status change arrives later.
+"""
+from datetime import timedelta
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient, APIRequestFactory
+
+from bookings.confirmation import record_confirmation
+from bookings.holds import expire_holds
+from bookings.inventory import claim_seat, get_seat_map
+from bookings.models import Booking, BookingEvent, Flight
+from bookings.views import BookingStatusView
+from .factories import make_booking, make_flight, make_passengers
+from .test_overbooking import CONFIRMED
+
+class HoldExpiryTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight(total_seats=2)
+        self.passengers = make_passengers(3)
+
+    def make_hold(self, passenger, age=settings.BOOKING_HOLD_TTL + 60, seat=None):
+        """ A PENDING booking created `age` seconds ago, with its seat claimed if `seat` is given. """
+        if seat:
+            with transaction.atomic():
+                seat = claim_seat(self.flight.pk, seat)
+        booking = make_booking(passenger, self.flight, status='PENDING', seat_number=seat)
+        Booking.objects.filter(pk=booking.pk).update(created_at=timezone.now() - timedelta(seconds=age))
+        return booking
+
+    def status(self, booking):
+        return Booking.objects.values_list('status', flat=True).get(pk=booking.pk)
+
+    def test_sweep_expires_stale_holds_and_frees_their_seats(self):
+        stale = self.make_hold(self.passengers[0], seat='1A')
+        fresh = self.make_hold(self.passengers[1], age=60)
+
+        self.assertEqual(expire_holds(), 1)
+
+        self.assertEqual((self.status(stale), self.status(fresh)), ('EXPIRED', 'PENDING'))
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).seats_booked, 1)
+        self.assertTrue(get_seat_map(self.flight.pk).is_free(0))
+        self.assertEqual(
+            list(BookingEvent.objects.filter(booking_id=stale.pk).values_list('previous_status', 'status')),
+            [('PENDING', 'EXPIRED')],
+        )
+        self.assertEqual(expire_holds(), 0) # Nothing left to expire
+
+    @mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=CONFIRMED)
+    def test_full_flight_with_a_stale_hold_takes_a_booking(self, confirm):
+        stale = self.make_hold(self.passengers[0])
+        make_booking(self.passengers[1], self.flight)
+
+        # The stale hold's own passenger can book again too
+        response = APIClient().post('/api/bookings/', {'passenger_id': str(self.passengers[0].pk), 'flight_id': str(self.flight.pk)}, format='json')
+
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(self.status(stale), 'EXPIRED')
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).seats_booked, 2)
+
+    def test_late_confirmation_of_an_expired_hold_is_discarded(self):
+        stale = self.make_hold(self.passengers[0])
+        expire_holds()
+
+        record_confirmation(stale, *CONFIRMED)
+
+        self.assertEqual(self.status(stale), 'EXPIRED')
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).seats_booked, 0)
+
+    def test_expired_booking_status_is_final(self):
+        stale = self.make_hold(self.passengers[0], seat='1A')
+        expire_holds()
+        view = BookingStatusView.as_view() # Not routed, see bookings.urls
+
+        for new_status in ('CONFIRMED', 'PENDING', 'CANCELLED'):
+            with self.subTest(new_status=new_status):
+                request = APIRequestFactory().patch(f'/bookings/{stale.pk}/status/', {'status': new_status}, format='json')
+                response = view(request, pk=stale.pk)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.data, {'error': 'Cannot change status from EXPIRED'})
+        self.assertEqual(self.status(stale), 'EXPIRED')
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).seats_booked, 0)
+
+        response = APIClient().post(f'/api/bookings/{stale.pk}/cancel/')
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'detail': 'Cannot cancel booking with status EXPIRED.'})
@@ -0,0 +1,141 @@
+"""
+Idempotency-Key on booking creation: a retry replays the first response
+without booking again, a key can't be reused for another request, a
+concurrent duplicate waits for the first or gets 409, and client errors
+release the key.
+"""
+from unittest import mock
+import threading
+
+from asgiref.sync import async_to_sync
+from django.core.cache import cache
+from django.test import AsyncClient, TestCase, TransactionTestCase, override_settings
+from rest_framework.test import APIClient
+
+from bookings.idempotency import HEADER, REPLAYED_HEADER
+from bookings.models import Booking
+from .factories import make_flight, make_passengers
+from .test_overbooking import CONFIRMED, _in_threads
+
+KEY_VALUE = 'retry-me-1'
+KEY = {'HTTP_IDEMPOTENCY_KEY': KEY_VALUE}
+
+@mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=CONFIRMED)
+class IdempotencyKeyTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight()
+        self.passengers = make_passengers(2)
+        self.client = APIClient()
+
+    def data(self, passenger=0, **extra):
+        return {'passenger_id': str(self.passengers[passenger].pk), 'flight_id': str(self.flight.pk), **extra}
+
+    def post(self, data, url='/api/bookings/', **headers):
+        with self.captureOnCommitCallbacks(execute=True):
+            return self.client.post(url, data, format='json', **{**KEY, **headers})
+
+    def test_retry_replays_the_first_response(self, confirm):
+        first = self.post(self.data())
+        retry = self.post(self.data())
+
+        self.assertEqual((first.status_code, retry.status_code), (201, 201))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertNotIn(REPLAYED_HEADER, first)
+        self.assertEqual(Booking.objects.count(), 1)
+        self.assertEqual(confirm.call_count, 1) # The external service was called once
+
+    def test_key_is_scoped_to_the_endpoint(self, confirm):
+        self.post(self.data())
+        with mock.patch('bookings.confirmation.simulate_external_batch_confirmation', side_effect=lambda bookings: [CONFIRMED] * len(bookings)):
+            response = self.post({'bookings': [self.data(1)]}, url='/api/bookings/bulk/')
+        self.assertEqual(response.status_code, 200)
+        self.assertNotIn(REPLAYED_HEADER, response)
+        self.assertEqual(Booking.objects.count(), 2)
+
+    def test_reused_key_with_another_body_is_rejected(self, confirm):
+        self.post(self.data())
+        response = self.post(self.data(1))
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(response.json(), {'detail': f'{HEADER} was already used for a different request.'})
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_client_error_releases_the_key(self, confirm):
+        response = self.post({'flight_id': str(self.flight.pk)})
+        self.assertEqual(response.status_code, 400)
+
+        # Corrected and retried with the same key: not a 422, not a replay of the 400
+        response = self.post(self.data())
+        self.assertEqual(response.status_code, 201)
+        self.assertNotIn(REPLAYED_HEADER, response)
+
+    def test_exception_releases_the_key(self, confirm):
+        with mock.patch('bookings.views.create_pending_booking', side_effect=RuntimeError('database went away')):
+            with self.assertRaises(RuntimeError):
+                self.post(self.data())
+        self.assertEqual(self.post(self.data()).status_code, 201)
+
+    def test_malformed_key(self, confirm):
+        response = self.post(self.data(), HTTP_IDEMPOTENCY_KEY='x' * 256)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Booking.objects.count(), 0)
+
+    def test_async_endpoint_replays_too(self, confirm):
+        post = async_to_sync(AsyncClient().post) # Takes headers= rather than HTTP_* keys
+        with mock.patch('bookings.confirmation.async_external_booking_confirmation', new_callable=mock.AsyncMock, return_value=CONFIRMED):
+            first = post('/api/async/bookings/', self.data(), content_type='application/json', headers={HEADER: KEY_VALUE})
+            retry = post('/api/async/bookings/', self.data(), content_type='application/json', headers={HEADER: KEY_VALUE})
+            reused = post('/api/async/bookings/', self.data(1), content_type='application/json', headers={HEADER: KEY_VALUE})
+
+        self.assertEqual((first.status_code, retry.status_code, reused.status_code), (201, 201, 422))
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry[REPLAYED_HEADER], 'true')
+        self.assertEqual(Booking.objects.count(), 1)
+
+class ConcurrentIdempotencyKeyTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight()
+        self.passenger = make_passengers(1)[0]
+        self.confirming = threading.Event()
+        self.release = threading.Event()
+
+    def slow_confirmation(self, booking):
+        self.confirming.set()
+        self.release.wait(5)
+        return CONFIRMED
+
+    def post_twice(self, finish_after=None):
+        """
+        Two clients send the same request and key; the second arrives while the
+        first is confirming. The first finishes `finish_after` seconds later, or
+        once the second has its response.
+        """
+        data = {'passenger_id': str(self.passenger.pk), 'flight_id': str(self.flight.pk)}
+
+        def post(i):
+            if i == 1:
+                self.confirming.wait(5)
+                if finish_after is not None:
+                    threading.Timer(finish_after, self.release.set).start()
+                response = APIClient().post('/api/bookings/', data, format='json', **KEY)
+                self.release.set()
+                return response
+            return APIClient().post('/api/bookings/', data, format='json', **KEY)
+
+        with mock.patch('bookings.confirmation.simulate_external_booking_confirmation', side_effect=self.slow_confirmation):
+            return _in_threads(post, 2)
+
+    @override_settings(IDEMPOTENCY_WAIT=0.2)
+    def test_duplicate_gets_409_while_the_first_runs(self):
+        first, duplicate = self.post_twice()
+        self.assertEqual((first.status_code, duplicate.status_code), (201, 409))
+        self.assertEqual(Booking.objects.count(), 1)
+
+    def test_duplicate_waits_and_replays(self):
+        first, duplicate = self.post_twice(finish_after=0.2) # Within IDEMPOTENCY_WAIT
+        self.assertEqual((first.status_code, duplicate.status_code), (201, 201))
+        self.assertEqual(duplicate[REPLAYED_HEADER], 'true')
+        self.assertEqual(duplicate.json()['id'], first.json()['id'])
+        self.assertEqual(Booking.objects.count(), 1)
@@ -0,0 +1,114 @@
+"""
+Itinerary search (/api/itineraries/, bookings.itineraries): connections
+honour the minimum connection time and the leg limit, searches without a
+route come back empty, and the in-memory route graph follows flight
+changes, patched in place or reloaded when flights are deleted.
+"""
+from datetime import datetime, timedelta
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bookings.itineraries import Schedule, graph
+from bookings.models import Flight
+from .factories import make_booking, make_flight, make_passengers
+
+def _at(day, hour, minute=0):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()) + timedelta(hours=hour, minutes=minute))
+
+class ItinerarySearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.day = timezone.localdate() + timedelta(days=7)
+        schedule = [
+            # Johannesburg -> Durban direct, or through Cape Town with a 30 or a 60 minute connection
+            ('Johannesburg', 'Durban', 12, 12.75, '2000.00'),
+            ('Johannesburg', 'Cape Town', 8, 10, '900.00'),
+            ('Cape Town', 'Durban', 10.5, 12.5, '500.00'),
+            ('Cape Town', 'Durban', 11, 13, '700.00'),
+            # Only reachable in three legs
+            ('Durban', 'Gqeberha', 15, 16, '300.00'),
+        ]
+        cls.flights = {}
+        for number, (origin, destination, departs, lands, price) in enumerate(schedule):
+            cls.flights[number] = make_flight(
+                number, origin=origin, destination=destination, price=price,
+                departure_time=_at(cls.day, 0, departs * 60), arrival_time=_at(cls.day, 0, lands * 60),
+            )
+
+    def setUp(self):
+        cache.clear()
+        graph.discard() # Loaded by an earlier test, from rows since rolled back
+
+    def search(self, origin='Johannesburg', destination='Durban', **params):
+        response = APIClient().get('/api/itineraries/', {'origin': origin, 'destination': destination, 'departure_date': self.day.isoformat(), **params})
+        self.assertEqual(response.status_code, 200)
+        return [[leg['flight_number'] for leg in result['legs']] for result in response.json()['results']]
+
+    def change(self, flight, **fields):
+        with self.captureOnCommitCallbacks(execute=True): # Moves the catalog version
+            for name, value in fields.items():
+                setattr(flight, name, value)
+            flight.save()
+
+    def test_direct_and_connecting_itineraries(self):
+        response = APIClient().get('/api/itineraries/', {'origin': 'johannesburg', 'destination': 'DURBAN', 'departure_date': self.day.isoformat()})
+        data = response.json()
+        self.assertEqual([result['stops'] for result in data['results']], [0, 1]) # By arrival, then price
+        connection = data['results'][1]
+        self.assertEqual(connection['price'], '1600.00')
+        self.assertEqual(connection['duration_minutes'], 5 * 60)
+        self.assertEqual(self.search(sort='price'), [['SF1', 'SF3'], ['SF0']])
+
+    def test_minimum_connection_time(self):
+        self.assertEqual(self.search(), [['SF0'], ['SF1', 'SF3']]) # 45 minutes by default, the 30 minute one is too short
+        self.assertEqual(self.search(min_connection=30), [['SF1', 'SF2'], ['SF0'], ['SF1', 'SF3']])
+        self.assertEqual(self.search(min_connection=61), [['SF0']])
+        self.assertEqual(self.search(max_connection=59), [['SF0']])
+
+    def test_leg_limit(self):
+        self.assertEqual(self.search(destination='Gqeberha'), [['SF1', 'SF3', 'SF4'], ['SF0', 'SF4']]) # Same arrival, cheaper first
+        self.assertEqual(self.search(destination='Gqeberha', max_legs=2), [['SF0', 'SF4']])
+        self.assertEqual(self.search(max_legs=1), [['SF0']])
+        response = APIClient().get('/api/itineraries/', {'origin': 'Johannesburg', 'destination': 'Durban', 'departure_date': self.day.isoformat(), 'max_legs': 4})
+        self.assertEqual(response.status_code, 400)
+
+    def test_no_route(self):
+        self.assertEqual(self.search(destination='Windhoek'), [])
+        self.assertEqual(self.search(origin='Durban', destination='Johannesburg'), []) # Only flown the other way
+        self.assertEqual(self.search(origin='Gqeberha', destination='Durban'), [])
+        response = APIClient().get('/api/itineraries/', {'origin': 'Johannesburg', 'destination': 'Durban', 'departure_date': (self.day + timedelta(days=1)).isoformat()})
+        self.assertEqual(response.json(), {'count': 0, 'results': []})
+
+    def test_full_legs_are_left_out(self):
+        direct = self.flights[0]
+        Flight.objects.filter(pk=direct.pk).update(total_seats=1)
+        make_booking(make_passengers(1)[0], direct)
+        self.assertEqual(self.search(), [['SF1', 'SF3']])
+        self.assertEqual(self.search(seats=11), [])
+
+    def test_graph_follows_flight_changes(self):
+        self.assertEqual(self.search(), [['SF0'], ['SF1', 'SF3']])
+        with mock.patch.object(Schedule, 'load', wraps=Schedule.load) as load:
+            # Patched in without reloading the schedule
+            self.change(self.flights[2], departure_time=_at(self.day, 11), arrival_time=_at(self.day, 12)) # Now a 60 minute connection
+            new = make_flight(5, origin='Johannesburg', destination='Durban', departure_time=_at(self.day, 6), arrival_time=_at(self.day, 7))
+            with self.captureOnCommitCallbacks(execute=True):
+                new.save()
+            self.assertEqual(self.search(), [['SF5'], ['SF1', 'SF2'], ['SF0'], ['SF1', 'SF3']])
+            self.assertEqual(self.search(min_connection=30), [['SF5'], ['SF1', 'SF2'], ['SF0'], ['SF1', 'SF3']]) # Still nothing to refresh
+            load.assert_not_called()
+
+            # Moving a flight to another route takes it off the old one
+            self.change(self.flights[3], destination='Gqeberha')
+            self.assertEqual(self.search(), [['SF5'], ['SF1', 'SF2'], ['SF0']])
+            load.assert_not_called()
+
+            # A deleted flight can't be patched out, the schedule is reloaded
+            with self.captureOnCommitCallbacks(execute=True):
+                Flight.objects.get(pk=new.pk).delete()
+            self.assertEqual(self.search(), [['SF1', 'SF2'], ['SF0']])
+            load.assert_called_once()
@@ -0,0 +1,129 @@
+"""
+Bulk loaders (bookings.loaders, load_schedule, import_passengers): CSV and
+NDJSON rows are upserted in place, bad rows (including NDJSON lines that
+aren't objects) are reported with their line numbers without stopping the
+load, and a schedule update can't cut a flight below its booked seats.
+"""
+from io import StringIO
+import json
+import os
+import tempfile
+
+from django.core.management import CommandError, call_command
+from django.db.models import F
+from django.test import TestCase
+
+from bookings.cache import get_flight_availability
+from bookings.loaders import load_file
+from bookings.models import Flight, Passenger, RouteDayAvailability
+from .factories import make_booking, make_flight, make_passengers
+
+FLIGHT_HEADER = 'flight_number,origin,destination,departure_time,arrival_time,total_seats,price'
+
+class LoaderTests(TestCase):
+    def write(self, name, lines):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        path = os.path.join(directory.name, name)
+        with open(path, 'w', encoding='utf-8') as target:
+            target.write('\n'.join(lines) + '\n')
+        return path
+
+    def flights_csv(self, *rows):
+        return self.write('schedule.csv', [FLIGHT_HEADER, *rows])
+
+    def test_flights_are_upserted_in_place(self):
+        flight = make_flight(total_seats=10)
+        make_booking(make_passengers(1)[0], flight)
+        path = self.flights_csv(
+            'SF0,Johannesburg,Durban,2030-01-01T08:00:00+02:00,2030-01-01T09:00:00+02:00,20,999.99',
+            'SF9,Cape Town,Johannesburg,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,100,1500',
+        )
+
+        stats = load_file('flights', path)
+
+        self.assertEqual((stats['rows_loaded'], stats['rows_rejected'], stats['errors']), (2, 0, []))
+        updated = Flight.objects.get(pk=flight.pk) # Same id
+        self.assertEqual((updated.destination_key, updated.total_seats, updated.seats_booked), ('durban', 20, 1))
+        self.assertEqual(Flight.objects.get(flight_number='SF9').origin_key, 'cape town')
+
+    def test_capacity_below_booked_seats_is_refused(self):
+        flights = [make_flight(number, total_seats=10) for number in range(3)]
+        for passenger in make_passengers(3):
+            make_booking(passenger, flights[0])
+            make_booking(passenger, flights[1])
+        path = self.flights_csv(
+            'SF0,Johannesburg,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,2,1500', # 3 booked
+            'SF1,Johannesburg,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,3,1500', # Exactly full
+            'SF2,Johannesburg,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,1,1500', # Nothing booked
+        )
+
+        stats = load_file('flights', path)
+
+        self.assertEqual((stats['rows_loaded'], stats['rows_rejected']), (2, 1))
+        self.assertEqual(stats['errors'], [(2, 'total_seats 2 is below the 3 seats already booked')])
+        seats = dict(Flight.objects.values_list('flight_number', 'total_seats'))
+        self.assertEqual(seats, {'SF0': 10, 'SF1': 3, 'SF2': 1})
+        self.assertFalse(Flight.objects.filter(seats_booked__gt=F('total_seats')).exists())
+
+    def test_bad_rows_are_reported_by_line(self):
+        path = self.flights_csv(
+            'SF1,Johannesburg,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,10,1500',
+            'SF2,,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,10,1500',
+            'SF3,Johannesburg,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T07:00:00+02:00,10,1500',
+            'SF4,Johannesburg,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,ten,1500',
+            'SF5,Johannesburg,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,10,cheap',
+            'SF1,Johannesburg,Durban,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,10,1500', # Same key, the last one wins
+        )
+
+        stats = load_file('flights', path, batch_size=2)
+
+        self.assertEqual([line for line, _ in stats['errors']], [3, 4, 5, 6])
+        self.assertEqual(stats['errors'][0], (3, 'origin is required'))
+        self.assertEqual(stats['rows_rejected'], 4)
+        self.assertEqual(list(Flight.objects.values_list('flight_number', 'destination')), [('SF1', 'Durban')])
+
+    def test_ndjson_lines_that_are_not_objects(self):
+        good = {'first_name': 'Zoë', 'last_name': "O'Brien", 'email': 'zoe@example.com', 'date_of_birth': '1990-05-04'}
+        path = self.write('passengers.ndjson', [
+            json.dumps(good), '[1, 2]', '"zoe@example.com"', '', '42', 'null',
+            json.dumps({**good, 'date_of_birth': ['1990-05-04']}), json.dumps({**good, 'first_name': {'given': 'Zoë'}}),
+        ])
+
+        stats = load_file('passengers', path)
+
+        self.assertEqual(stats['rows_loaded'], 1)
+        self.assertEqual(stats['errors'][:4], [(line, 'expected a JSON object') for line in (2, 3, 5, 6)])
+        self.assertEqual([line for line, _ in stats['errors'][4:]], [7, 8])
+        passenger = Passenger.objects.get()
+        self.assertEqual((passenger.first_name_key, passenger.last_name_key), ('zoe', 'obrien'))
+
+    def test_passengers_are_upserted_by_email(self):
+        passenger = make_passengers(1)[0]
+        path = self.write('passengers.csv', [
+            'first_name,last_name,email,date_of_birth',
+            f'Thabo,Mokoena,{passenger.email},1985-01-02',
+            'Wei,Li,wei@example.com,not-a-date',
+        ])
+        stats = load_file('passengers', path)
+        self.assertEqual((stats['rows_loaded'], stats['errors']), (1, [(3, "invalid date_of_birth 'not-a-date'")]))
+        updated = Passenger.objects.get(pk=passenger.pk)
+        self.assertEqual((updated.last_name, updated.last_name_key), ('Mokoena', 'mokoena'))
+
+    def test_load_schedule_command(self):
+        path = self.flights_csv(
+            'SF0,Johannesburg,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,0,1500',
+            'SF1,Johannesburg,Cape Town,2030-01-01T08:00:00+02:00,2030-01-01T10:00:00+02:00,5,1500',
+        )
+        out, err = StringIO(), StringIO()
+        call_command('load_schedule', path, stdout=out, stderr=err)
+
+        self.assertIn('Loaded 1 flights', out.getvalue())
+        self.assertIn('rejected 1.', out.getvalue())
+        self.assertIn('Line 2: total_seats must be positive', err.getvalue())
+        # Caches rebuilt from the loaded rows
+        self.assertEqual(get_flight_availability(Flight.objects.get(flight_number='SF1').pk), 5)
+        self.assertTrue(RouteDayAvailability.objects.filter(origin_key='johannesburg', destination_key='cape town').exists())
+
+        with self.assertRaises(CommandError):
+            call_command('import_passengers', self.write('broken.ndjson', ['{"first_name": ']), stdout=out, stderr=err)
@@ -0,0 +1,127 @@
+"""
+/metrics (bookings.metrics): after a few requests the Prometheus text
+parses, histograms are cumulative and end in +Inf = count, and the
+request, SQL query, cache and external service series moved by exactly
+what the requests did. The registry lives for the whole process, so the
+tests compare scrapes taken before and after.
+"""
+from collections import defaultdict
+from unittest import mock
+import re
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from bookings.metrics import LATENCY_BUCKETS, QUERY_COUNT_BUCKETS, observe_external
+from .factories import make_flight, make_passengers
+from .test_overbooking import CONFIRMED
+
+SAMPLE = re.compile(r'^(?P<name>[a-zA-Z_:][a-zA-Z0-9_:]*)(?:\{(?P<labels>.*)\})? (?P<value>\S+)$')
+LABEL = re.compile(r'(?P<key>[a-zA-Z_][a-zA-Z0-9_]*)="(?P<value>(?:[^"\\]|\\.)*)"')
+
+def parse(text):
+    """
+    Prometheus text format -> ({(name, frozenset(labels)): value}, {family: type}).
+    Fails on any line that isn't a comment or a well-formed sample.
+    """
+    samples, types = {}, {}
+    for line in text.splitlines():
+        if line.startswith('# TYPE '):
+            _, _, family, kind = line.split(' ')
+            types[family] = kind
+            continue
+        if line.startswith('# HELP '):
+            continue
+        match = SAMPLE.match(line)
+        assert match, f'Not a sample line: {line!r}'
+        labels = frozenset((label['key'], label['value']) for label in LABEL.finditer(match['labels'] or ''))
+        samples[match['name'], labels] = float(match['value'])
+    return samples, types
+
+def _labels(**labels):
+    return frozenset(labels.items())
+
+class MetricsEndpointTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight()
+        self.passenger = make_passengers(1)[0]
+        self.client = APIClient()
+
+    def scrape(self):
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'text/plain; version=0.0.4; charset=utf-8')
+        return parse(response.content.decode())
+
+    def delta(self, before, after, name, **labels):
+        key = (name, _labels(**labels))
+        return after.get(key, 0) - before.get(key, 0)
+
+    def test_format(self):
+        self.client.get(f'/api/flights/{self.flight.pk}/')
+        samples, types = self.scrape()
+        self.assertEqual(types['smartfly_http_requests_total'], 'counter')
+        self.assertEqual(types['smartfly_http_request_duration_seconds'], 'histogram')
+        self.assertEqual(types['smartfly_db_queries_per_request'], 'histogram')
+
+        buckets = defaultdict(list)
+        for (name, labels), value in samples.items():
+            if name.endswith('_bucket'):
+                rest = frozenset(label for label in labels if label[0] != 'le')
+                buckets[name[:-len('_bucket')], rest].append((dict(labels)['le'], value))
+        self.assertTrue(buckets)
+        for (family, labels), series in buckets.items():
+            with self.subTest(family=family, labels=labels):
+                bounds = LATENCY_BUCKETS if family != 'smartfly_db_queries_per_request' else QUERY_COUNT_BUCKETS
+                self.assertEqual(sorted(le for le, _ in series), sorted([str(bound) for bound in bounds] + ['+Inf']))
+                ordered = [value for _, value in sorted(series, key=lambda item: float(item[0]))]
+                self.assertEqual(ordered, sorted(ordered)) # Cumulative
+                self.assertEqual(ordered[-1], samples[f'{family}_count', labels])
+
+    def test_request_query_and_cache_counters(self):
+        before, _ = self.scrape()
+        detail = f'/api/flights/{self.flight.pk}/'
+        # A miss starting the versions, a miss that is stored, then a hit without any SQL
+        for _ in range(3):
+            self.assertEqual(self.client.get(detail).status_code, 200)
+        self.client.get(f'/api/flights/{self.flight.pk}/availability/') # Availability cache miss
+        self.client.get(f'/api/flights/{self.flight.pk}/availability/') # and hit
+        self.client.get('/api/flights/00000000-0000-0000-0000-000000000000/')
+        after, _ = self.scrape()
+
+        view = 'flight-detail'
+        self.assertEqual(self.delta(before, after, 'smartfly_http_requests_total', view=view, method='GET', status='200'), 3)
+        self.assertEqual(self.delta(before, after, 'smartfly_http_requests_total', view=view, method='GET', status='404'), 1)
+        self.assertEqual(self.delta(before, after, 'smartfly_http_request_duration_seconds_count', view=view), 4)
+        self.assertGreater(self.delta(before, after, 'smartfly_http_request_duration_seconds_sum', view=view), 0)
+
+        # Queries per request: 0 for the hit, 1 for each miss and the 404
+        queries = {le: self.delta(before, after, 'smartfly_db_queries_per_request_bucket', view=view, le=le) for le in ('0', '1', '2', '+Inf')}
+        self.assertEqual(queries, {'0': 1, '1': 4, '2': 4, '+Inf': 4})
+        self.assertEqual(self.delta(before, after, 'smartfly_db_queries_per_request_sum', view=view), 3)
+        self.assertGreater(self.delta(before, after, 'smartfly_db_duration_seconds_total', view=view), 0)
+
+        self.assertEqual(self.delta(before, after, 'smartfly_cache_requests_total', view=view, cache='flight_response', result='miss'), 3)
+        self.assertEqual(self.delta(before, after, 'smartfly_cache_requests_total', view=view, cache='flight_response', result='hit'), 1)
+        availability = 'flight-availability'
+        self.assertEqual(self.delta(before, after, 'smartfly_cache_requests_total', view=availability, cache='availability', result='miss'), 1)
+        self.assertEqual(self.delta(before, after, 'smartfly_cache_requests_total', view=availability, cache='availability', result='hit'), 1)
+
+    def test_external_calls_are_timed_per_view(self):
+        before, _ = self.scrape()
+        timed = observe_external(lambda booking: CONFIRMED) # As the real service functions are
+        with mock.patch('bookings.confirmation.simulate_external_booking_confirmation', timed):
+            response = self.client.post('/api/bookings/', {'passenger_id': str(self.passenger.pk), 'flight_id': str(self.flight.pk)}, format='json')
+        self.assertEqual(response.status_code, 201)
+        after, _ = self.scrape()
+
+        self.assertEqual(self.delta(before, after, 'smartfly_http_requests_total', view='booking-list', method='POST', status='201'), 1)
+        self.assertEqual(self.delta(before, after, 'smartfly_external_call_duration_seconds_count', view='booking-list'), 1)
+        self.assertEqual(self.delta(before, after, 'smartfly_external_call_duration_seconds_bucket', view='booking-list', le='0.005'), 1)
+        self.assertGreater(self.delta(before, after, 'smartfly_db_queries_per_request_sum', view='booking-list'), 0)
+
+    @override_settings(METRICS_ENABLED=False)
+    def test_disabled(self):
+        self.assertEqual(self.client.get('/metrics').status_code, 404)
@@ -0,0 +1,100 @@
+"""
+The seat counter under contention: many clients booking the last seats of
+one flight at once never book more seats than it has, and
+reconcile_seat_counters repairs a drifted counter.
+"""
+from concurrent.futures import ThreadPoolExecutor
+from io import StringIO
+from threading import Barrier
+from unittest import mock
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connections
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APIClient, APIRequestFactory
+
+from bookings.inventory import reserve_seats
+from bookings.models import Booking, Flight
+from bookings.views import BookingStatusView
+from .factories import make_booking, make_flight, make_passengers
+
+CONFIRMED = (True, 'EXT-TEST', None) # simulate_external_booking_confirmation's result
+
+def _in_threads(func, count):
+    """ Runs func(i) for i in range(count) on `count` threads released together. Returns the results in order. """
+    barrier = Barrier(count)
+
+    def run(i):
+        try:
+            barrier.wait()
+            return func(i)
+        finally:
+            connections.close_all() # Each thread opened its own connection
+
+    with ThreadPoolExecutor(max_workers=count) as pool:
+        return list(pool.map(run, range(count)))
+
+@mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=CONFIRMED)
+class OverbookingTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight(total_seats=5)
+        self.passengers = make_passengers(20)
+
+    def test_concurrent_bookings_never_exceed_the_seats(self, confirm):
+        def book(i):
+            return APIClient().post(
+                '/api/bookings/', {'passenger_id': str(self.passengers[i].pk), 'flight_id': str(self.flight.pk)}, format='json',
+            )
+
+        responses = _in_threads(book, len(self.passengers))
+
+        statuses = sorted(response.status_code for response in responses)
+        self.assertEqual(statuses, [201] * 5 + [400] * 15)
+        for response in responses:
+            if response.status_code == 400:
+                # The same whether the serializer's early check or the locked UPDATE turned it away
+                self.assertEqual(response.json(), {'flight_id': ['No available seats on this flight.']})
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_booked, 5)
+        self.assertEqual(Booking.objects.filter(flight=self.flight, status__in=Booking.SEAT_HOLDING_STATUSES).count(), 5)
+        self.assertEqual(APIClient().get(f'/api/flights/{self.flight.pk}/availability/').json(), {'available_seats': 0})
+
+    def test_concurrent_reservations_take_each_seat_once(self, confirm):
+        reserved = _in_threads(lambda i: reserve_seats(self.flight.pk), 12)
+
+        self.assertEqual(reserved.count(True), 5)
+        self.assertEqual(Flight.objects.get(pk=self.flight.pk).seats_booked, 5)
+
+class BookingStatusSeatCounterTests(TestCase):
+    def update(self, booking, new_status):
+        request = APIRequestFactory().patch(f'/bookings/{booking.pk}/status/', {'status': new_status}, format='json')
+        return BookingStatusView.as_view()(request, pk=booking.pk) # Not routed, see bookings.urls
+
+    def test_only_a_move_to_a_final_status_releases_the_seat(self):
+        flight = make_flight(total_seats=5)
+        booking = make_booking(make_passengers(1)[0], flight, status='PENDING')
+
+        self.assertEqual(self.update(booking, 'CONFIRMED').status_code, 200)
+        self.assertEqual(Flight.objects.get(pk=flight.pk).seats_booked, 1)
+        self.assertEqual(self.update(booking, 'CANCELLED').status_code, 200)
+        self.assertEqual(Flight.objects.get(pk=flight.pk).seats_booked, 0)
+        self.assertEqual(self.update(booking, 'CONFIRMED').status_code, 400) # No way back to holding a seat
+        self.assertEqual(Flight.objects.get(pk=flight.pk).seats_booked, 0)
+
+class ReconcileSeatCountersTests(TestCase):
+    def test_fixes_drifted_counters(self):
+        flight = make_flight(total_seats=5)
+        for passenger in make_passengers(3):
+            make_booking(passenger, flight)
+        Flight.objects.filter(pk=flight.pk).update(seats_booked=0)
+
+        out = StringIO()
+        call_command('reconcile_seat_counters', '--dry-run', stdout=out)
+        self.assertIn('SF0: seats_booked=0, bookings=3', out.getvalue())
+        self.assertEqual(Flight.objects.get(pk=flight.pk).seats_booked, 0)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            call_command('reconcile_seat_counters', stdout=StringIO())
+        self.assertEqual(Flight.objects.get(pk=flight.pk).seats_booked, 3)
@@ -0,0 +1,124 @@
+"""
+KeysetPagination on /api/bookings/ and /api/flights/: following next and
+previous links walks every row once in (key, id) order even while rows are
+inserted, ?count=false skips the COUNT query, and pages are read through
+the (created_at, id) index.
+"""
+from datetime import timedelta
+
+from django.core.cache import cache
+from django.db import connection
+from django.test import TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.test import APIClient
+
+from bookings.models import Booking
+from .factories import make_booking, make_flight, make_passengers
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.flight = make_flight(total_seats=50)
+        cls.passengers = make_passengers(12)
+        now = timezone.now()
+        for i, passenger in enumerate(cls.passengers[:7]):
+            booking = make_booking(passenger, cls.flight)
+            # Pairs share a created_at, so the id has to break the ties
+            Booking.objects.filter(pk=booking.pk).update(created_at=now - timedelta(minutes=i // 2))
+        cls.expected = [str(pk) for pk in Booking.objects.order_by('-created_at', '-pk').values_list('pk', flat=True)]
+
+    def setUp(self):
+        self.client = APIClient()
+
+    def get(self, url):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def ids(self, page):
+        return [row['id'] for row in page['results']]
+
+    def walk(self, url, between_pages=None):
+        """ The pages found by following next links from url. """
+        pages = [self.get(url)]
+        while pages[-1]['next']:
+            if between_pages:
+                between_pages(len(pages))
+            pages.append(self.get(pages[-1]['next']))
+        return pages
+
+    def test_next_links_walk_every_row_once(self):
+        pages = self.walk('/api/bookings/?page_size=3')
+        self.assertEqual([len(page['results']) for page in pages], [3, 3, 1])
+        self.assertEqual(sum((self.ids(page) for page in pages), []), self.expected)
+        self.assertTrue(all(page['count'] == 7 for page in pages))
+        self.assertIsNone(pages[0]['previous'])
+
+    def test_inserts_between_pages_neither_shift_nor_repeat_rows(self):
+        newer = iter(self.passengers[7:])
+        oldest = timezone.now() - timedelta(days=1)
+
+        def insert(_):
+            make_booking(next(newer), self.flight) # At the front, already paged past
+            booking = make_booking(next(newer), self.flight)
+            Booking.objects.filter(pk=booking.pk).update(created_at=oldest) # Still ahead, at the end
+
+        pages = self.walk('/api/bookings/?page_size=3', between_pages=insert)
+        ids = sum((self.ids(page) for page in pages), [])
+        self.assertEqual(len(ids), len(set(ids)))
+        # The original rows in their original order, then the older inserts
+        self.assertEqual(ids[:7], self.expected)
+        self.assertEqual(set(ids[7:]), {str(pk) for pk in Booking.objects.filter(created_at=oldest).values_list('pk', flat=True)})
+
+    def test_previous_links_walk_back(self):
+        pages = self.walk('/api/bookings/?page_size=3')
+        back = [pages[-1]]
+        while back[-1]['previous']:
+            back.append(self.get(back[-1]['previous']))
+        self.assertEqual([self.ids(page) for page in reversed(back)], [self.ids(page) for page in pages])
+        # The first page reached backwards has a next link and no previous one
+        self.assertIsNotNone(back[-1]['next'])
+        self.assertEqual(self.ids(self.get(back[-1]['next'])), self.ids(pages[1]))
+
+    def test_count_false_skips_the_count(self):
+        with self.assertNumQueries(2):
+            self.assertEqual(self.get('/api/bookings/?page_size=3')['count'], 7)
+        with self.assertNumQueries(1):
+            page = self.get('/api/bookings/?page_size=3&count=false')
+        self.assertNotIn('count', page)
+        self.assertIn('count=false', page['next']) # Kept by the links
+        self.assertNotIn('count', self.get(page['next']))
+
+    def test_invalid_cursor(self):
+        for cursor in ('not-base64!', 'eyJrIjoxfQ==', 'eyJrIjoibm90IGEgZGF0ZSIsInAiOiJ4In0='):
+            with self.subTest(cursor=cursor):
+                self.assertEqual(self.client.get(f'/api/bookings/?cursor={cursor}').status_code, 404)
+
+    def test_pages_use_the_keyset_index(self):
+        second = self.get('/api/bookings/?page_size=3')['next']
+        with CaptureQueriesContext(connection) as queries:
+            self.get(second)
+        page_sql = [query['sql'] for query in queries if 'LIMIT' in query['sql']]
+        self.assertEqual(len(page_sql), 1)
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SET LOCAL enable_seqscan = off')
+                cursor.execute(f'EXPLAIN {page_sql[0]}')
+            else:
+                cursor.execute(f'EXPLAIN QUERY PLAN {page_sql[0]}')
+            plan = '\n'.join(str(row) for row in cursor.fetchall())
+        index = next(index.name for index in Booking._meta.indexes if index.fields == ['created_at', 'id'])
+        self.assertIn(index, plan)
+        self.assertNotIn('TEMP B-TREE', plan) # No sort step
+
+    def test_flights_page_on_their_ordering_with_ties(self):
+        cache.clear()
+        flights = [self.flight] + [make_flight(number) for number in range(1, 5)]
+        # Equal prices, so the id decides within them
+        for flight in flights[:3]:
+            flight.price = 100
+            flight.save()
+        expected = [str(flight.pk) for flight in sorted(flights, key=lambda flight: (flight.price, flight.pk))]
+        pages = self.walk('/api/flights/?ordering=price&page_size=2')
+        self.assertEqual(sum((self.ids(page) for page in pages), []), expected)
@@ -0,0 +1,134 @@
+"""
+Passenger lookup (bookings.passenger_search): names match on their
+normalized keys whatever the accents, case, apostrophes and spacing, as
+last name prefixes or split into last and first name, through the name
+index; match_passengers() finds the existing passengers of a batch of
+records in one query, once each, email matches first.
+"""
+from datetime import date
+
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from bookings.models import Passenger
+from bookings.passenger_search import match_passengers, search_passengers
+from bookings.search import name_key
+from .factories import make_passenger
+
+NAME_INDEX = 'passenger_name_dob_idx'
+
+class NameKeyTests(SimpleTestCase):
+    def test_normalization(self):
+        for name, key in (
+            ("  Zoë O'Brien-Smith ", 'zoe obrien smith'),
+            ('ZOE  O’BRIEN smith', 'zoe obrien smith'),
+            ('Ångström', 'angstrom'),
+            ('Straße', 'strasse'), # Case folding, not just lower()
+            ('van der\tMerwe', 'van der merwe'),
+            ('Nkosi_Dlamini', 'nkosi dlamini'),
+            ('.-', ''),
+        ):
+            with self.subTest(name=name):
+                self.assertEqual(name_key(name), key)
+
+class PassengerSearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        names = [
+            ('Zoë', "O'Brien-Smith"),
+            ('John', 'Smith'),
+            ('Joanna', 'Smithers'),
+            ('Wei', 'Li'),
+            ('Liam', 'Lindiwe'),
+            ('José', 'Ngcobo'),
+        ]
+        cls.passengers = {last: make_passenger(number, first_name=first, last_name=last) for number, (first, last) in enumerate(names)}
+
+    def search(self, q, **params):
+        response = APIClient().get('/api/passengers/search/', {'q': q, **params})
+        self.assertEqual(response.status_code, 200)
+        return [f"{row['first_name']} {row['last_name']}" for row in response.json()['results']]
+
+    def test_accents_case_apostrophes_and_spacing(self):
+        for q in ("zoe obrien", "ZOË  O'BRIEN", "o’brien-smith zoe", '  Obrien Smith   '):
+            with self.subTest(q=q):
+                self.assertEqual(self.search(q), ["Zoë O'Brien-Smith"])
+        self.assertEqual(self.search('jose'), []) # A first name alone isn't a last name prefix
+        self.assertEqual(self.search('ngcobo JOSE'), ['José Ngcobo'])
+
+    def test_prefixes_and_word_order(self):
+        self.assertEqual(self.search('smi'), ['John Smith', 'Joanna Smithers']) # Name order
+        self.assertEqual(self.search('smith jo'), ['John Smith', 'Joanna Smithers'])
+        self.assertEqual(self.search('joa smith'), ['Joanna Smithers'])
+        self.assertEqual(self.search('li wei'), ['Wei Li']) # A short last name matches whole
+        self.assertEqual(self.search('li'), ['Wei Li', 'Liam Lindiwe'])
+
+    def test_email_and_date_of_birth(self):
+        smith = self.passengers['Smith']
+        self.assertEqual(self.search(f' {smith.email} '), ['John Smith'])
+        self.assertEqual(self.search('smi', date_of_birth=smith.date_of_birth.isoformat()), ['John Smith'])
+        self.assertEqual(self.search('!!!'), [])
+        self.assertEqual(APIClient().get('/api/passengers/search/', {'q': ''}).status_code, 400)
+
+    def test_keys_follow_name_changes(self):
+        passenger = self.passengers['Ngcobo']
+        passenger.last_name = 'Ndlovu'
+        passenger.save(update_fields=['last_name'])
+        self.assertEqual(Passenger.objects.get(pk=passenger.pk).last_name_key, 'ndlovu')
+        self.assertEqual(self.search('ndlovu'), ['José Ndlovu'])
+
+    def test_searches_use_the_name_index(self):
+        for q in ('smi', 'smith jo', 'li wei'):
+            with self.subTest(q=q):
+                with CaptureQueriesContext(connection) as queries:
+                    list(search_passengers(q)[:20])
+                with connection.cursor() as cursor:
+                    if connection.vendor == 'postgresql':
+                        cursor.execute('SET LOCAL enable_seqscan = off')
+                        cursor.execute(f"EXPLAIN {queries[0]['sql']}")
+                    else:
+                        cursor.execute(f"EXPLAIN QUERY PLAN {queries[0]['sql']}")
+                    plan = '\n'.join(str(row) for row in cursor.fetchall())
+                self.assertIn(NAME_INDEX, plan)
+
+class PassengerMatchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.zoe = make_passenger(1, first_name='Zoë', last_name="O'Brien", date_of_birth=date(1990, 5, 4))
+        cls.namesake = make_passenger(2, first_name='Zoe', last_name='OBrien', date_of_birth=date(1990, 5, 4))
+        cls.other = make_passenger(3, first_name='Thabo', last_name='Mokoena', date_of_birth=date(1985, 1, 2))
+
+    def ids(self, matches):
+        return [(match['id'], match['match']) for match in matches]
+
+    def test_matches_by_email_and_normalized_name(self):
+        records = [
+            # Both namesakes; the one with the email once, as an email match, first
+            {'first_name': 'ZOE', 'last_name': "o'brien ", 'date_of_birth': date(1990, 5, 4), 'email': self.namesake.email},
+            # Name and date of birth only
+            {'first_name': 'zoë', 'last_name': 'O’Brien', 'date_of_birth': date(1990, 5, 4)},
+            # Same name, another date of birth: only the email matches
+            {'first_name': 'Zoe', 'last_name': 'OBrien', 'date_of_birth': date(1991, 5, 4), 'email': self.other.email},
+            {'first_name': 'Nobody', 'last_name': 'Known', 'date_of_birth': date(2000, 1, 1), 'email': 'nobody@example.com'},
+        ]
+        with self.assertNumQueries(1):
+            results = match_passengers(records)
+
+        self.assertEqual(self.ids(results[0]), [(self.namesake.pk, 'email'), (self.zoe.pk, 'name_dob')])
+        self.assertEqual(sorted(self.ids(results[1])), sorted([(self.zoe.pk, 'name_dob'), (self.namesake.pk, 'name_dob')]))
+        self.assertEqual(self.ids(results[2]), [(self.other.pk, 'email')])
+        self.assertEqual(results[3], [])
+        self.assertEqual(set(results[2][0]), {'id', 'first_name', 'last_name', 'email', 'date_of_birth', 'match'})
+        self.assertEqual(match_passengers([]), [])
+
+    def test_match_endpoint(self):
+        response = APIClient().post('/api/passengers/match/', {'passengers': [
+            {'first_name': 'Thabo', 'last_name': 'MOKOENA', 'date_of_birth': '1985-01-02'},
+            {'first_name': 'No', 'last_name': 'Birthday'},
+        ]}, format='json')
+        self.assertEqual(response.status_code, 200)
+        first, second = response.json()['results']
+        self.assertEqual((first['index'], [match['id'] for match in first['matches']]), (0, [str(self.other.pk)]))
+        self.assertEqual((second['index'], list(second['errors'])), (1, ['date_of_birth']))
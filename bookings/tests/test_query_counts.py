@@ -0,0 +1,133 @@
+"""
+Query-count regressions for the list and detail endpoints: a page costs the
+same number of queries whatever its size, with both the .values() read path
+and the DRF serializers (FAST_READ_SERIALIZERS). Creating a booking
+validates with one query and serializes the response without any.
+"""
+from unittest import mock
+import uuid
+
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from rest_framework.test import APIClient
+
+from bookings.models import Booking
+from .factories import make_booking, make_flight, make_flights, make_passengers
+
+READ_PATHS = (True, False) # FAST_READ_SERIALIZERS
+
+class ListQueryCountTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.flights = make_flights(100)
+        passengers = make_passengers(3)
+        for number, flight in enumerate(cls.flights):
+            for passenger in passengers[:number % 4]: # 0 to 3 seats taken
+                make_booking(passenger, flight)
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear() # Flight responses are cached, measure the uncached path
+
+    def get(self, url, queries):
+        with self.assertNumQueries(queries):
+            response = self.client.get(url)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_flight_list_page_costs_a_count_and_one_select(self):
+        for fast in READ_PATHS:
+            for page_size in (10, 100):
+                with self.subTest(fast=fast, page_size=page_size), override_settings(FAST_READ_SERIALIZERS=fast):
+                    cache.clear()
+                    results = self.get(f'/api/flights/?page_size={page_size}', queries=2)['results']
+                    self.assertEqual(len(results), page_size)
+                    expected = {str(flight.pk): flight.total_seats - flight.seats_booked for flight in self.flights}
+                    for flight in results:
+                        self.assertEqual(flight['available_seats'], expected[flight['id']])
+
+    def test_flight_detail_is_one_select(self):
+        flight = self.flights[3]
+        for fast in READ_PATHS:
+            with self.subTest(fast=fast), override_settings(FAST_READ_SERIALIZERS=fast):
+                cache.clear()
+                self.assertEqual(self.get(f'/api/flights/{flight.pk}/', queries=1)['available_seats'], 7)
+
+    def test_booking_list_page_costs_a_count_and_one_select(self):
+        for fast in READ_PATHS:
+            for page_size in (10, 100):
+                with self.subTest(fast=fast, page_size=page_size), override_settings(FAST_READ_SERIALIZERS=fast):
+                    results = self.get(f'/api/bookings/?page_size={page_size}', queries=2)['results']
+                    self.assertEqual(len(results), page_size)
+                    self.assertIn('available_seats', results[0]['flight'])
+                    self.assertIn('email', results[0]['passenger'])
+
+    def test_booking_detail_is_one_select(self):
+        booking = self.flights[3].bookings.first()
+        for fast in READ_PATHS:
+            with self.subTest(fast=fast), override_settings(FAST_READ_SERIALIZERS=fast):
+                data = self.get(f'/api/bookings/{booking.pk}/', queries=1)
+                self.assertEqual(data['booking_reference'], booking.booking_reference)
+                self.assertEqual(data['flight']['available_seats'], 7)
+
+    def test_passenger_list_page_costs_a_count_and_one_select(self):
+        for fast in READ_PATHS:
+            with self.subTest(fast=fast), override_settings(FAST_READ_SERIALIZERS=fast):
+                self.assertEqual(len(self.get('/api/passengers/?page_size=100', queries=2)['results']), 3)
+
+class CreateBookingQueryCountTests(TestCase):
+    # The test transaction turns each atomic block into a SAVEPOINT/RELEASE pair
+    # (2 queries): one for the booking, one for recording the confirmation.
+    SAVEPOINTS = 4
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.flight = make_flight()
+        cls.passengers = make_passengers(4)
+
+    def setUp(self):
+        self.client = APIClient()
+        cache.clear()
+        # Started here rather than as a class decorator, which wouldn't cover setUp's booking
+        confirm = mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=(True, 'EXT-TEST', None))
+        confirm.start()
+        self.addCleanup(confirm.stop)
+        # Draws the process's first block of booking references and creates the flight's seat map
+        self.post(self.passengers[0], auto_assign_seat=True)
+
+    def post(self, passenger, queries=None, **data):
+        data = {'passenger_id': str(passenger.pk), 'flight_id': str(self.flight.pk), **data}
+        with self.captureOnCommitCallbacks(execute=True):
+            if queries is None:
+                return self.client.post('/api/bookings/', data, format='json')
+            with self.assertNumQueries(queries + self.SAVEPOINTS):
+                return self.client.post('/api/bookings/', data, format='json')
+
+    def test_successful_post(self):
+        # Validation SELECT, seat counter UPDATE, booking and event INSERTs,
+        # confirmation UPDATE and its event INSERT
+        response = self.post(self.passengers[1], queries=6)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['status'], 'CONFIRMED')
+        self.assertEqual(data['passenger']['id'], str(self.passengers[1].pk))
+        self.assertEqual(data['flight']['available_seats'], 8)
+
+    def test_successful_post_with_a_seat(self):
+        # Plus the locked seat map read and its UPDATE
+        response = self.post(self.passengers[1], queries=8, seat_number='2B')
+        self.assertEqual(response.json()['seat_number'], '2B')
+        response = self.post(self.passengers[2], queries=8, auto_assign_seat=True)
+        self.assertEqual(response.json()['seat_number'], '1B')
+
+    def test_rejections_cost_one_query(self):
+        def rejected(passenger_id, error):
+            data = {'passenger_id': str(passenger_id), 'flight_id': str(self.flight.pk)}
+            with self.assertNumQueries(1):
+                response = self.client.post('/api/bookings/', data, format='json')
+            self.assertEqual(response.status_code, 400)
+            self.assertEqual(response.json(), error)
+
+        rejected(self.passengers[0].pk, {'non_field_errors': ['Passenger already has a booking on this flight.']})
+        rejected(uuid.uuid4(), {'passenger_id': ['Passenger not found.']})
+        self.assertEqual(Booking.objects.count(), 1)
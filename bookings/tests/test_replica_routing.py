@@ -0,0 +1,103 @@
+"""
+Read replica routing, with a second connection to the test database standing
+in for the replica (bookings.tests.runner): safe requests read from it,
+writes and transactions stay on the primary, and a client that wrote reads
+its own bookings from the primary for the sticky window.
+"""
+import time
+from unittest import mock
+
+from asgiref.sync import async_to_sync
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+from django.test import AsyncClient, TransactionTestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APIClient
+
+from bookings import db_router
+from bookings.models import Flight
+from .factories import make_flight, make_passenger
+from .runner import TEST_REPLICA
+from .test_overbooking import CONFIRMED
+
+@override_settings(DATABASE_REPLICAS=[TEST_REPLICA])
+class ReplicaRoutingTests(TransactionTestCase):
+    databases = {DEFAULT_DB_ALIAS, TEST_REPLICA}
+
+    def setUp(self):
+        cache.clear() # Cached flight responses would skip the database altogether
+        self.flight = make_flight()
+        self.passenger = make_passenger()
+        self.client = APIClient() # After override_settings, so the routing middleware is loaded
+
+    def queries(self, request):
+        """ Runs request() and returns (response, queries on the primary, queries on the replica). """
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as primary, CaptureQueriesContext(connections[TEST_REPLICA]) as replica:
+            response = request()
+        return response, len(primary), len(replica)
+
+    def book(self):
+        with mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=CONFIRMED):
+            return self.client.post('/api/bookings/', {'passenger_id': str(self.passenger.pk), 'flight_id': str(self.flight.pk)}, format='json')
+
+    def test_reads_go_to_the_replica(self):
+        for url in ('/api/flights/', f'/api/flights/{self.flight.pk}/', f'/api/flights/{self.flight.pk}/availability/'):
+            with self.subTest(url=url):
+                cache.clear()
+                response, primary, replica = self.queries(lambda: self.client.get(url))
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(primary, 0)
+                self.assertGreater(replica, 0)
+                self.assertNotIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_writes_stay_on_the_primary_and_pin_the_client(self):
+        response, primary, replica = self.queries(self.book)
+        self.assertEqual(response.status_code, 201)
+        self.assertGreater(primary, 0)
+        self.assertEqual(replica, 0) # Including the validation reads
+        self.assertTrue(db_router.is_sticky(response.cookies[settings.REPLICA_STICKY_COOKIE].value))
+
+        # Within the sticky window the client's reads come from the primary
+        booking_id = response.json()['id']
+        response, primary, replica = self.queries(lambda: self.client.get(f'/api/bookings/{booking_id}/'))
+        self.assertEqual(response.json()['status'], 'CONFIRMED')
+        self.assertEqual((replica, primary > 0), (0, True))
+
+        # Other clients, and this one once the window has passed, read from the replica again
+        response, primary, replica = self.queries(lambda: APIClient().get(f'/api/bookings/{booking_id}/'))
+        self.assertEqual((primary, replica > 0), (0, True))
+        self.client.cookies[settings.REPLICA_STICKY_COOKIE] = db_router.sticky_until(time.time() - settings.REPLICA_STICKY_SECONDS - 1)
+        response, primary, replica = self.queries(lambda: self.client.get(f'/api/bookings/{booking_id}/'))
+        self.assertEqual((primary, replica > 0), (0, True))
+
+    def test_failed_writes_pin_the_client_too(self):
+        response = self.client.post('/api/bookings/', {'passenger_id': str(self.passenger.pk)}, format='json')
+        self.assertEqual(response.status_code, 400)
+        self.assertIn(settings.REPLICA_STICKY_COOKIE, response.cookies)
+
+    def test_reads_inside_a_transaction_use_the_primary(self):
+        token = db_router.use_replica()
+        try:
+            self.assertEqual(Flight.objects.all().db, TEST_REPLICA)
+            self.assertTrue(db_router.reading_from_replica())
+            with transaction.atomic():
+                self.assertEqual(Flight.objects.all().db, DEFAULT_DB_ALIAS)
+                self.assertFalse(db_router.reading_from_replica())
+        finally:
+            db_router.reset_replica(token)
+        self.assertEqual(Flight.objects.all().db, DEFAULT_DB_ALIAS) # Outside a request
+
+    def test_async_reads_go_to_the_replica(self):
+        # The view's ORM calls run back in this thread, on the connections being captured
+        get = async_to_sync(AsyncClient().get)
+        response, primary, replica = self.queries(lambda: get(f'/api/async/flights/{self.flight.pk}/availability/'))
+        self.assertEqual(response.json(), {'available_seats': 10})
+        self.assertEqual((primary, replica > 0), (0, True))
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_no_replicas(self):
+        client = APIClient()
+        response, primary, replica = self.queries(lambda: client.get(f'/api/flights/{self.flight.pk}/'))
+        self.assertEqual((primary > 0, replica), (True, 0))
+        self.assertIsNone(db_router.use_replica())
@@ -0,0 +1,103 @@
+"""
+The flight response cache (bookings.response_cache): a current ETag gets a
+304 without touching the database, and a committed booking or flight edit
+moves the version tokens, so the old ETag stops matching and the response
+is rebuilt with the new data.
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TestCase
+from rest_framework.test import APIClient
+
+from bookings.models import Flight
+from bookings.response_cache import CACHE_KEY_FLIGHT_CATALOG_VERSION, CACHE_KEY_FLIGHT_VERSION
+from .factories import make_flights, make_passengers
+from .test_overbooking import CONFIRMED
+
+@mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=CONFIRMED)
+class ResponseCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.flights = make_flights(2)
+        self.passenger = make_passengers(1)[0]
+        self.client = APIClient()
+        self.detail = f'/api/flights/{self.flights[0].pk}/'
+
+    def version(self, flight=None):
+        key = CACHE_KEY_FLIGHT_VERSION.format(flight_id=flight.pk) if flight else CACHE_KEY_FLIGHT_CATALOG_VERSION
+        return cache.get(key)
+
+    def warm(self, url):
+        """ Requests url until its response is cached (the first response starts the versions, so isn't kept). """
+        self.client.get(url)
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(url)['ETag'], response['ETag'])
+        return response
+
+    def book(self, flight):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post('/api/bookings/', {'passenger_id': str(self.passenger.pk), 'flight_id': str(flight.pk)}, format='json')
+        self.assertEqual(response.status_code, 201)
+
+    def test_current_etag_gets_a_304(self, confirm):
+        for url in (self.detail, '/api/flights/'):
+            with self.subTest(url=url):
+                response = self.warm(url)
+                with self.assertNumQueries(0):
+                    not_modified = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+                self.assertEqual(not_modified.status_code, 304)
+                self.assertEqual(not_modified.content, b'')
+                self.assertEqual(not_modified['ETag'], response['ETag'])
+                self.assertEqual(self.client.get(url, HTTP_IF_NONE_MATCH='"something-else"').status_code, 200)
+
+    def test_booking_moves_the_flight_version(self, confirm):
+        response = self.warm(self.detail)
+        version = self.version(self.flights[0])
+
+        self.book(self.flights[0])
+
+        self.assertGreater(self.version(self.flights[0]), version)
+        rebuilt = self.client.get(self.detail, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(rebuilt.status_code, 200)
+        self.assertNotEqual(rebuilt['ETag'], response['ETag'])
+        self.assertEqual((response.json()['available_seats'], rebuilt.json()['available_seats']), (10, 9))
+
+    def test_booking_only_expires_responses_showing_the_flight(self, confirm):
+        other = f'/api/flights/{self.flights[1].pk}/'
+        responses = {url: self.warm(url) for url in (self.detail, other, '/api/flights/')}
+        catalog = self.version()
+
+        self.book(self.flights[0])
+
+        self.assertEqual(self.version(), catalog)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.client.get(other, HTTP_IF_NONE_MATCH=responses[other]['ETag']).status_code, 304)
+        # The list shows the booked flight too
+        rebuilt = self.client.get('/api/flights/', HTTP_IF_NONE_MATCH=responses['/api/flights/']['ETag'])
+        self.assertEqual(rebuilt.status_code, 200)
+        seats = {row['id']: row['available_seats'] for row in rebuilt.json()['results']}
+        self.assertEqual(seats, {str(self.flights[0].pk): 9, str(self.flights[1].pk): 10})
+
+    def test_flight_edit_moves_the_catalog_version(self, confirm):
+        responses = {url: self.warm(url) for url in (self.detail, '/api/flights/?origin=johannesburg')}
+        catalog = self.version()
+
+        flight = Flight.objects.get(pk=self.flights[1].pk)
+        flight.origin = 'Durban'
+        with self.captureOnCommitCallbacks(execute=True):
+            flight.save()
+
+        self.assertGreater(self.version(), catalog)
+        # A search can gain or lose flights, whichever flights it showed before
+        search = self.client.get('/api/flights/?origin=johannesburg', HTTP_IF_NONE_MATCH=responses['/api/flights/?origin=johannesburg']['ETag'])
+        self.assertEqual(search.status_code, 200)
+        self.assertEqual([row['id'] for row in search.json()['results']], [str(self.flights[0].pk)])
+        # The other flight's detail didn't change
+        self.assertEqual(self.client.get(self.detail, HTTP_IF_NONE_MATCH=responses[self.detail]['ETag']).status_code, 304)
+
+    def test_lost_versions_never_revive_a_cached_response(self, confirm):
+        response = self.warm(self.detail)
+        cache.delete(CACHE_KEY_FLIGHT_VERSION.format(flight_id=self.flights[0].pk)) # Evicted
+        self.assertEqual(self.client.get(self.detail, HTTP_IF_NONE_MATCH=response['ETag']).status_code, 200)
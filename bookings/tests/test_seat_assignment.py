@@ -0,0 +1,105 @@
+"""
+Seat assignment under contention: however many clients ask for the same
+seat, or for any seat, at once, no seat is ever held by two bookings and
+the seat map agrees with the bookings afterwards.
+"""
+from unittest import mock
+
+from django.core.cache import cache
+from django.test import TransactionTestCase
+from rest_framework.test import APIClient
+
+from bookings.inventory import get_seat_map
+from bookings.models import Booking, SeatMap
+from .factories import make_flight, make_passengers
+from .test_overbooking import CONFIRMED, _in_threads
+
+@mock.patch('bookings.confirmation.simulate_external_booking_confirmation', return_value=CONFIRMED)
+class SeatAssignmentTests(TransactionTestCase):
+    def setUp(self):
+        cache.clear()
+        self.flight = make_flight(total_seats=6)
+        self.passengers = make_passengers(12)
+
+    def book(self, i, **seat):
+        return APIClient().post(
+            '/api/bookings/', {'passenger_id': str(self.passengers[i].pk), 'flight_id': str(self.flight.pk), **seat}, format='json',
+        )
+
+    def assertSeatMapMatchesBookings(self):
+        held = list(Booking.objects.filter(
+            flight=self.flight, status__in=Booking.SEAT_HOLDING_STATUSES, seat_number__isnull=False,
+        ).values_list('seat_number', flat=True))
+        self.assertEqual(len(held), len(set(held)), 'a seat is held by two bookings')
+        occupied = {label for label, free in get_seat_map(self.flight.pk).seats() if not free}
+        self.assertEqual(occupied, set(held))
+        return held
+
+    def test_one_seat_requested_by_everyone(self, confirm):
+        responses = _in_threads(lambda i: self.book(i, seat_number='1A'), len(self.passengers))
+
+        created = [response for response in responses if response.status_code == 201]
+        self.assertEqual(len(created), 1)
+        self.assertEqual(created[0].json()['seat_number'], '1A')
+        for response in responses:
+            if response.status_code != 201:
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json(), {'seat_number': ['This seat is already taken.']})
+        self.assertEqual(self.assertSeatMapMatchesBookings(), ['1A'])
+        # Losers gave back their seat counter reservation too
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_booked, 1)
+
+    def test_auto_assigned_seats_are_distinct(self, confirm):
+        responses = _in_threads(lambda i: self.book(i, auto_assign_seat=True), len(self.passengers))
+
+        seats = [response.json()['seat_number'] for response in responses if response.status_code == 201]
+        self.assertEqual(sorted(seats), [SeatMap.seat_label(index) for index in range(6)])
+        self.assertEqual([response.status_code for response in responses].count(400), 6)
+        self.assertEqual(sorted(self.assertSeatMapMatchesBookings()), sorted(seats))
+
+        seat_map = APIClient().get(f'/api/flights/{self.flight.pk}/seatmap/').json()
+        self.assertEqual((seat_map['available_seats'], seat_map['unassigned_seats']), (0, 0))
+        self.assertFalse(any(seat['available'] for seat in seat_map['seats']))
+
+    def test_requested_and_auto_assigned_seats_mixed(self, confirm):
+        # Half the clients want 2A or 2B, the other half take any seat
+        def book(i):
+            return self.book(i, seat_number='2A' if i % 4 == 0 else '2B') if i % 2 == 0 else self.book(i, auto_assign_seat=True)
+
+        responses = _in_threads(book, len(self.passengers))
+
+        seats = [response.json()['seat_number'] for response in responses if response.status_code == 201]
+        self.assertEqual(len(seats), len(set(seats)))
+        self.assertEqual(sorted(self.assertSeatMapMatchesBookings()), sorted(seats))
+        self.flight.refresh_from_db()
+        self.assertEqual(self.flight.seats_booked, len(seats))
+
+    def test_cancelled_seat_can_be_booked_again(self, confirm):
+        booking = self.book(0, seat_number='1B').json()
+        self.assertEqual(self.book(1, seat_number='1B').json(), {'seat_number': ['This seat is already taken.']})
+
+        self.assertEqual(APIClient().post(f"/api/bookings/{booking['id']}/cancel/").status_code, 200)
+        responses = _in_threads(lambda i: self.book(i + 1, seat_number='1B'), 4)
+
+        self.assertEqual(sorted(response.status_code for response in responses), [201, 400, 400, 400])
+        self.assertEqual(self.assertSeatMapMatchesBookings(), ['1B'])
+
+    @mock.patch('bookings.confirmation.simulate_external_batch_confirmation', side_effect=lambda bookings: [CONFIRMED] * len(bookings))
+    def test_bulk_bookings_racing_single_bookings(self, confirm_batch, confirm):
+        items = [{'passenger_id': str(passenger.pk), 'flight_id': str(self.flight.pk), 'auto_assign_seat': True} for passenger in self.passengers[:4]]
+
+        def book(i):
+            if i == 0:
+                return APIClient().post('/api/bookings/bulk/', {'bookings': items}, format='json')
+            return self.book(i + 3, auto_assign_seat=True)
+
+        responses = _in_threads(book, 5)
+
+        self.assertEqual(responses[0].status_code, 200)
+        results = responses[0].json()['results']
+        self.assertTrue(all(result['status'] in ('CONFIRMED', 'REJECTED') for result in results))
+        seats = [result['booking']['seat_number'] for result in results if 'booking' in result]
+        seats += [response.json()['seat_number'] for response in responses[1:] if response.status_code == 201]
+        self.assertEqual(len(seats), 6)
+        self.assertEqual(sorted(self.assertSeatMapMatchesBookings()), sorted(seats))
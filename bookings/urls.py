@@ -1,17 +1,22 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import PassengerViewSet, FlightViewSet, BookingViewSet, BookingStatusView
+from .views import PassengerViewSet, FlightViewSet, BookingViewSet, BookingStatusView, ItineraryViewSet
+from . import async_views
 
 # Create a router and register viewsets with it.
 router = DefaultRouter()
 router.register(r'passengers', PassengerViewSet, basename='passenger')
 router.register(r'flights', FlightViewSet, basename='flight')
 router.register(r'bookings', BookingViewSet, basename='booking')
+router.register(r'itineraries', ItineraryViewSet, basename='itinerary')
 
 # The API URLs are now determined automatically by the router.
 # Additionally, we include login URLs for the browsable API.
 urlpatterns = [
     path('', include(router.urls)),
+    # Async variants for ASGI deployments (see bookings.async_views)
+    path('async/bookings/', async_views.create_booking, name='async-booking-create'),
+    path('async/flights/<uuid:pk>/availability/', async_views.flight_availability, name='async-flight-availability'),
     # Example of including a non-viewset view (not used by default in this setup)
     # path('bookings/<uuid:pk>/status/', BookingStatusView.as_view(), name='booking-status'),
 ] 
\ No newline at end of file
@@ -1,38 +1,136 @@
-from rest_framework import viewsets, status, generics
+from rest_framework import viewsets, status, generics, serializers
 from rest_framework.decorators import action
 from rest_framework.response import Response
+from rest_framework.reverse import reverse
+from rest_framework.utils.urls import replace_query_param
+from django.conf import settings
 from django.db import transaction
+from django.utils import timezone
 from django.shortcuts import get_object_or_404
+from collections import Counter, defaultdict
+from datetime import timedelta
 import logging
+import time
+import uuid
 
-from .models import Passenger, Flight, Booking
+from .models import Passenger, Flight, Booking, SeatMap
 from .serializers import (
     PassengerSerializer, FlightSerializer,
-    BookingSerializer, BookingStatusUpdateSerializer
+    BookingSerializer, BookingStatusUpdateSerializer, BulkBookingSerializer, CalendarSearchSerializer, ItinerarySearchSerializer,
+    PassengerMatchSerializer, PassengerSearchSerializer,
+    BOOKING_REPRESENTATION, FLIGHT_REPRESENTATION, PASSENGER_REPRESENTATION,
 )
-from .services import simulate_external_booking_confirmation
-from .cache import get_flight_availability, invalidate_flight_availability_cache
+from .events import changes_since, record_events
+from .confirmation import confirm_booking, confirm_bookings, enqueue_confirmation, enqueue_batch_confirmation
+from .cache import get_flight_availability
+from .calendar import route_calendar
+from .exports import (
+    BOOKING_EXPORT_FIELDS, EXPORT_FORMATS, MANIFEST_FIELDS, bookings_for_export, manifest_for_export,
+    streaming_export_response,
+)
+from .fast_serializers import FastReadMixin
+from .idempotency import idempotent
+from .inventory import (
+    claim_seat, claim_seats_bulk, get_seat_map, release_seat, release_seats, release_seats_bulk, reserve_seats,
+    reserve_seats_bulk,
+)
+from .itineraries import search_itineraries
+from .references import allocate_references
+from .pagination import KeysetPagination
+from .passenger_search import MATCH_FIELDS, match_passengers, search_passengers
+from .response_cache import CachedFlightResponseMixin
+from .search import day_range, parse_day, route_key
 
 logger = logging.getLogger(__name__)
 
-class PassengerViewSet(viewsets.ModelViewSet):
+def create_pending_booking(serializer):
+    """
+    Takes a seat and saves a validated BookingSerializer as a PENDING booking,
+    in one short transaction. Raises ValidationError if the flight is full.
+    Shared by BookingViewSet.create and the async booking view.
+    """
+    flight = serializer.validated_data['flight'] # Get validated flight object
+    with transaction.atomic():
+        # Take the seat with a conditional update on the flight's counter.
+        # Serializer validation only did a cheap early check, this is the one that can't overbook.
+        if not reserve_seats(flight.id):
+            raise serializers.ValidationError({"flight_id": ["No available seats on this flight."]})
+        flight.seats_booked += 1 # Keep the in-memory copy in step for the response
+
+        # Then the seat itself, if one was requested, under the seat map's row lock
+        seat_number = serializer.validated_data.get('seat_number')
+        if serializer.validated_data.pop('auto_assign_seat', False) or seat_number:
+            seat_number = claim_seat(flight.id, seat_number)
+            if seat_number is None:
+                # Rolls back the counter reservation too
+                raise serializers.ValidationError({"seat_number": ["This seat is already taken."]})
+
+        # Create the booking initially as PENDING
+        # The serializer's save method will associate passenger and flight from IDs
+        booking = serializer.save(status='PENDING', seat_number=seat_number)
+        record_events([booking])
+    logger.info("Booking %s created with status PENDING.", booking.id)
+    return booking
+
+class PassengerViewSet(FastReadMixin, viewsets.ModelViewSet):
     """ API endpoint for managing Passengers. """
     queryset = Passenger.objects.all().order_by('-created_at')
     serializer_class = PassengerSerializer
+    representation = PASSENGER_REPRESENTATION # list/retrieve from .values() rows, supports ?fields=
     # Add permissions and authentication later if needed
     # permission_classes = [permissions.IsAuthenticatedOrReadOnly]
 
-class FlightViewSet(viewsets.ReadOnlyModelViewSet):
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        """
+        Passenger lookup for check-in: ?q= name words ("smith jo", "jo smith")
+        or an email address, optionally ?date_of_birth=YYYY-MM-DD and ?limit=.
+        Served by the name index (bookings.passenger_search), never a full scan.
+        """
+        params = PassengerSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        passengers = search_passengers(query['q'], date_of_birth=query.get('date_of_birth'))
+        return Response({"results": list(passengers.values(*MATCH_FIELDS)[:query['limit']])})
+
+    @action(detail=False, methods=['post'])
+    def match(self, request):
+        """
+        Finds the existing passengers of a batch of incoming records, e.g. before
+        an import: {"passengers": [{"first_name", "last_name", "date_of_birth", "email"}, ...]}.
+        One query whatever the number of records (up to PASSENGER_MATCH_MAX_ITEMS).
+        Returns, per record in request order, the passengers with the same
+        email and/or the same normalized name and date of birth.
+        """
+        serializer = PassengerMatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+        candidates = [item for item in items if not item['errors']]
+        matches = iter(match_passengers(candidates))
+
+        results = []
+        for item in items:
+            if item['errors']:
+                results.append({"index": item['index'], "errors": item['errors']})
+            else:
+                results.append({"index": item['index'], "matches": next(matches)})
+        return Response({"results": results})
+
+class FlightViewSet(CachedFlightResponseMixin, FastReadMixin, viewsets.ReadOnlyModelViewSet):
     """
     API endpoint for viewing Flights (Read-Only).
     Includes filtering and searching capabilities.
     Demonstrates performance tuning via optimized queries.
+    List and detail responses are served from the response cache (see bookings.response_cache).
     """
     serializer_class = FlightSerializer
+    representation = FLIGHT_REPRESENTATION # list/retrieve from .values() rows, supports ?fields=
+    served_lookups = ('id', 'updated_at') # Versions and Last-Modified for the response cache
+    pagination_class = KeysetPagination # Deep pages stay as cheap as the first one
     # permission_classes = [permissions.AllowAny] # Publicly viewable flights
 
     def get_queryset(self):
-        """ Optimize query with select_related/prefetch_related if needed later. """
+        """ Availability comes from Flight.seats_booked, so no joins or counts are needed. """
         queryset = Flight.objects.all()
 
         # --- Performance Tuning Example: Filtering --- #
@@ -41,17 +139,18 @@ class FlightViewSet(viewsets.ReadOnlyModelViewSet):
         destination = self.request.query_params.get('destination')
         departure_date = self.request.query_params.get('departure_date') # Expects YYYY-MM-DD
 
+        # Equality on the normalized route columns and a half-open datetime range,
+        # so the (origin_key, destination_key, departure_time) index serves the whole search
         if origin:
-            queryset = queryset.filter(origin__iexact=origin)
+            queryset = queryset.filter(origin_key=route_key(origin))
         if destination:
-            queryset = queryset.filter(destination__iexact=destination)
+            queryset = queryset.filter(destination_key=route_key(destination))
         if departure_date:
-            # Ensure proper date filtering
-            try:
-                queryset = queryset.filter(departure_time__date=departure_date)
-            except ValueError:
-                # Handle invalid date format (e.g., ignore or return error)
-                pass # Or raise ValidationError
+            day = parse_day(departure_date)
+            if day is None:
+                raise serializers.ValidationError({"departure_date": "Expected a valid date in YYYY-MM-DD format."})
+            start, end = day_range(day)
+            queryset = queryset.filter(departure_time__gte=start, departure_time__lt=end)
 
         # --- Performance Tuning Example: Ordering --- #
         # Allow ordering by specific fields
@@ -62,9 +161,68 @@ class FlightViewSet(viewsets.ReadOnlyModelViewSet):
         else:
              queryset = queryset.order_by('departure_time') # Default safe ordering
 
-        logger.info(f"Flight Queryset constructed with filters: origin={origin}, dest={destination}, date={departure_date}, ordering={ordering}")
+        logger.debug(
+            "Flight Queryset constructed with filters: origin=%s, dest=%s, date=%s, ordering=%s",
+            origin, destination, departure_date, ordering,
+        )
         return queryset
 
+    @action(detail=False, methods=['get'])
+    def calendar(self, request):
+        """
+        Fare and availability calendar of a route, one entry per day with flights:
+        ?origin=JNB&destination=CPT, optionally start_date and end_date (inclusive).
+        Read from the route calendar summaries (bookings.calendar) in one range scan.
+        """
+        params = CalendarSearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        days = route_calendar(route_key(query['origin']), route_key(query['destination']), query['start_date'], query['end_date'])
+        return Response({
+            "origin": query['origin'],
+            "destination": query['destination'],
+            "days": [
+                {
+                    "date": day['day'],
+                    "flights": day['flights'],
+                    "available_seats": day['available_seats'],
+                    "min_price": str(day['min_price']) if day['min_price'] is not None else None, # Cheapest flight with a free seat
+                }
+                for day in days
+            ],
+        })
+
+    @action(detail=True, methods=['get'])
+    def seatmap(self, request, pk=None):
+        """ Every seat on the flight and whether it's free, read from the flight's seat map only. """
+        try:
+            seat_map = get_seat_map(uuid.UUID(pk))
+        except ValueError: # Not a flight id
+            seat_map = None
+        if seat_map is None:
+            return Response({"error": "Flight not found."}, status=status.HTTP_404_NOT_FOUND)
+        seats = seat_map.seats()
+        return Response({
+            "flight_id": seat_map.flight_id,
+            "seat_letters": SeatMap.SEAT_LETTERS,
+            "available_seats": seat_map.flight.seats_available, # Also counts bookings without a seat number
+            "unassigned_seats": sum(free for _, free in seats),
+            "seats": [{"seat": label, "available": free} for label, free in seats],
+        })
+
+    @action(detail=True, methods=['get'])
+    def manifest(self, request, pk=None):
+        """
+        Streams the passengers holding a seat on the flight.
+        ?output=ndjson (default) or csv.
+        """
+        output = request.query_params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            return Response({"output": f"Must be one of: {', '.join(EXPORT_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        flight = self.get_object()
+        filename = f"manifest-{flight.flight_number}"
+        return streaming_export_response(request, manifest_for_export(flight.pk), MANIFEST_FIELDS, output, filename)
+
     @action(detail=True, methods=['get'])
     def availability(self, request, pk=None):
         """ Custom action to get cached flight availability. """
@@ -74,13 +232,59 @@ class FlightViewSet(viewsets.ReadOnlyModelViewSet):
              return Response({"error": "Flight not found or availability could not be determined."}, status=status.HTTP_404_NOT_FOUND)
         return Response({"available_seats": availability})
 
-class BookingViewSet(viewsets.ModelViewSet):
+class ItineraryViewSet(viewsets.ViewSet):
+    """
+    Direct and connecting itineraries between two airports on a date, searched
+    in memory over the route graph (see bookings.itineraries).
+    ?origin=JNB&destination=DUR&departure_date=YYYY-MM-DD, optionally max_legs,
+    min_connection / max_connection (minutes), sort=arrival|price, seats and limit.
+    """
+
+    def list(self, request):
+        params = ItinerarySearchSerializer(data=request.query_params)
+        params.is_valid(raise_exception=True)
+        query = params.validated_data
+        start, end = day_range(query['departure_date'])
+        itineraries = search_itineraries(
+            route_key(query['origin']), route_key(query['destination']), start, end,
+            seats=query['seats'], limit=query['limit'], sort=query['sort'], max_legs=query['max_legs'],
+            min_connection=timedelta(minutes=query['min_connection']),
+            max_connection=timedelta(minutes=query['max_connection']),
+        )
+        results = []
+        for itinerary in itineraries:
+            first, last = itinerary.legs[0], itinerary.legs[-1]
+            results.append({
+                "departure_time": timezone.localtime(first.departure_time),
+                "arrival_time": timezone.localtime(last.arrival_time),
+                "duration_minutes": round((last.arrival - first.departure) / 60),
+                "stops": len(itinerary.legs) - 1,
+                "price": str(itinerary.price),
+                "available_seats": itinerary.available_seats, # On the fullest leg
+                "legs": [
+                    {
+                        "flight_id": leg.id,
+                        "flight_number": leg.flight_number,
+                        "origin": leg.origin,
+                        "destination": leg.destination,
+                        "departure_time": timezone.localtime(leg.departure_time),
+                        "arrival_time": timezone.localtime(leg.arrival_time),
+                        "price": str(leg.price),
+                    }
+                    for leg in itinerary.legs
+                ],
+            })
+        return Response({"count": len(results), "results": results})
+
+class BookingViewSet(FastReadMixin, viewsets.ModelViewSet):
     """
     API endpoint for managing Bookings.
     Demonstrates transactional logic, external service integration, and caching.
     """
     queryset = Booking.objects.all().select_related('passenger', 'flight').order_by('-created_at') # Performance: Optimize default query
     serializer_class = BookingSerializer
+    representation = BOOKING_REPRESENTATION # list/retrieve from .values() rows, supports ?fields=
+    pagination_class = KeysetPagination # Cursor over the created_at index instead of OFFSET
     # permission_classes = [permissions.IsAuthenticated] # Requires authentication
 
     def get_queryset(self):
@@ -92,49 +296,197 @@ class BookingViewSet(viewsets.ModelViewSet):
         #    queryset = queryset.filter(passenger__user=user) # Assuming a user link on Passenger
         return queryset
 
-    @transaction.atomic # Ensure booking creation and external call are atomic
+    @idempotent
     def create(self, request, *args, **kwargs):
         """
-        Creates a booking, places it in PENDING, then simulates external confirmation.
-        Uses database transaction and handles external service response.
+        Creates a booking in PENDING, then confirms it with the external service.
+
+        The seat reservation and insert are committed in their own short
+        transaction. With BOOKING_CONFIRMATION_MODE = 'async' confirmation is
+        handed to a background worker and 202 is returned straight away;
+        clients poll /bookings/{id}/status/ for the outcome.
         """
         serializer = self.get_serializer(data=request.data)
         serializer.is_valid(raise_exception=True)
+        booking = create_pending_booking(serializer)
 
-        # Serializer validation already checked flight availability (basic check)
-        # For higher concurrency, a select_for_update might be needed here or during validation
-        flight = serializer.validated_data['flight'] # Get validated flight object
+        if settings.BOOKING_CONFIRMATION_MODE == 'async':
+            enqueue_confirmation(booking.id)
+            status_url = reverse('booking-confirmation-status', kwargs={'pk': booking.pk}, request=request)
+            return Response(serializer.data, status=status.HTTP_202_ACCEPTED, headers={'Location': status_url})
 
-        # Create the booking initially as PENDING
-        # The serializer's save method will associate passenger and flight from IDs
-        booking = serializer.save(status='PENDING')
-        logger.info(f"Booking {booking.id} created with status PENDING.")
-
-        # --- Integration with External Service --- #
-        success, external_ref, error_message = simulate_external_booking_confirmation(booking)
-
-        if success:
-            booking.status = 'CONFIRMED'
-            booking.external_system_ref = external_ref
-            booking.save(update_fields=['status', 'external_system_ref', 'updated_at'])
-            # --- Cache Invalidation --- #
-            invalidate_flight_availability_cache(booking.flight.id)
-            logger.info(f"Booking {booking.id} confirmed externally. Ref: {external_ref}. Cache invalidated.")
-            headers = self.get_success_headers(serializer.data)
-            return Response(self.get_serializer(booking).data, status=status.HTTP_201_CREATED, headers=headers)
+        # --- Integration with External Service (outside the transaction) --- #
+        error_message = confirm_booking(booking)
+
+        if booking.status == 'CONFIRMED':
+            # Serialized from the booking, passenger and flight already in memory, no queries
+            return Response(serializer.data, status=status.HTTP_201_CREATED, headers=self.get_success_headers(serializer.data))
         else:
-            # External service failed, mark booking as FAILED
-            booking.status = 'FAILED'
-            # Store the error message if needed (add a field to Booking model?)
-            booking.save(update_fields=['status', 'updated_at'])
-            logger.error(f"External confirmation failed for booking {booking.id}. Status set to FAILED. Reason: {error_message}")
-            # Don't invalidate cache as the booking didn't succeed
             # Return an error response indicating the failure
             return Response(
                 {"error": "Booking creation successful, but external confirmation failed.", "detail": error_message},
                 status=status.HTTP_503_SERVICE_UNAVAILABLE # Or another appropriate error
             )
 
+    @action(detail=False, methods=['post'])
+    @idempotent
+    def bulk(self, request):
+        """
+        Books many passenger/flight pairs in one request (group and agency bookings).
+
+        Validation runs as a handful of set-based queries, seats are reserved
+        with one locked UPDATE, bookings are inserted with bulk_create and the
+        external service gets one batched confirmation request, so the number
+        of SQL statements doesn't grow with the number of items.
+        Returns one result per item, in request order.
+        """
+        serializer = BulkBookingSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        items = serializer.validated_data['items']
+        candidates = [item for item in items if not item['errors']]
+
+        with transaction.atomic():
+            granted = reserve_seats_bulk(Counter(item['flight'].pk for item in candidates))
+            seated = []
+            for item in candidates:
+                flight = item['flight']
+                if not granted[flight.pk]:
+                    item['errors'] = {"flight_id": ["No available seats on this flight."]}
+                    continue
+                granted[flight.pk] -= 1
+                flight.seats_booked += 1 # Keep the in-memory copy in step for the response
+                if item['seat_number'] or item['auto_assign_seat']:
+                    seated.append(item)
+
+            # All requested seats in one pass over the locked seat maps
+            wanted = defaultdict(list)
+            for item in seated:
+                wanted[item['flight'].pk].append(item['seat_number'])
+            assigned = {flight_id: iter(seats) for flight_id, seats in claim_seats_bulk(wanted).items()}
+            unseated = Counter()
+            for item in seated:
+                item['seat_number'] = next(assigned[item['flight'].pk])
+                if item['seat_number'] is None:
+                    item['errors'] = {"seat_number": ["This seat is already taken."]}
+                    item['flight'].seats_booked -= 1
+                    unseated[item['flight'].pk] += 1
+            release_seats_bulk(unseated) # Their counter reservations
+
+            to_create = []
+            for item in candidates:
+                if item['errors']:
+                    continue
+                item['booking'] = Booking(
+                    passenger=item['passenger'], flight=item['flight'], status='PENDING',
+                    seat_number=item['seat_number'],
+                )
+                to_create.append(item['booking'])
+            # bulk_create bypasses save(), so references are allocated up front in one go
+            for booking, reference in zip(to_create, allocate_references(len(to_create))):
+                booking.booking_reference = reference
+            Booking.objects.bulk_create(to_create)
+            record_events(to_create)
+        logger.info("Bulk request created %d PENDING bookings, rejected %d.", len(to_create), len(items) - len(to_create))
+
+        if settings.BOOKING_CONFIRMATION_MODE == 'async':
+            enqueue_batch_confirmation(booking.pk for booking in to_create)
+            response_status = status.HTTP_202_ACCEPTED
+        else:
+            confirm_bookings(to_create)
+            response_status = status.HTTP_200_OK
+
+        booking_data = iter(self.get_serializer(to_create, many=True).data)
+        results = []
+        for item in items:
+            if item['errors']:
+                results.append({"index": item['index'], "status": "REJECTED", "errors": item['errors']})
+            else:
+                data = next(booking_data)
+                results.append({"index": item['index'], "status": data['status'], "booking": data})
+        return Response({"results": results}, status=response_status)
+
+    @action(detail=False, methods=['get'])
+    def export(self, request):
+        """
+        Streams bookings as NDJSON (default) or CSV without paging, e.g. for daily dumps.
+        ?output=ndjson|csv, ?date=YYYY-MM-DD (created on), ?status=..., ?flight=<id>.
+        """
+        params = request.query_params
+        output = params.get('output', 'ndjson')
+        if output not in EXPORT_FORMATS:
+            return Response({"output": f"Must be one of: {', '.join(EXPORT_FORMATS)}."}, status=status.HTTP_400_BAD_REQUEST)
+        day = None
+        if params.get('date'):
+            day = parse_day(params['date'])
+            if day is None:
+                return Response({"date": "Expected a valid date in YYYY-MM-DD format."}, status=status.HTTP_400_BAD_REQUEST)
+        booking_status = params.get('status')
+        if booking_status and booking_status not in dict(Booking.STATUS_CHOICES):
+            return Response({"status": "Unknown booking status."}, status=status.HTTP_400_BAD_REQUEST)
+        try:
+            flight_id = uuid.UUID(params['flight']) if params.get('flight') else None
+        except ValueError:
+            return Response({"flight": "Must be a flight id."}, status=status.HTTP_400_BAD_REQUEST)
+
+        queryset = bookings_for_export(day=day, status=booking_status, flight_id=flight_id)
+        filename = f"bookings-{day.isoformat()}" if day else "bookings"
+        return streaming_export_response(request, queryset, BOOKING_EXPORT_FIELDS, output, filename)
+
+    @action(detail=False, methods=['get'])
+    def changes(self, request):
+        """
+        Incremental feed of booking status changes (bookings.events), oldest first.
+        Pass the `cursor` of the previous response as ?since= to get only what
+        changed after it; ?limit= caps the number of changes (BOOKING_CHANGES_MAX_LIMIT).
+        """
+        try:
+            since = int(request.query_params.get('since', 0))
+            limit = int(request.query_params.get('limit', 100))
+        except ValueError:
+            return Response({"detail": "since and limit must be integers."}, status=status.HTTP_400_BAD_REQUEST)
+        if since < 0 or limit < 1:
+            return Response({"detail": "since must be 0 or more and limit at least 1."}, status=status.HTTP_400_BAD_REQUEST)
+
+        changes, has_more = changes_since(since, min(limit, settings.BOOKING_CHANGES_MAX_LIMIT))
+        cursor = changes[-1]['id'] if changes else since
+        return Response({
+            "cursor": str(cursor),
+            "has_more": has_more, # Fetch again straight away instead of waiting for the next poll
+            "next": replace_query_param(request.build_absolute_uri(), 'since', cursor),
+            "changes": changes,
+        })
+
+    @action(detail=True, methods=['get'], url_path='status')
+    def confirmation_status(self, request, pk=None):
+        """
+        Lightweight status lookup for clients waiting on an async confirmation.
+        Pass ?wait=<seconds> to long-poll until the booking leaves PENDING.
+        hold_expires_at is when a PENDING booking's seat hold lapses (bookings.holds).
+        """
+        fields = ('id', 'booking_reference', 'status', 'external_system_ref', 'created_at', 'updated_at')
+        lookup = self.get_queryset().filter(pk=pk).values(*fields)
+
+        try:
+            wait = min(float(request.query_params.get('wait', 0)), settings.BOOKING_STATUS_MAX_WAIT)
+        except ValueError:
+            return Response({"wait": "Must be a number of seconds."}, status=status.HTTP_400_BAD_REQUEST)
+
+        deadline = time.monotonic() + wait
+        interval = 0.1
+        while True:
+            data = lookup.first()
+            if data is None:
+                return Response({"detail": "Not found."}, status=status.HTTP_404_NOT_FOUND)
+            if data['status'] != 'PENDING' or time.monotonic() + interval > deadline:
+                break
+            time.sleep(interval)
+            interval = min(interval * 2, 1.0)
+
+        created_at = data.pop('created_at')
+        data['hold_expires_at'] = created_at + timedelta(seconds=settings.BOOKING_HOLD_TTL) if data['status'] == 'PENDING' else None
+        headers = {'Retry-After': '1'} if data['status'] == 'PENDING' else {}
+        return Response(data, headers=headers)
+
     # Override update/partial_update if needed, e.g., to prevent direct status changes via PUT/PATCH
     def update(self, request, *args, **kwargs):
         return Response({"detail": "Method \"PUT\" not allowed."}, status=status.HTTP_405_METHOD_NOT_ALLOWED)
@@ -147,7 +499,9 @@ class BookingViewSet(viewsets.ModelViewSet):
     @transaction.atomic
     def cancel(self, request, pk=None):
         """ Cancels a booking. """
-        booking = self.get_object()
+        # Lock the booking row so concurrent cancels can't release the seat twice
+        booking = get_object_or_404(self.get_queryset().select_for_update(of=('self',)), pk=pk)
+        self.check_object_permissions(request, booking)
         if booking.status == 'CANCELLED':
             return Response({"detail": "Booking is already cancelled."}, status=status.HTTP_400_BAD_REQUEST)
         if booking.status != 'CONFIRMED' and booking.status != 'PENDING':
@@ -157,14 +511,11 @@ class BookingViewSet(viewsets.ModelViewSet):
         booking.status = 'CANCELLED'
         booking.save(update_fields=['status', 'updated_at'])
 
-        # If it was confirmed, need to invalidate cache
-        if original_status == 'CONFIRMED':
-            invalidate_flight_availability_cache(booking.flight.id)
-            logger.info(f"Booking {booking.id} cancelled. Cache invalidated.")
-        else:
-             logger.info(f"Booking {booking.id} cancelled (was PENDING).")
-
-        # Optional: Add logic here to notify external systems about cancellation if needed
+        # Both PENDING and CONFIRMED bookings hold a seat, give it back
+        release_seats(booking.flight_id)
+        release_seat(booking.flight_id, booking.seat_number)
+        record_events([booking], previous_status=original_status) # The external system hears of it through the relay
+        logger.info("Booking %s cancelled (was %s). Seat released.", booking.id, original_status)
 
         return Response(self.get_serializer(booking).data, status=status.HTTP_200_OK)
 
@@ -189,26 +540,31 @@ class BookingStatusView(generics.RetrieveUpdateAPIView):
         serializer.is_valid(raise_exception=True)
 
         new_status = serializer.validated_data.get('status')
-        old_status = instance.status
 
-        # --- Add business logic for status transitions --- #
-        if new_status == old_status:
-             return Response(self.get_serializer(instance).data) # No change
+        with transaction.atomic():
+            # Re-read the status under a row lock so the seat counter is adjusted exactly once
+            instance = get_object_or_404(Booking.objects.select_for_update(), pk=instance.pk)
+            old_status = instance.status
+
+            # --- Add business logic for status transitions --- #
+            if new_status == old_status:
+                 return Response(self.get_serializer(instance).data) # No change
 
-        # Example: Prevent changing from CANCELLED or FAILED
-        if old_status in ['CANCELLED', 'FAILED']:
-            return Response({"error": f"Cannot change status from {old_status}"}, status=status.HTTP_400_BAD_REQUEST)
+            # A cancelled, failed or expired booking gave its seat back (and the seat map may have handed it on)
+            if old_status in Booking.FINAL_STATUSES:
+                return Response({"error": f"Cannot change status from {old_status}"}, status=status.HTTP_400_BAD_REQUEST)
 
-        with transaction.atomic():
             instance.status = new_status
             instance.save(update_fields=['status', 'updated_at'])
-
-            # Invalidate cache if booking becomes confirmed or un-confirmed
-            if (new_status == 'CONFIRMED' and old_status != 'CONFIRMED') or \
-               (old_status == 'CONFIRMED' and new_status != 'CONFIRMED'):
-                invalidate_flight_availability_cache(instance.flight.id)
-                logger.info(f"Booking {instance.id} status changed to {new_status}. Cache invalidated.")
+            record_events([instance], previous_status=old_status)
+
+            # Only PENDING and CONFIRMED get this far, both holding a seat: give it back (counter,
+            # seat map and availability cache) when the booking moves to a final status
+            if new_status in Booking.FINAL_STATUSES:
+                release_seats(instance.flight_id)
+                release_seat(instance.flight_id, instance.seat_number)
+                logger.info("Booking %s status changed to %s. Seat released.", instance.id, new_status)
             else:
-                logger.info(f"Booking {instance.id} status changed to {new_status}.")
+                logger.info("Booking %s status changed to %s.", instance.id, new_status)
 
-        return Response(self.get_serializer(instance).data) 
\ No newline at end of file
+        return Response(self.get_serializer(instance).data)
@@ -1,7 +1,8 @@
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
 from bookings.models import Passenger, Flight, Booking
-import random
+from bookings.inventory import claim_seat, reserve_seats
 
 # Create sample passengers
 passengers = [
@@ -84,14 +85,17 @@ bookings_data = [
 ]
 
 for passenger, flight in bookings_data:
-    booking, created = Booking.objects.get_or_create(
-        passenger=passenger,
-        flight=flight,
-        defaults={
-            'status': 'CONFIRMED',
-            'seat_number': f"{random.randint(1, 30)}{chr(random.randint(65, 70))}"  # e.g., 15A
-        }
-    )
+    with transaction.atomic():
+        booking, created = Booking.objects.get_or_create(
+            passenger=passenger,
+            flight=flight,
+            defaults={
+                'status': 'CONFIRMED',
+                'seat_number': lambda flight=flight: claim_seat(flight.id)  # Next free seat on the seat map, e.g. 1A
+            }
+        )
+        if created:
+            reserve_seats(flight.id) # Keep the flight's seat counter in step
     print(f"{'Created' if created else 'Retrieved'} booking: {booking.booking_reference} for {passenger.first_name} on flight {flight.flight_number}")
 
 print("\nSample data creation completed!") 
\ No newline at end of file